@@ -0,0 +1,203 @@
+"""
+Ad Manifest
+Compiled view of the ads folder: parsed index.txt fields, resolved category
+IDs, photos and their content hashes for every ad. Folders are fingerprinted
+by the size and mtime of their files, so a rescan only re-reads the folders
+that changed.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from category_index import CATEGORIES_DIR, SNAPSHOT_FILE, get_category_index
+from images import file_digest, list_photos
+
+ADS_DIR = 'ads'
+MANIFEST_FILE = os.path.join('state', 'ads_manifest.json')
+MANIFEST_VERSION = 2
+IGNORED_FOLDERS = {'.tmp.driveupload'}
+
+# Fields of the first line of index.txt, separated by '--'
+FIELD_NAMES = ['parent', 'child', 'grandchild', 'subject', 'year', 'condition', 'priceType', 'price', 'packageSize']
+
+# PackageSize values and the id of their radio button on the ad form
+PACKAGE_SIZE_IDS = {
+    'Brievenbuspakje': 'Radio-brievenbuspakje-xs',
+    'Klein pakket': 'Radio-kleinPakket-s',
+    'Gemiddeld pakket': 'Radio-gemiddeldPakket-m',
+    'Groot pakket': 'Radio-grootPakket-l'
+}
+
+
+def parse_index(content):
+    """Split index.txt into the list of category line fields and the description"""
+    parts = content.split('\n---\n', 1)
+    category_line = parts[0].strip()
+    description = parts[1].strip() if len(parts) > 1 else ""
+    return category_line.split('--'), description
+
+
+def folder_fingerprint(folder):
+    """Fingerprint of an ad folder from the names, sizes and mtimes of its files
+
+    Returns (fingerprint, newest mtime). Only stat calls, no file contents.
+    """
+    digest = hashlib.sha1()
+    newest = os.stat(folder).st_mtime
+    pending = [folder]
+    while pending:
+        directory = pending.pop()
+        with os.scandir(directory) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                stat = entry.stat()
+                newest = max(newest, stat.st_mtime)
+                if entry.is_dir():
+                    pending.append(entry.path)
+                    continue
+                digest.update(f'{os.path.relpath(entry.path, folder)}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode('utf-8'))
+    return digest.hexdigest(), newest
+
+
+def categories_version(directory=CATEGORIES_DIR):
+    """Modification time of the category data the IDs were resolved against"""
+    for name in (SNAPSHOT_FILE, 'grandchildren.json'):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return os.path.getmtime(path)
+    return None
+
+
+def compile_ad(folder, previous=None):
+    """Parse an ad folder into a manifest entry
+
+    Photo hashes of a previous entry are reused for files whose size and
+    mtime did not change.
+    """
+    entry = {'errors': []}
+    try:
+        with open(os.path.join(folder, 'index.txt'), encoding='utf-8') as f:
+            fields, description = parse_index(f.read())
+    except OSError as e:
+        entry['errors'].append(f"index.txt: {e.strerror or e}")
+        fields, description = [], ""
+    entry['fields'] = fields
+    entry['description'] = description
+    entry['attributes'] = dict(zip(FIELD_NAMES, fields))
+
+    known = {photo['name']: photo for photo in (previous or {}).get('photos', [])}
+    photos = []
+    photos_folder = os.path.join(folder, 'photos')
+    if os.path.isdir(photos_folder):
+        for name in list_photos(photos_folder):
+            path = os.path.join(photos_folder, name)
+            stat = os.stat(path)
+            photo = known.get(name)
+            if not photo or photo['size'] != stat.st_size or photo['mtime'] != stat.st_mtime_ns:
+                photo = {'name': name, 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha256': file_digest(path)}
+            photos.append(photo)
+    entry['photos'] = photos
+    return entry
+
+
+def resolve_categories(entry, index):
+    """Store the category IDs of an entry's category line, or None for unknown levels"""
+    fields = entry['fields']
+    if len(fields) < 3:
+        entry['categoryIds'] = [None, None, None]
+    else:
+        entry['categoryIds'] = list(index.resolve(fields[0], fields[1], fields[2], verbose=False))
+
+
+class AdManifest:
+    """Manifest of every ad folder, kept up to date by scan()"""
+
+    def __init__(self, path=MANIFEST_FILE, ads_dir=ADS_DIR):
+        self.path = path
+        self.ads_dir = ads_dir
+        self.ads = {}
+        self.categories_version = None
+
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.ads = data['ads']
+                self.categories_version = data.get('categoriesVersion')
+
+    def scan(self, workers=8):
+        """Rescan the ads folder; returns (compiled, unchanged, removed) counts"""
+        folders = {}
+        with os.scandir(self.ads_dir) as entries:
+            for entry in entries:
+                if entry.is_dir() and entry.name not in IGNORED_FOLDERS:
+                    folders[entry.name] = entry.path
+
+        changed = []
+        for name, folder in folders.items():
+            fingerprint, modified = folder_fingerprint(folder)
+            previous = self.ads.get(name)
+            if previous and previous['fingerprint'] == fingerprint:
+                continue
+            changed.append((name, folder, fingerprint, modified, previous))
+
+        def compile_one(job):
+            name, folder, fingerprint, modified, previous = job
+            entry = compile_ad(folder, previous)
+            entry['fingerprint'] = fingerprint
+            entry['modified'] = modified
+            return name, entry
+
+        # Hashing photos dominates, and hashlib releases the GIL
+        with ThreadPoolExecutor(workers) as executor:
+            compiled = dict(executor.map(compile_one, changed))
+
+        removed = [name for name in self.ads if name not in folders]
+        for name in removed:
+            del self.ads[name]
+        self.ads.update(compiled)
+
+        # New category data can change the IDs of every ad, not only the reparsed ones
+        version = categories_version()
+        stale = self.ads if version != self.categories_version else compiled
+        if stale:
+            index = get_category_index()
+            for entry in stale.values():
+                resolve_categories(entry, index)
+        self.categories_version = version
+
+        return len(compiled), len(folders) - len(compiled), len(removed)
+
+    def save(self):
+        """Write the manifest atomically"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        data = {'version': MANIFEST_VERSION, 'categoriesVersion': self.categories_version, 'ads': self.ads}
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def names(self):
+        return list(self.ads)
+
+    def __getitem__(self, name):
+        return self.ads[name]
+
+    def __contains__(self, name):
+        return name in self.ads
+
+
+def main():
+    """Compile the manifest of the ads folder and report what changed"""
+    manifest = AdManifest()
+    compiled, unchanged, removed = manifest.scan()
+    manifest.save()
+    print(f"+ {compiled} ads compiled, {unchanged} unchanged, {removed} removed ({manifest.path})")
+    for name, entry in sorted(manifest.ads.items()):
+        for error in entry['errors']:
+            print(f"X {name}: {error}")
+
+
+if __name__ == "__main__":
+    main()
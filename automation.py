@@ -1,463 +1,971 @@
 from selenium import webdriver
-import time
 from selenium.common.exceptions import NoSuchElementException   
 import os
+import argparse
+import shutil
+import threading
+import time
+from datetime import timedelta
+from queue import Empty
 from selenium.webdriver.support.ui import Select
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from PIL import Image, ExifTags
-import json
-
-# Import configuration
+from ad_manifest import AdManifest, PACKAGE_SIZE_IDS
+from images import PhotoCache, PhotoPreparer, CACHE_MAX_BYTES, MAX_SIZE, JPEG_QUALITY
+from inventory import AdInventory, extract_ad_id, parse_expiry
+from journal import FAILED, POSTED_STATES, PostingJournal
+from priority import PostingQueue, PriorityScorer, expiries_by_ad, failure_counts
+from reconcile import reconcile
+from scheduler import POSTING_HOURS, POSTS_PER_HOUR, SLOT_SEARCH_DAYS, PostingScheduler
+from tracing import Tracer
+from validate_ads import validate_all
+from waits import Waiter, element_count_above, uploads_complete
+
+# Import configuration; the module imports without it, but a browser session cannot start
 try:
     from config import EMAIL as email, PASSWORD as password, CHROME_USER_DATA_DIR, HEADLESS_MODE, WINDOW_SIZE
+    CONFIG_FOUND = True
 except ImportError:
-    print("Error: config.py not found!")
-    print("Please copy config.example.py to config.py and fill in your settings.")
-    exit(1)
+    email = password = CHROME_USER_DATA_DIR = WINDOW_SIZE = None
+    HEADLESS_MODE = False
+    CONFIG_FOUND = False
 
-# Load category data
-def load_categories():
-    """Load category hierarchy from scraped JSON files"""
-    try:
-        with open('categories/parents.json', encoding='utf-8') as f:
-            parents = json.load(f)
-        with open('categories/children.json', encoding='utf-8') as f:
-            children = json.load(f)
-        with open('categories/grandchildren.json', encoding='utf-8') as f:
-            grandchildren = json.load(f)
-        return parents, children, grandchildren
-    except Exception as e:
-        print(f"Warning: Could not load category data: {e}")
-        print("Run 'python scrape_categories.py' first to generate category files.")
-        return None, None, None
-
-def find_category_ids(parent_name, child_name, grandchild_name):
-    """Find category IDs from names using scraped data"""
-    parents, children, grandchildren = load_categories()
-    
-    if not all([parents, children, grandchildren]):
-        return None, None, None
-    
-    # Find parent ID
-    parent = next((p for p in parents if p['name'] == parent_name), None)
-    if not parent:
-        print(f"Warning: Parent category '{parent_name}' not found")
-        return None, None, None
-    parent_id = parent['id']
-    
-    # Find child ID
-    child = next((c for c in children if c['name'] == child_name and c['parentId'] == parent_id), None)
-    if not child:
-        print(f"Warning: Child category '{child_name}' not found under '{parent_name}'")
-        return parent_id, None, None
-    child_id = child['id']
-    
-    # Find grandchild ID
-    grandchild = next((g for g in grandchildren if g['name'] == grandchild_name and g['parentId'] == child_id), None)
-    if not grandchild:
-        print(f"Warning: Grandchild category '{grandchild_name}' not found under '{child_name}'")
-        return parent_id, child_id, None
-    grandchild_id = grandchild['id']
-    
-    return parent_id, child_id, grandchild_id
-
-# Setup Chrome WebDriver
-ChromeOptions = webdriver.ChromeOptions()
-ChromeOptions.add_argument(f"user-data-dir={CHROME_USER_DATA_DIR}")
-ChromeOptions.add_argument("--profile-directory=Default")  # Use default profile
-ChromeOptions.add_argument("disable-blink-features=AutomationControlled")
-ChromeOptions.add_argument("--ignore-certificate-errors")
-ChromeOptions.add_argument('--allow-running-insecure-content')
-ChromeOptions.add_argument("--no-sandbox")  # Bypass OS security model
-ChromeOptions.add_argument("--disable-dev-shm-usage")  # Overcome limited resource problems
-ChromeOptions.add_argument("--remote-debugging-port=9222")  # Enable DevTools
-if HEADLESS_MODE:
-    ChromeOptions.add_argument("--headless")
-    ChromeOptions.add_argument(f"--window-size={WINDOW_SIZE}")
-WebDriver = webdriver.Chrome(options = ChromeOptions)
-time.sleep(2)
-
-def check_exists_by_xpath(xpath):
+try:
+    from config import WAIT_TIMEOUTS
+except ImportError:
+    WAIT_TIMEOUTS = {}
+
+try:
+    from config import BROWSER_WORKERS
+except ImportError:
+    BROWSER_WORKERS = 1
+
+try:
+    from config import MAX_POSTS_PER_ACCOUNT
+except ImportError:
+    MAX_POSTS_PER_ACCOUNT = 2
+
+try:
+    from config import INVENTORY_FULL_SWEEP_HOURS
+except ImportError:
+    INVENTORY_FULL_SWEEP_HOURS = 20
+
+try:
+    from config import PHOTO_WORKERS
+except ImportError:
+    PHOTO_WORKERS = None
+
+try:
+    from config import PHOTO_MAX_SIZE
+except ImportError:
+    PHOTO_MAX_SIZE = MAX_SIZE
+
+try:
+    from config import PHOTO_QUALITY
+except ImportError:
+    PHOTO_QUALITY = JPEG_QUALITY
+
+try:
+    from config import PHOTO_CACHE_MB
+except ImportError:
+    PHOTO_CACHE_MB = CACHE_MAX_BYTES // (1024 * 1024)
+
+try:
+    from config import PHOTO_UPLOAD_ATTEMPTS
+except ImportError:
+    PHOTO_UPLOAD_ATTEMPTS = 2
+
+# Seconds between checks for ad folders that appeared during a run
+ADMIT_INTERVAL = 30
+# Seconds a new folder must be unchanged before it is posted
+SETTLE_TIME = 30
+
+
+def check_exists_by_xpath(driver, xpath):
     try:
-        WebDriver.find_element(By.XPATH, xpath)
+        driver.find_element(By.XPATH, xpath)
     except NoSuchElementException:
         return False
     return True
 
-WebDriver.maximize_window()
-time.sleep(2)
-
-WebDriver.get('https://www.marktplaats.nl')
-time.sleep(3)
 
-# Handle cookie consent - it's inside an iframe
-try:
-    wait = WebDriverWait(WebDriver, 10)
-    # Wait for the iframe to appear
-    iframe = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "iframe[title*='Consent']")))
-    WebDriver.switch_to.frame(iframe)
+def worker_profile_dir(worker_id):
+    """Chrome user-data-dir for a worker; extra workers get their own copy of the profile
+
+    Chrome locks a profile directory while it runs, so parallel browsers
+    cannot share one. The copy is made once and reused (and stays logged in)
+    on later runs.
+    """
+    if worker_id == 0:
+        return CHROME_USER_DATA_DIR
+    profile_dir = f"{CHROME_USER_DATA_DIR}-worker{worker_id}"
+    if not os.path.exists(profile_dir) and os.path.exists(CHROME_USER_DATA_DIR):
+        shutil.copytree(CHROME_USER_DATA_DIR, profile_dir,
+                        ignore=shutil.ignore_patterns('Singleton*', '*.lock', 'Cache', 'Code Cache', 'GPUCache'))
+    return profile_dir
+
+
+class MarktplaatsSession:
+    """A Chrome browser that stays logged in to Marktplaats across many batches
+
+    Starting Chrome, accepting cookies and logging in takes ~20 seconds, so a
+    session is meant to be created once and reused; call ensure_logged_in()
+    before each batch to recover from an expired login.
+    """
+
+    NAAM_ZWM = '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[3]/div/button/span'
+    NAAM_MWM = '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[4]/div/button/span'
+
+    def __init__(self, worker_id=0):
+        self.worker_id = worker_id
+        self.driver = None
+        self.waiter = None
+        self.logged_in = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        """Start Chrome with the worker's own profile directory and DevTools port"""
+        if not CONFIG_FOUND:
+            raise RuntimeError("config.py not found: copy config.example.py to config.py and fill in your settings")
+        ChromeOptions = webdriver.ChromeOptions()
+        ChromeOptions.add_argument(f"user-data-dir={worker_profile_dir(self.worker_id)}")
+        ChromeOptions.add_argument("--profile-directory=Default")  # Use default profile
+        ChromeOptions.add_argument("disable-blink-features=AutomationControlled")
+        ChromeOptions.add_argument("--ignore-certificate-errors")
+        ChromeOptions.add_argument('--allow-running-insecure-content')
+        ChromeOptions.add_argument("--no-sandbox")  # Bypass OS security model
+        ChromeOptions.add_argument("--disable-dev-shm-usage")  # Overcome limited resource problems
+        ChromeOptions.add_argument(f"--remote-debugging-port={9222 + self.worker_id}")  # Enable DevTools
+        if HEADLESS_MODE:
+            ChromeOptions.add_argument("--headless")
+            ChromeOptions.add_argument(f"--window-size={WINDOW_SIZE}")
+        self.driver = webdriver.Chrome(options = ChromeOptions)
+        self.driver.maximize_window()
+        previous, self.waiter = self.waiter, Waiter(self.driver, WAIT_TIMEOUTS)
+        if previous is not None:
+            # Keep the wait statistics of the browser this one replaces
+            self.waiter.merge(previous)
+        return self
+
+    def close(self):
+        """Quit the browser"""
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+            self.logged_in = False
+
+    def is_logged_in(self):
+        """Check whether the account menu is shown in the page header"""
+        return (check_exists_by_xpath(self.driver, self.NAAM_ZWM)
+                or check_exists_by_xpath(self.driver, self.NAAM_MWM))
+
+    def log_in(self):
+        """Accept cookies and log in; returns False if login failed"""
+        self.driver.get('https://www.marktplaats.nl')
+        self.waiter.settle('homepage', legacy=7)
+
+        # Handle cookie consent - it's inside an iframe
+        try:
+            wait = WebDriverWait(self.driver, 10)
+            # Wait for the iframe to appear
+            iframe = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "iframe[title*='Consent']")))
+            self.driver.switch_to.frame(iframe)
     
-    # Now click the accept button inside the iframe
-    accept_button = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Accepteren') or contains(text(), 'Accept')]")))
-    accept_button.click()
+            # Now click the accept button inside the iframe
+            accept_button = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Accepteren') or contains(text(), 'Accept')]")))
+            accept_button.click()
     
-    # Switch back to main content
-    WebDriver.switch_to.default_content()
-    time.sleep(3)
-except Exception:
-    # Cookie consent already accepted or not present
-    WebDriver.switch_to.default_content()
-
-# Wait for any overlays to disappear
-time.sleep(3)
-
-inloggen_popup = '/html/body/div[4]/div/div/div[1]/div[1]/button'
-if check_exists_by_xpath(inloggen_popup) != False:
-    inloggen_popup = WebDriver.find_element(By.XPATH, '/html/body/div[4]/div/div/div[1]/div[1]/button')
-    inloggen_popup.click()
-    time.sleep(5)
-
-naam_zwm = '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[3]/div/button/span'
-naam_mwm = '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[4]/div/button/span'
-
-if check_exists_by_xpath(naam_zwm) != True and check_exists_by_xpath(naam_mwm) != True:
-    try:
-        # Use JavaScript click to avoid interception
-        inloggen_header = WebDriver.find_element(By.XPATH, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[4]/a')
-        WebDriver.execute_script("arguments[0].click();", inloggen_header)
-        time.sleep(5)
-    except Exception:
-        pass
-        time.sleep(2)
-
-    # Wait for login form to appear
-    try:
-        wait = WebDriverWait(WebDriver, 10)
-        form_email = wait.until(EC.presence_of_element_located((By.ID, 'email')))
+            # Switch back to main content and wait for the consent iframe to go away
+            self.driver.switch_to.default_content()
+            self.waiter.until('cookie_consent', EC.invisibility_of_element_located((By.CSS_SELECTOR, "iframe[title*='Consent']")), legacy=3)
+        except Exception:
+            # Cookie consent already accepted or not present
+            self.driver.switch_to.default_content()
+
+        # Wait for any overlays to disappear
+        self.waiter.settle('overlays', legacy=3)
+
+        inloggen_popup = '/html/body/div[4]/div/div/div[1]/div[1]/button'
+        if check_exists_by_xpath(self.driver, inloggen_popup) != False:
+            inloggen_popup = self.driver.find_element(By.XPATH, '/html/body/div[4]/div/div/div[1]/div[1]/button')
+            inloggen_popup.click()
+            self.waiter.until('login_popup', EC.invisibility_of_element_located((By.XPATH, '/html/body/div[4]/div/div/div[1]/div[1]/button')), legacy=5)
+
+        if check_exists_by_xpath(self.driver, self.NAAM_ZWM) != True and check_exists_by_xpath(self.driver, self.NAAM_MWM) != True:
+            try:
+                # Use JavaScript click to avoid interception
+                inloggen_header = self.driver.find_element(By.XPATH, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[4]/a')
+                self.driver.execute_script("arguments[0].click();", inloggen_header)
+            except Exception:
+                pass
+
+            # Wait for login form to appear
+            try:
+                form_email = self.waiter.until('login_form', EC.presence_of_element_located((By.ID, 'email')), legacy=9, group='login', required=True)
+        
+                form_email.clear()
+                form_email.send_keys(email)
+
+                form_password = self.driver.find_element(By.ID, 'password')
+                form_password.clear()
+                form_password.send_keys(password)
+
+                # Find and click the login button
+                try:
+                    inloggen_submit = self.driver.find_element(By.XPATH, "//button[contains(text(), 'Inloggen met je e-mailadres')]")
+                    inloggen_submit.click()
+                except:
+                    # Alternative: press Enter on password field
+                    form_password.send_keys('\n')
         
-        form_email.clear()
-        form_email.send_keys(email)
-        time.sleep(2)
+            except Exception:
+                # Already logged in
+                pass
 
-        form_password = WebDriver.find_element(By.ID, 'password')
-        form_password.clear()
-        form_password.send_keys(password)
-        time.sleep(2)    
+        # Wait for login to complete: the account menu appears in the header
+        self.waiter.until('login', EC.any_of(
+            EC.presence_of_element_located((By.XPATH, self.NAAM_ZWM)),
+            EC.presence_of_element_located((By.XPATH, self.NAAM_MWM))), legacy=8)
+
+        self.logged_in = self.is_logged_in()
+        return self.logged_in
+
+    def ensure_logged_in(self):
+        """Start the browser and log in if needed; cheap when the session is still valid"""
+        if self.driver is None:
+            self.start()
+        elif self.logged_in:
+            self.driver.get('https://www.marktplaats.nl')
+            self.waiter.settle('homepage', legacy=5)
+            if self.is_logged_in():
+                return True
+        return self.log_in()
+
+    def open_my_ads(self):
+        """Open "Mijn advertenties" through the account menu; returns False if not logged in"""
+        if check_exists_by_xpath(self.driver, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[3]/div/button') != False:
+            naam_dropdown = self.driver.find_element(By.XPATH, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[3]/div/button')
+            naam_dropdown.click()
+            mijn_advertenties = self.waiter.until('account_menu', EC.element_to_be_clickable((By.XPATH, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[3]/div/ul/li[1]/a')), legacy=1, required=True)
+            mijn_advertenties.click()
+            self.waiter.settle('my_ads', legacy=2)
+        elif check_exists_by_xpath(self.driver, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[4]/div/button') != False:
+            naam_dropdown = self.driver.find_element(By.XPATH, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[4]/div/button')
+            naam_dropdown.click()
+            mijn_advertenties = self.waiter.until('account_menu', EC.element_to_be_clickable((By.XPATH, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[4]/div/ul/li[1]/a')), legacy=1, required=True)
+            mijn_advertenties.click()
+            self.waiter.settle('my_ads', legacy=2)
+        else:
+            print("ERROR: Not logged in")
+            return False
 
-        # Find and click the login button
-        try:
-            inloggen_submit = WebDriver.find_element(By.XPATH, "//button[contains(text(), 'Inloggen met je e-mailadres')]")
-            inloggen_submit.click()
-            time.sleep(5)
-        except:
-            # Alternative: press Enter on password field
-            form_password.send_keys('\n')
-            time.sleep(5)
-        
-    except Exception:
-        # Already logged in
-        pass
-
-# Wait for login to complete and page to load
-time.sleep(3)
-
-if check_exists_by_xpath('//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[3]/div/button') != False:
-    naam_dropdown = WebDriver.find_element(By.XPATH, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[3]/div/button')
-    naam_dropdown.click()
-    time.sleep(1)
-    mijn_advertenties = WebDriver.find_element(By.XPATH, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[3]/div/ul/li[1]/a')
-    mijn_advertenties.click()
-    time.sleep(2)
-elif check_exists_by_xpath('//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[4]/div/button') != False:
-    naam_dropdown = WebDriver.find_element(By.XPATH, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[4]/div/button')
-    naam_dropdown.click()
-    time.sleep(1)
-    mijn_advertenties = WebDriver.find_element(By.XPATH, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[4]/div/ul/li[1]/a')
-    mijn_advertenties.click()
-    time.sleep(2)
-else:
-    print("ERROR: Not logged in")
-    WebDriver.close()
-    exit(1)
-
-meer_advertenties = '//*[@id="load-more-row"]/div/a'
-
-while check_exists_by_xpath(meer_advertenties) != False:
-
-    toon_meer_advertenties = WebDriver.find_element(By.XPATH, '//*[@id="load-more-row"]/div/a')
-    toon_meer_advertenties.click()
-    time.sleep(3)
-
-my_list = [d for d in os.listdir('ads') if os.path.isdir(os.path.join('ads', d)) and d != '.tmp.driveupload']
-print(f"Found {len(my_list)} ad folders locally")
-
-# Get existing ads from Marktplaats using flexible selector
-advertentie_naam_div = WebDriver.find_elements(By.XPATH, '//*[contains(@class, "ad-listing")]//div[@class="description-title"]')
-
-advertentie_online_list = []
-
-for i in advertentie_naam_div:
-    try:
-        advertenties_op_marktplaats = i.find_element(By.TAG_NAME, 'span').text
-        advertentie_online_list.append(advertenties_op_marktplaats)
-    except:
-        continue
+        return True
 
-print(f"Found {len(advertentie_online_list)} ads online, {len(my_list)} ads locally")
+    def load_all_listings(self):
+        """Click "load more" until every ad on "Mijn advertenties" is shown"""
+        meer_advertenties = '//*[@id="load-more-row"]/div/a'
+        advertentie_rij = (By.XPATH, '//*[contains(@class, "ad-listing")]')
 
-ads_niet_op_marktplaats = [i for i in my_list if i not in advertentie_online_list]
+        while check_exists_by_xpath(self.driver, meer_advertenties) != False:
 
-if ads_niet_op_marktplaats:
-    print(f"Posting {len(ads_niet_op_marktplaats)} new ads: {', '.join(ads_niet_op_marktplaats)}")
-else:
-    print("All ads already online")
+            geladen_advertenties = len(self.driver.find_elements(*advertentie_rij))
+            toon_meer_advertenties = self.driver.find_element(By.XPATH, '//*[@id="load-more-row"]/div/a')
+            toon_meer_advertenties.click()
+            # Continue as soon as the next page of listings has been appended
+            if self.waiter.until('load_more', element_count_above(advertentie_rij, geladen_advertenties), legacy=3) is None:
+                break
 
+    def get_listings(self):
+        """Get title, ad id and expiry date of the ads currently shown on "Mijn advertenties"."""
+        # Get existing ads from Marktplaats using flexible selector
+        advertentie_rijen = self.driver.find_elements(By.XPATH, '//*[contains(@class, "ad-listing")]')
 
-for i in ads_niet_op_marktplaats:
-    print(f"\nProcessing: {i}")
+        advertentie_online_list = []
 
-    # Navigate to homepage first, then click "Plaats advertentie"
-    try:
-        WebDriver.get('https://www.marktplaats.nl')
-        time.sleep(5)
-        
-        # Try to find and click the "Plaats advertentie" button
-        if check_exists_by_xpath('//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[6]/a') != False:
-            plaats_advertentie = WebDriver.find_element(By.XPATH, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[6]/a')
-            plaats_advertentie.click()
-            time.sleep(3)
-        elif check_exists_by_xpath('//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[5]/a') != False:
-            plaats_advertentie = WebDriver.find_element(By.XPATH, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[5]/a')
-            plaats_advertentie.click()
-            time.sleep(3)
+        for rij in advertentie_rijen:
+            try:
+                titel = rij.find_element(By.XPATH, './/div[@class="description-title"]//span').text
+            except:
+                continue
+            links = [a.get_attribute('href') for a in rij.find_elements(By.TAG_NAME, 'a')]
+            advertentie_online_list.append({
+                'title': titel,
+                'adId': extract_ad_id(rij.get_attribute('data-item-id'), rij.get_attribute('id'), *links),
+                'expires': parse_expiry(rij.text)
+            })
+
+        return advertentie_online_list
+
+    def fetch_listings(self, full=True):
+        """Open "Mijn advertenties" and return its listings
+
+        With full=False only the first page (the newest ads) is read, which
+        skips clicking "load more" through every page.
+        """
+        if not self.open_my_ads():
+            return None
+        if full:
+            self.load_all_listings()
+        return self.get_listings()
+
+
+def local_ad_folders(ads_dir='ads'):
+    """Names of the ad folders in ads_dir"""
+    return [d for d in os.listdir(ads_dir) if os.path.isdir(os.path.join(ads_dir, d)) and d != '.tmp.driveupload']
+
+
+class AdPoster:
+    """Posts ad folders through one or more logged-in MarktplaatsSessions
+
+    The sessions (and their logins) are kept between calls to post(), so a
+    long-running process can post new batches without restarting Chrome.
+    """
+
+    PHOTO_INPUT = (By.ID, 'imageUploader-hiddenInput')
+    # Thumbnails of finished uploads, and uploads still in progress
+    PHOTO_THUMBNAIL = (By.CSS_SELECTOR, '[id^="imageUploader"] [class*="thumbnail"] img, [data-testid*="image-thumbnail"] img')
+    PHOTO_BUSY = (By.CSS_SELECTOR, '[id^="imageUploader"] [class*="progress"], [id^="imageUploader"] [class*="spinner"], [id^="imageUploader"] [class*="loading"]')
+    PHOTO_ERROR = (By.CSS_SELECTOR, '[id^="imageUploader"] [class*="error"], [id^="imageUploader"] [role="alert"]')
+
+    def __init__(self, session, workers=1):
+        self.session = session
+        self.workers = max(1, workers)
+        self.extra_sessions = []
+        self.inventory = AdInventory()
+        self.manifest = AdManifest()
+        self.journal = PostingJournal()
+        self.tracer = Tracer()
+        self.scheduler = PostingScheduler(POSTS_PER_HOUR, POSTING_HOURS)
+        self.posted_ids = {}
+        # False once an upload showed no thumbnail at all: PHOTO_THUMBNAIL does not match the page
+        self.thumbnails_seen = None
+        self.preparer = PhotoPreparer(cache=PhotoCache(max_bytes=PHOTO_CACHE_MB * 1024 * 1024),
+                                      workers=PHOTO_WORKERS, max_size=PHOTO_MAX_SIZE, quality=PHOTO_QUALITY)
+
+    def close(self):
+        """Quit the browsers of the extra workers and the photo processes"""
+        for worker_session in self.extra_sessions:
+            worker_session.close()
+        self.extra_sessions = []
+        self.preparer.close()
+
+    def refresh_inventory(self, full_sweep=False):
+        """Bring the cached online inventory up to date; returns False if not logged in
+
+        Only the newest page of "Mijn advertenties" is read, unless a full
+        sweep is due (INVENTORY_FULL_SWEEP_HOURS since the last one, or a
+        cached ad has passed its expiry date) or requested.
+        """
+        full = full_sweep or self.inventory.needs_full_sweep(interval=timedelta(hours=INVENTORY_FULL_SWEEP_HOURS))
+        with self.tracer.span('inventory_refresh', full=full):
+            listings = self.session.fetch_listings(full)
+        if listings is None:
+            return False
+
+        self.inventory.update(listings, full)
+        self.inventory.save()
+        self.scheduler.observe(self.inventory)
+        self.scheduler.save()
+        if full:
+            print(f"Full sweep: {len(listings)} ads online")
         else:
-            # Fallback: navigate directly
-            WebDriver.get('https://www.marktplaats.nl/plaatsen/')
-            time.sleep(5)
-    except Exception as e:
-        print(f"Navigation error: {e}")
-        continue
-
-    # Wait for the ad creation page to load
-    wait = WebDriverWait(WebDriver, 15)
-    input_advertentienaam = wait.until(EC.presence_of_element_located((By.ID, 'TextField-vulEenTitelIn')))
-    input_advertentienaam.send_keys(i)
-    time.sleep(2)
-
-    # Read index.txt and split category line from description
-    with open(f'ads/{i}/index.txt', 'r', encoding='utf-8') as f:
-        content = f.read()
+            print(f"Refreshed {len(listings)} newest ads, {len(self.inventory.ads)} ads in inventory")
+        return True
+
+    def refresh_manifest(self):
+        """Re-read the ad folders that changed since the last scan"""
+        with self.tracer.span('manifest_scan'):
+            compiled, unchanged, removed = self.manifest.scan()
+        if compiled or removed:
+            self.manifest.save()
+            print(f"Ad manifest: {compiled} compiled, {unchanged} unchanged, {removed} removed")
+
+    def find_missing_ads(self, full_sweep=False):
+        """Return the local ad folders that are not online, or None if not logged in"""
+        self.refresh_manifest()
+        my_list = self.manifest.names()
+        print(f"Found {len(my_list)} ad folders locally")
+
+        if not self.refresh_inventory(full_sweep):
+            return None
+
+        local_ads = {name: {'modified': self.manifest[name]['modified']} for name in my_list}
+        diff = reconcile(local_ads, self.inventory.ads)
+        print(f"Found {len(self.inventory.ads)} ads online, {len(my_list)} ads locally: {diff.summary()}")
+        if diff.to_renew:
+            print(f"Expiring soon: {', '.join(diff.to_renew)}")
+        if diff.changed:
+            print(f"Changed locally since posting: {', '.join(diff.changed)}")
+        if diff.orphaned:
+            print(f"Online without a local folder: {', '.join(diff.orphaned)}")
+        for name, titles in diff.ambiguous.items():
+            print(f"Warning: '{name}' shares its online match with other folders ({', '.join(titles)}), posting it")
+
+        return diff.to_post
+
+    def _worker_session(self, worker_id):
+        """Get (starting and logging in if needed) the session of an extra worker"""
+        while len(self.extra_sessions) < worker_id:
+            self.extra_sessions.append(MarktplaatsSession(len(self.extra_sessions) + 1))
+        worker_session = self.extra_sessions[worker_id - 1]
+        if not worker_session.ensure_logged_in():
+            return None
+        return worker_session
+
+    def prioritize(self, ad_names, first=()):
+        """Posting score of each ad; ads in first (an interrupted run) go before everything else"""
+        # Expiry dates are kept per online title; match them to all folders so truncated titles count too
+        expiries = expiries_by_ad(self.manifest.names(), self.scheduler.expiries)
+        scorer = PriorityScorer(expiries=expiries, failures=failure_counts(self.journal.events()))
+        scores = {name: scorer.score(name, self.manifest.ads.get(name)) for name in ad_names}
+        for name in first:
+            if name in scores:
+                scores[name] = float('inf')
+        return scores
+
+    def post(self, ad_names, scores=None):
+        """Post ads with a pool of browser workers pulling from one shared priority queue
+
+        Worker 0 uses the main session; the others start their own Chrome
+        and log in once, then stay open for later batches. At most
+        MAX_POSTS_PER_ACCOUNT ads are being posted at the same time, however
+        many browsers are open. Ads that fail the offline validation are
+        skipped before any browser time is spent on them.
+
+        The highest score is posted first (scores from prioritize() when not
+        given). Ad folders that appear during the run are scored and queued
+        too, so a valuable new ad does not wait for the whole backlog; with
+        an hourly budget they take the place of the lowest-scoring ads.
+        """
+        self.refresh_manifest()
+        results = {}
+        problems = validate_all(self.manifest, [name for name in ad_names if name in self.manifest])
+        for ad_name in ad_names:
+            errors = problems[ad_name][0] if ad_name in problems else ["ad folder not found"]
+            if errors:
+                print(f"Skipping {ad_name}: {'; '.join(errors)}")
+                results[ad_name] = False
+        ad_names = [name for name in ad_names if name not in results]
+
+        if ad_names:
+            self.journal.start_run(ad_names)
+        if scores is None:
+            scores = self.prioritize(ad_names)
+        budget = self.scheduler.remaining_budget()
+        queue = PostingQueue(None if budget is None else max(budget, len(ad_names)))
+        for ad_name in ad_names:
+            queue.put(ad_name, scores.get(ad_name, 0.0))
+        # Prepare the photos of the whole batch while the browsers fill in forms,
+        # reusing the photo hashes of the manifest scan
+        for ad_name in ad_names:
+            for photo in self.manifest.ads.get(ad_name, {}).get('photos', []):
+                source = os.path.abspath(os.path.join('ads', ad_name, 'photos', photo['name']))
+                self.preparer.cache.remember(source, photo['size'], photo['mtime'], photo['sha256'])
+        self.preparer.submit_all(ad_names)
+
+        account_slots = threading.BoundedSemaphore(max(1, MAX_POSTS_PER_ACCOUNT))
+        known = set(local_ad_folders())
+        admit_lock = threading.Lock()
+        last_admit = [time.monotonic()]
+
+        def admit_new_ads():
+            """Queue ad folders that appeared since the run started"""
+            if not admit_lock.acquire(blocking=False):
+                return
+            try:
+                if time.monotonic() - last_admit[0] < ADMIT_INTERVAL:
+                    return
+                last_admit[0] = time.monotonic()
+                new_ads = [name for name in local_ad_folders()
+                           if name not in known and folder_age(os.path.join('ads', name)) >= SETTLE_TIME]
+                if not new_ads:
+                    return
+                known.update(new_ads)
+                self.refresh_manifest()
+                problems = validate_all(self.manifest, [name for name in new_ads if name in self.manifest])
+                new_ads = [name for name in new_ads if name in problems and not problems[name][0]]
+                new_scores = self.prioritize(new_ads)
+                self.preparer.submit_all(new_ads)
+                for ad_name in new_ads:
+                    dropped = queue.put(ad_name, new_scores[ad_name])
+                    if dropped != ad_name:
+                        print(f"+ Queued new ad {ad_name} (score {new_scores[ad_name]:.0f})")
+                    if dropped is not None:
+                        print(f"= {dropped} moved to a later run to stay within the hourly budget")
+            finally:
+                admit_lock.release()
+
+        def work(worker_id):
+            if worker_id == 0:
+                worker_session = self.session
+            else:
+                try:
+                    worker_session = self._worker_session(worker_id)
+                except Exception as e:
+                    print(f"[worker {worker_id}] ERROR: Could not start browser: {e}")
+                    return
+                if worker_session is None:
+                    print(f"[worker {worker_id}] ERROR: Not logged in, worker stopped")
+                    return
+
+            while True:
+                admit_new_ads()
+                try:
+                    ad_name = queue.get_nowait()
+                except Empty:
+                    break
+                with account_slots:
+                    timer = self.tracer.timer(ad_name)
+                    try:
+                        results[ad_name] = self.post_ad(worker_session, ad_name, timer)
+                        if results[ad_name]:
+                            self.scheduler.record(1)
+                        else:
+                            self.journal.record(ad_name, FAILED)
+                    except Exception as e:
+                        print(f"[worker {worker_id}] ERROR: {ad_name} failed: {e}")
+                        results[ad_name] = False
+                        self.journal.record(ad_name, FAILED, error=str(e))
+                    timer.finish(results[ad_name])
+
+        threads = [threading.Thread(target=work, args=(worker_id,), name=f"worker-{worker_id}")
+                   for worker_id in range(min(self.workers, len(ad_names)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Posted ads show up on the newest page, so the next delta refresh picks up their id and expiry
+        for ad_name, success in results.items():
+            if success:
+                self.inventory.record_posted(ad_name, self.posted_ids.get(ad_name))
+        self.inventory.save()
+        self.scheduler.save()
+        self.preparer.finish_batch()
+        if ad_names:
+            self.journal.finish_run(posted=sum(results.values()), failed=len(results) - sum(results.values()))
+        return results
+
+    def resume(self):
+        """Pick up the run that was interrupted last time, if any; returns its unfinished ads
+
+        Ads of that run that were submitted are added to the inventory as
+        online, so they are not posted twice. The rest is returned so it can
+        be posted first.
+        """
+        run = self.journal.interrupted_run()
+        if run is None:
+            return []
+
+        done = [ad_name for ad_name, state in run['states'].items() if state in POSTED_STATES]
+        for ad_name in done:
+            self.inventory.record_posted(ad_name, run['adIds'].get(ad_name))
+        self.inventory.save()
+        remaining = [ad_name for ad_name in run['ads'] if ad_name not in done]
+        self.journal.finish_run(run['run'], resumed=True)
+        print(f"Resuming interrupted run {run['run']}: {len(done)} ads already submitted, {len(remaining)} left")
+        return remaining
+
+    def report(self):
+        """Print the wait report of all workers and the step timings of the run"""
+        # The session's current waiter: a restarted browser gets a new one
+        waiter = self.session.waiter
+        if waiter is not None:
+            for worker_session in self.extra_sessions:
+                if worker_session.waiter is not None:
+                    waiter.merge(worker_session.waiter)
+                    worker_session.waiter.stats = {}
+            waiter.report()
+        self.tracer.summary()
+
+    def run_once(self, full_sweep=False):
+        """Post every local ad that is not online; returns {ad_name: success} or None if not logged in"""
+        if not self.session.ensure_logged_in():
+            return None
+
+        unfinished = self.resume()
+        ads_niet_op_marktplaats = self.find_missing_ads(full_sweep)
+        if ads_niet_op_marktplaats is None:
+            return None
+        # Highest score first within the hourly posting budget; an interrupted run is continued before anything new
+        scores = self.prioritize(ads_niet_op_marktplaats, unfinished)
+        ads_niet_op_marktplaats, deferred = self.scheduler.select(ads_niet_op_marktplaats,
+                                                                 key=lambda name: -scores[name])
+        if deferred:
+            slots = self.scheduler.next_slots(len(deferred))
+            if len(slots) < len(deferred):
+                # No budget (left) within the search window, e.g. POSTS_PER_HOUR 0 or empty POSTING_HOURS
+                finished = f"posting them all takes more than {SLOT_SEARCH_DAYS} days"
+            else:
+                finished = f"all posted by about {slots[-1]:%a %H:00}"
+            print(f"Budget of {POSTS_PER_HOUR} posts per hour: {len(deferred)} ads deferred, {finished}")
+
+        if ads_niet_op_marktplaats:
+            print(f"Posting {len(ads_niet_op_marktplaats)} new ads: {', '.join(ads_niet_op_marktplaats)}")
+        else:
+            print("All ads already online")
+
+        results = self.post(ads_niet_op_marktplaats, scores)
+        if results:
+            print(f"\nPosted {sum(results.values())} of {len(results)} ads")
+        return results
+
+    def watch(self, interval=10, min_age=SETTLE_TIME, full_check_interval=3600):
+        """Keep running: post new ad folders as soon as they appear in ads/
+
+        A folder is posted once nothing in it changed for min_age seconds, so
+        photos that are still being copied are not uploaded half-way. Every
+        full_check_interval seconds all ads are compared with the online
+        inventory again to repost expired ones, as far as the hourly posting
+        budget allows.
+        """
+        known = set(local_ad_folders())
+        last_full_check = 0.0
+        print(f"Watching ads/ for new folders (every {interval}s, Ctrl+C to stop)")
+        while True:
+            if time.time() - last_full_check >= full_check_interval:
+                if self.run_once() is not None:
+                    last_full_check = time.time()
+                known = set(local_ad_folders())
+
+            new_ads = [name for name in local_ad_folders()
+                       if name not in known and folder_age(os.path.join('ads', name)) >= min_age]
+            if new_ads:
+                self.refresh_manifest()
+                scores = self.prioritize(new_ads)
+                # Ads over the hourly budget are posted by a later full check
+                new_ads = self.scheduler.select(new_ads, key=lambda name: -scores[name])[0]
+            if new_ads and self.session.ensure_logged_in():
+                print(f"\nNew ad folders: {', '.join(new_ads)}")
+                results = self.post(new_ads, scores)
+                # Failed ads are retried by the next full check; results also has the ads queued during the run
+                known.update(new_ads)
+                known.update(results)
+                print(f"Posted {sum(results.values())} of {len(results)} new ads")
+
+            time.sleep(interval)
+
+    def upload_photos(self, session, paths, timer=None):
+        """Upload photos and wait until their thumbnails appear; returns the number uploaded
+
+        All paths go to the file input in one newline-joined send_keys when
+        it accepts multiple files, otherwise one at a time. Each batch may
+        take photo_each seconds per photo. Missing photos are only sent again,
+        up to PHOTO_UPLOAD_ATTEMPTS times in total, when part of the batch
+        did show up or the uploader shows an error; otherwise a resend could
+        add duplicates. When no thumbnail is ever found, the uploads cannot be
+        checked: they are counted as sent and later batches only wait for the
+        network to go quiet.
+        """
+        driver = session.driver
+        waiter = session.waiter
+        remaining = list(paths)
+        uploaded = 0
+
+        for attempt in range(max(1, PHOTO_UPLOAD_ATTEMPTS)):
+            if not remaining:
+                break
+            if attempt:
+                print(f"Retrying {len(remaining)} photo(s)")
+            file_input = waiter.until('photo_input', EC.presence_of_element_located(self.PHOTO_INPUT), required=True)
+            batches = [remaining] if file_input.get_attribute('multiple') else [[path] for path in remaining]
+
+            failed = []
+            for batch in batches:
+                before = len(driver.find_elements(*self.PHOTO_THUMBNAIL))
+                driver.find_element(*self.PHOTO_INPUT).send_keys('\n'.join(batch))
+                if self.thumbnails_seen is False:
+                    # Nothing to count, so wait for the network to go quiet like before the thumbnail check
+                    waiter.settle('photo_upload', legacy=2 * len(batch), group='photo_upload')
+                    uploaded += len(batch)
+                    if timer:
+                        timer.mark('photo' if len(batch) == 1 else 'photos', photos=len(batch), uploaded=len(batch))
+                    continue
+                waiter.until('photo_upload', uploads_complete(self.PHOTO_THUMBNAIL, self.PHOTO_BUSY, before + len(batch)),
+                             legacy=2 * len(batch), timeout=waiter.timeout_for('photo_each') * len(batch))
+                after = len(driver.find_elements(*self.PHOTO_THUMBNAIL))
+                done = max(0, min(len(batch), after - before))
+                if after:
+                    self.thumbnails_seen = True
+                elif not self.thumbnails_seen and not driver.find_elements(*self.PHOTO_ERROR):
+                    print("Warning: no photo thumbnails found on the page, so uploads cannot be checked "
+                          "(AdPoster.PHOTO_THUMBNAIL may be out of date); photos are not sent again")
+                    self.thumbnails_seen = False
+                    done = len(batch)
+                uploaded += done
+                if timer:
+                    timer.mark('photo' if len(batch) == 1 else 'photos', photos=len(batch), uploaded=done)
+                if done < len(batch):
+                    if driver.find_elements(*self.PHOTO_BUSY):
+                        # Still uploading: sending the photos again would add duplicates
+                        print(f"Warning: {len(batch) - done} photo(s) still uploading after the timeout")
+                    elif done or driver.find_elements(*self.PHOTO_ERROR):
+                        # The uploader adds thumbnails in order, so the missing ones are at the end
+                        failed.extend(batch[done:])
+                    else:
+                        print(f"Warning: {len(batch) - done} photo(s) not confirmed, not sent again to avoid duplicates")
+            remaining = failed
+
+        for path in remaining:
+            print(f"ERROR: Could not upload photo {os.path.basename(path)}")
+        return uploaded
+
+    def post_ad(self, session, ad_name, timer=None):
+        """Fill in and submit the "Plaats advertentie" form for one ad folder; returns True on success
+
+        Each step is timed by timer (a tracing.StepTimer).
+        """
+        timer = timer or self.tracer.timer(ad_name)
+        driver = session.driver
+        waiter = session.waiter
+        print(f"\nProcessing: {ad_name}")
+
+        if ad_name not in self.manifest:
+            print(f"ERROR: Ad folder '{ad_name}' not found")
+            return False
+        # Category line fields, description and category IDs were parsed by the manifest scan
+        ad = self.manifest[ad_name]
+        file_contents = ad['fields']
+        beschrijving_text = ad['description']
+        if len(file_contents) < 3:
+            print(f"ERROR: Category line of '{ad_name}' has fewer than 3 levels")
+            return False
+        self.journal.record(ad_name, 'started')
+
+        # Navigate to homepage first, then click "Plaats advertentie"
+        try:
+            driver.get('https://www.marktplaats.nl')
+            waiter.settle('homepage', legacy=5)
+        
+            # Try to find and click the "Plaats advertentie" button
+            if check_exists_by_xpath(driver, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[6]/a') != False:
+                plaats_advertentie = driver.find_element(By.XPATH, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[6]/a')
+                plaats_advertentie.click()
+            elif check_exists_by_xpath(driver, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[5]/a') != False:
+                plaats_advertentie = driver.find_element(By.XPATH, '//*[@id="header-root"]/header/div[1]/div[2]/div/ul[2]/li[5]/a')
+                plaats_advertentie.click()
+            else:
+                # Fallback: navigate directly
+                driver.get('https://www.marktplaats.nl/plaatsen/')
+        except Exception as e:
+            print(f"Navigation error: {e}")
+            return False
+
+        # Wait for the ad creation page to load
+        input_advertentienaam = waiter.until('place_ad_page', EC.presence_of_element_located((By.ID, 'TextField-vulEenTitelIn')), legacy=5, group='page_load', required=True)
+        timer.mark('navigation')
+        input_advertentienaam.send_keys(ad_name)
+        timer.mark('title')
+
+        parent_id, child_id, grandchild_id = ad['categoryIds']
     
-    parts = content.split('\n---\n', 1)
-    category_line = parts[0].strip()
-    beschrijving_text = parts[1].strip() if len(parts) > 1 else ""
+        if parent_id:
+            eerste_select = Select(driver.find_element(By.ID, 'cat_sel_1'))
+            eerste_select.select_by_value(str(parent_id))
+            print(f"Category 1 selected: {file_contents[0]} (ID: {parent_id})")
+            timer.mark('category_1')
+        else:
+            print(f"ERROR: Could not find parent category '{file_contents[0]}'")
+            return False
+
+        if child_id:
+            # The second dropdown is filled in after the first one is selected
+            waiter.until('category_2', EC.presence_of_element_located((By.CSS_SELECTOR, f'#cat_sel_2 option[value="{child_id}"]')), legacy=2, group='category')
+            tweede_select = Select(driver.find_element(By.ID, 'cat_sel_2'))
+            tweede_select.select_by_value(str(child_id))
+            print(f"Category 2 selected: {file_contents[1]} (ID: {child_id})")
+            timer.mark('category_2')
+        else:
+            print(f"ERROR: Could not find child category '{file_contents[1]}'")
+            return False
+
+        if grandchild_id:
+            waiter.until('category_3', EC.presence_of_element_located((By.CSS_SELECTOR, f'#cat_sel_3 option[value="{grandchild_id}"]')), legacy=2, group='category')
+            derde_select = Select(driver.find_element(By.ID, 'cat_sel_3'))
+            derde_select.select_by_value(str(grandchild_id))
+            print(f"Category 3 selected: {file_contents[2]} (ID: {grandchild_id})")
+            timer.mark('category_3')
+        else:
+            print(f"ERROR: Could not find grandchild category '{file_contents[2]}'")
+            return False
+
+        # Find and click submit button
+        try:
+            submit_button = waiter.until('category_submit', EC.element_to_be_clickable((By.CSS_SELECTOR, '[data-testid="redirectToPlaceAd"]')), legacy=2, group='category', required=True)
+            submit_button.click()
+            self.journal.record(ad_name, 'category_set', categoryIds=[parent_id, child_id, grandchild_id])
+            timer.mark('category_submit')
+        except Exception as e:
+            print(f"ERROR: Could not find submit button: {e}")
+            return False
+
+        # Wait for the ad form with the photo uploader to load
+        waiter.until('ad_form', EC.presence_of_element_located((By.ID, 'imageUploader-hiddenInput')), legacy=5, group='page_load')
+        timer.mark('form_load')
+
+        # Description already loaded from the manifest
+        # Photos were rotated, resized and converted to JPEG by the preparer in the background,
+        # or come straight from the photo cache when the ad was posted before
+        photo_paths = self.preparer.photos(ad_name)
+        timer.mark('photo_prepare', photos=len(photo_paths))
+        try:
+            uploaded = self.upload_photos(session, photo_paths, timer)
+            print(f"Photos uploaded: {uploaded} of {len(photo_paths)}")
+            self.journal.record(ad_name, 'photos_uploaded', photos=uploaded)
+        except Exception as e:
+            print(f"ERROR: Could not upload photos: {e}")
+
+        # Fill in description using new rich text editor (from the manifest)
+        try:
+            description_field = waiter.until('description', EC.presence_of_element_located((By.CSS_SELECTOR, '[data-testid="text-editor-input_nl-NL"]')), legacy=4, required=True)
+            description_field.send_keys(beschrijving_text)
+        except Exception as e:
+            print(f"ERROR: Could not fill description: {e}")
+            return False
+        timer.mark('description')
+
+        # Format: Parent--Child--Grandchild--Subject--Year--Condition--PriceType--Price--PackageSize
+        # Example: Boeken--Kunst en Cultuur--Beeldend--Beeldhouwkunst--1997--Gelezen--Bieden----Klein pakket
     
-    # Parse category fields
-    file_contents = category_line.split("--")
+        # Subject (if exists - field 3 for books)
+        if len(file_contents) > 3 and file_contents[3]:
+            try:
+                subject_select = Select(driver.find_element(By.ID, 'singleSelectAttribute[subject]'))
+                subject_select.select_by_visible_text(file_contents[3])
+                print(f"Subject selected: {file_contents[3]}")
+            except:
+                print(f"Subject field not found or couldn't select '{file_contents[3]}'")
     
-    # Look up category IDs from scraped data
-    parent_id, child_id, grandchild_id = find_category_ids(file_contents[0], file_contents[1], file_contents[2])
+        # Year (if exists - field 4)
+        if len(file_contents) > 4 and file_contents[4]:
+            try:
+                year_input = driver.find_element(By.ID, 'numericAttribute[yearOriginal]')
+                year_input.send_keys(file_contents[4])
+            except:
+                pass
     
-    if parent_id:
-        eerste_select = Select(WebDriver.find_element(By.ID, 'cat_sel_1'))
-        eerste_select.select_by_value(str(parent_id))
-        print(f"Category 1 selected: {file_contents[0]} (ID: {parent_id})")
-        time.sleep(2)
-    else:
-        print(f"ERROR: Could not find parent category '{file_contents[0]}'")
-        continue
-
-    if child_id:
-        tweede_select = Select(WebDriver.find_element(By.ID, 'cat_sel_2'))
-        tweede_select.select_by_value(str(child_id))
-        print(f"Category 2 selected: {file_contents[1]} (ID: {child_id})")
-        time.sleep(2)
-    else:
-        print(f"ERROR: Could not find child category '{file_contents[1]}'")
-        continue
-
-    if grandchild_id:
-        derde_select = Select(WebDriver.find_element(By.ID, 'cat_sel_3'))
-        derde_select.select_by_value(str(grandchild_id))
-        print(f"Category 3 selected: {file_contents[2]} (ID: {grandchild_id})")
-        time.sleep(2)
-    else:
-        print(f"ERROR: Could not find grandchild category '{file_contents[2]}'")
-        continue
-
-    # Find and click submit button
-    try:
-        wait = WebDriverWait(WebDriver, 10)
-        submit_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, '[data-testid="redirectToPlaceAd"]')))
-        submit_button.click()
-        time.sleep(5)
-    except Exception as e:
-        print(f"ERROR: Could not find submit button: {e}")
-        continue
-
-    # Description already loaded from index.txt
-    photos_folder = f'ads/{i}/photos'
-    my_photos = os.listdir(photos_folder)
-    upload_vak = 0
-
-    for i in my_photos:
-        path = f'{photos_folder}/{i}'
-        newphoto = i
-        # Check if image needs rotation (skip PNG files)
-        if not path.lower().endswith('.png'):
+        # Condition (if exists - field 5)
+        if len(file_contents) > 5 and file_contents[5]:
             try:
+                condition_select = Select(driver.find_element(By.ID, 'singleSelectAttribute[condition]'))
+                condition_select.select_by_visible_text(file_contents[5])
+            except:
+                pass
 
-                image = Image.open(path)
-
-                for orientation in ExifTags.TAGS.keys():
-                    if ExifTags.TAGS[orientation]=='Orientation':
-                        break
-                    
-                exif = image._getexif()
-                print(exif[orientation])
-                image.close()
-                image = Image.open(path).convert('RGBA')
-
-                if exif[orientation] == 3:
-                    image=image.rotate(180, expand=True)
-                    image.save(path  + ".PNG", "PNG")
-                    os.remove(path)
-                    newphoto = i + ".PNG"
-                elif exif[orientation] == 6:
-                    image=image.rotate(270, expand=True)
-                    image.save(path  + ".PNG", "PNG")
-                    os.remove(path)
-                    newphoto = i + ".PNG"
-                elif exif[orientation] == 8:
-                    image=image.rotate(90, expand=True)
-                    image.save(path  + ".PNG", "PNG")
-                    os.remove(path)
-                    newphoto = i + ".PNG"
-                        
-            except (AttributeError, KeyError, IndexError, TypeError):
-                # cases: image don't have getexif
+        # Price type (field 6)
+        if len(file_contents) > 6 and file_contents[6]:
+            try:
+                price_type_select = Select(driver.find_element(By.ID, 'Dropdown-prijstype'))
+                price_type_select.select_by_visible_text(file_contents[6])
+            except:
                 pass
 
-        # Upload photo using the file input
-        try:
-            wait = WebDriverWait(WebDriver, 10)
-            file_input = wait.until(EC.presence_of_element_located((By.ID, 'imageUploader-hiddenInput')))
-            path = f'{os.getcwd()}/{photos_folder}/{newphoto}'
-            file_input.send_keys(path)
-            print(f"Photo uploaded: {newphoto}")
-            time.sleep(2)  # Wait for upload to process
-        except Exception as e:
-            print(f"ERROR: Could not upload photo {newphoto}: {e}")
-            continue
-    
-    time.sleep(2)
+        # Delivery method - Ophalen of Verzenden should already be selected
+        # Carriers - Leave as default (PostNL and DHL checked)
 
-    # Fill in description using new rich text editor (from index.txt)
-    try:
-        wait = WebDriverWait(WebDriver, 10)
-        description_field = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, '[data-testid="text-editor-input_nl-NL"]')))
-        description_field.send_keys(beschrijving_text)
-        time.sleep(2)
-    except Exception as e:
-        print(f"ERROR: Could not fill description: {e}")
-        continue
-
-    # Format: Parent--Child--Grandchild--Subject--Year--Condition--PriceType--Price--PackageSize
-    # Example: Boeken--Kunst en Cultuur--Beeldend--Beeldhouwkunst--1997--Gelezen--Bieden----Klein pakket
-    
-    # Subject (if exists - field 3 for books)
-    if len(file_contents) > 3 and file_contents[3]:
-        try:
-            subject_select = Select(WebDriver.find_element(By.ID, 'singleSelectAttribute[subject]'))
-            subject_select.select_by_visible_text(file_contents[3])
-            print(f"Subject selected: {file_contents[3]}")
-            time.sleep(1)
-        except:
-            print(f"Subject field not found or couldn't select '{file_contents[3]}'")
-    
-    # Year (if exists - field 4)
-    if len(file_contents) > 4 and file_contents[4]:
+        # Package size (if specified - field 8)
+        if len(file_contents) > 8 and file_contents[8]:
+            if file_contents[8] in PACKAGE_SIZE_IDS:
+                try:
+                    package_radio = driver.find_element(By.ID, PACKAGE_SIZE_IDS[file_contents[8]])
+                    package_radio.click()
+                    print(f"Package size selected: {file_contents[8]}")
+                except:
+                    print(f"Could not select package size '{file_contents[8]}'")
+
+        # Deselect phone number display
         try:
-            year_input = WebDriver.find_element(By.ID, 'numericAttribute[yearOriginal]')
-            year_input.send_keys(file_contents[4])
-            time.sleep(1)
+            phone_switch = driver.find_element(By.ID, 'syi-phonenumber-switch-input')
+            if phone_switch.is_selected():
+                phone_switch.click()
+                print("Phone number display disabled")
         except:
-            pass
-    
-    # Condition (if exists - field 5)
-    if len(file_contents) > 5 and file_contents[5]:
+            print("Could not find phone number switch")
+        timer.mark('attributes')
+
+        # Select "Gratis" ad type
         try:
-            condition_select = Select(WebDriver.find_element(By.ID, 'singleSelectAttribute[condition]'))
-            condition_select.select_by_visible_text(file_contents[5])
-            time.sleep(1)
-        except:
-            pass
+            gratis_button = waiter.until('ad_type', EC.element_to_be_clickable((By.CSS_SELECTOR, '[data-testid="bundle-option-FREE"]')), legacy=7, required=True)
+            gratis_button.click()
+            print("Gratis ad type selected")
+        except Exception as e:
+            print(f"Could not select Gratis ad type: {e}")
+        timer.mark('ad_type')
 
-    # Price type (field 6)
-    if len(file_contents) > 6 and file_contents[6]:
+        # Submit the ad
         try:
-            price_type_select = Select(WebDriver.find_element(By.ID, 'Dropdown-prijstype'))
-            price_type_select.select_by_visible_text(file_contents[6])
-            time.sleep(1)
-        except:
-            pass
-
-    # Delivery method - Ophalen of Verzenden should already be selected
-    # Carriers - Leave as default (PostNL and DHL checked)
-    time.sleep(1)
-
-    # Package size (if specified - field 8)
-    if len(file_contents) > 8 and file_contents[8]:
-        package_size_map = {
-            'Brievenbuspakje': 'Radio-brievenbuspakje-xs',
-            'Klein pakket': 'Radio-kleinPakket-s',
-            'Gemiddeld pakket': 'Radio-gemiddeldPakket-m',
-            'Groot pakket': 'Radio-grootPakket-l'
-        }
-        if file_contents[8] in package_size_map:
-            try:
-                package_radio = WebDriver.find_element(By.ID, package_size_map[file_contents[8]])
-                package_radio.click()
-                print(f"Package size selected: {file_contents[8]}")
-                time.sleep(1)
-            except:
-                print(f"Could not select package size '{file_contents[8]}'")
+            submit_button = waiter.until('ad_submit', EC.element_to_be_clickable((By.CSS_SELECTOR, '[data-testid="place-listing-submit-button"]')), legacy=2, required=True)
+            submit_button.click()
+            self.journal.record(ad_name, 'submitted')
+            print(f"✓ {ad_name}")
+            # The form page is replaced once the ad has been placed
+            if waiter.until('ad_placed', EC.staleness_of(submit_button), legacy=5, group='submit'):
+                ad_id = extract_ad_id(driver.current_url)
+                if ad_id:
+                    self.posted_ids[ad_name] = ad_id
+                self.journal.record(ad_name, 'confirmed', adId=ad_id)
+            timer.mark('submit')
+        except Exception as e:
+            print(f"ERROR: Could not submit ad: {e}")
+            return False
+
+        return True
 
-    # Deselect phone number display
-    try:
-        phone_switch = WebDriver.find_element(By.ID, 'syi-phonenumber-switch-input')
-        if phone_switch.is_selected():
-            phone_switch.click()
-            print("Phone number display disabled")
-        time.sleep(1)
-    except:
-        print("Could not find phone number switch")
-
-    # Select "Gratis" ad type
-    try:
-        wait = WebDriverWait(WebDriver, 10)
-        gratis_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, '[data-testid="bundle-option-FREE"]')))
-        gratis_button.click()
-        print("Gratis ad type selected")
-        time.sleep(2)
-    except Exception as e:
-        print(f"Could not select Gratis ad type: {e}")
-
-    # Submit the ad
-    try:
-        wait = WebDriverWait(WebDriver, 10)
-        submit_button = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, '[data-testid="place-listing-submit-button"]')))
-        submit_button.click()
-        print(f"✓ {i}")
-        time.sleep(5)
-    except Exception as e:
-        print(f"ERROR: Could not submit ad: {e}")
-        continue
-
-# Close browser
-time.sleep(5)
-WebDriver.close()
-print("\nDone!")
 
+def folder_modified(path):
+    """Time anything in a folder tree was last modified"""
+    newest = os.path.getmtime(path)
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+    return newest
+
+
+def folder_age(path):
+    """Seconds since anything in a folder tree was last modified"""
+    return time.time() - folder_modified(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Repost Marktplaats ads that are no longer online")
+    parser.add_argument('--workers', type=int, default=BROWSER_WORKERS,
+                        help=f"number of parallel browser workers (default {BROWSER_WORKERS})")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and post new ad folders as soon as they appear")
+    parser.add_argument('--interval', type=int, default=10,
+                        help="seconds between checks of the ads folder in --watch mode (default 10)")
+    parser.add_argument('--full-sweep', action='store_true',
+                        help="load every page of \"Mijn advertenties\" instead of only the newest ads")
+    args = parser.parse_args()
+
+    if not CONFIG_FOUND:
+        print("Error: config.py not found!")
+        print("Please copy config.example.py to config.py and fill in your settings.")
+        exit(1)
+
+    session = MarktplaatsSession().start()
+    poster = AdPoster(session, args.workers)
+    try:
+        if args.watch:
+            poster.watch(args.interval)
+        elif poster.run_once(args.full_sweep) is None:
+            exit(1)
+    except KeyboardInterrupt:
+        print("\nStopped")
+    finally:
+        # Close browser
+        poster.report()
+        poster.close()
+        session.close()
+    print("\nDone!")
+
+
+if __name__ == "__main__":
+    main()
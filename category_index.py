@@ -0,0 +1,351 @@
+"""
+Category Index
+In-memory lookup of Marktplaats category IDs, built once per process from the
+scraped category files in the categories folder.
+
+Two backends share the same lookup API:
+- CategoryIndex: dict indexes built from the pretty-printed JSON files
+- CategorySnapshot: memory-mapped compact binary snapshot (categories.bin),
+  decoded lazily so startup cost does not grow with the number of categories
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+
+CATEGORIES_DIR = 'categories'
+SNAPSHOT_FILE = 'categories.bin'
+PATH_SEPARATOR = '--'
+
+# Snapshot layout (little endian):
+#   header   magic, parent/child/grandchild counts, hash slot count,
+#            offsets of the entry table, hash index and string table
+#   entries  fixed-width (id, parent entry index, name offset, name length),
+#            stored parents first, then children, then grandchildren
+#   index    open-addressing hash table of (path hash, entry index + 1)
+#   strings  UTF-8 category names, concatenated
+SNAPSHOT_MAGIC = b'MPCAT\x00\x01\x00'
+HEADER_STRUCT = struct.Struct('<8sIIIIIII')
+ENTRY_STRUCT = struct.Struct('<iiII')
+SLOT_STRUCT = struct.Struct('<QI')
+
+
+def make_path(*names):
+    """Build a Parent--Child--Grandchild path string"""
+    return PATH_SEPARATOR.join(names)
+
+
+def path_hash(path):
+    """Stable 64-bit hash of a category path, used by the snapshot index"""
+    digest = hashlib.blake2b(path.encode('utf-8'), digest_size=8).digest()
+    # 0 marks an empty slot in the hash index
+    return int.from_bytes(digest, 'little') or 1
+
+
+class CategoryLookup:
+    """Shared resolve/batch API; subclasses implement lookup_id()"""
+
+    def lookup_id(self, path):
+        """Return the category ID for a 1-3 level path, or None"""
+        raise NotImplementedError
+
+    def resolve(self, parent_name, child_name, grandchild_name, verbose=True):
+        """Resolve category names to (parent_id, child_id, grandchild_id)
+
+        Each level is an O(1) path lookup, so the caller still gets the IDs of
+        the levels that did match when a deeper level is unknown.
+        """
+        parent_id = self.lookup_id(parent_name)
+        if parent_id is None:
+            if verbose:
+                print(f"Warning: Parent category '{parent_name}' not found")
+            return None, None, None
+
+        child_id = self.lookup_id(make_path(parent_name, child_name))
+        if child_id is None:
+            if verbose:
+                print(f"Warning: Child category '{child_name}' not found under '{parent_name}'")
+            return parent_id, None, None
+
+        grandchild_id = self.lookup_id(make_path(parent_name, child_name, grandchild_name))
+        if grandchild_id is None:
+            if verbose:
+                print(f"Warning: Grandchild category '{grandchild_name}' not found under '{child_name}'")
+            return parent_id, child_id, None
+
+        return parent_id, child_id, grandchild_id
+
+    def resolve_path(self, path, verbose=True):
+        """Resolve a Parent--Child--Grandchild[--...] category line to IDs"""
+        fields = path.strip().split(PATH_SEPARATOR)
+        if len(fields) < 3:
+            if verbose:
+                print(f"Warning: Category line '{path}' has fewer than 3 levels")
+            return None, None, None
+        return self.resolve(fields[0], fields[1], fields[2], verbose)
+
+    def resolve_many(self, paths, verbose=False):
+        """Resolve a batch of category lines, returning {path: ids}"""
+        return {path: self.resolve_path(path, verbose) for path in paths}
+
+    def resolve_ads(self, ads_dir='ads', verbose=False):
+        """Resolve the category line of every ad folder, returning {ad_name: ids}"""
+        results = {}
+        for entry in os.scandir(ads_dir):
+            if not entry.is_dir():
+                continue
+            index_file = os.path.join(entry.path, 'index.txt')
+            try:
+                with open(index_file, encoding='utf-8') as f:
+                    category_line = f.readline()
+            except OSError:
+                results[entry.name] = (None, None, None)
+                continue
+            results[entry.name] = self.resolve_path(category_line, verbose)
+        return results
+
+    def __contains__(self, path):
+        return self.lookup_id(path) is not None
+
+
+class CategoryIndex(CategoryLookup):
+    """Dict-based category lookups by name, (parentId, name) and full path"""
+
+    def __init__(self, parents, children, grandchildren):
+        self.parents = parents
+        self.children = children
+        self.grandchildren = grandchildren
+
+        # Parent names are unique at the top level
+        self.parents_by_name = {p['name']: p for p in parents}
+
+        # Child and grandchild names are only unique below their parent
+        self.children_by_key = {(c['parentId'], c['name']): c for c in children}
+        self.grandchildren_by_key = {(g['parentId'], g['name']): g for g in grandchildren}
+
+        # Grandchild names repeat across the tree, so keep every match
+        self.grandchildren_by_name = {}
+        for g in grandchildren:
+            self.grandchildren_by_name.setdefault(g['name'], []).append(g)
+
+        # Path at any level -> category ID
+        self.ids_by_path = {}
+        for p in parents:
+            self.ids_by_path[p['name']] = p['id']
+        for c in children:
+            self.ids_by_path[make_path(c['parentName'], c['name'])] = c['id']
+        for g in grandchildren:
+            self.ids_by_path[make_path(g['grandparentName'], g['parentName'], g['name'])] = g['id']
+
+    @classmethod
+    def load(cls, directory=CATEGORIES_DIR):
+        """Load the index from parents.json, children.json and grandchildren.json"""
+        with open(os.path.join(directory, 'parents.json'), encoding='utf-8') as f:
+            parents = json.load(f)
+        with open(os.path.join(directory, 'children.json'), encoding='utf-8') as f:
+            children = json.load(f)
+        with open(os.path.join(directory, 'grandchildren.json'), encoding='utf-8') as f:
+            grandchildren = json.load(f)
+        return cls(parents, children, grandchildren)
+
+    def __len__(self):
+        return len(self.grandchildren)
+
+    def lookup_id(self, path):
+        """Return the category ID for a 1-3 level path, or None"""
+        return self.ids_by_path.get(path)
+
+    def iter_paths(self):
+        """Yield (parent, child, grandchild) names for every leaf category"""
+        for g in self.grandchildren:
+            yield g['grandparentName'], g['parentName'], g['name']
+
+    def paths_for_name(self, grandchild_name):
+        """Return every full path ending in the given grandchild name"""
+        return [make_path(g['grandparentName'], g['parentName'], g['name'])
+                for g in self.grandchildren_by_name.get(grandchild_name, [])]
+
+
+def write_snapshot(parents, children, grandchildren, path):
+    """Write the category tree as a compact binary snapshot
+
+    Returns False when the file already held exactly this snapshot.
+    """
+    strings = bytearray()
+    string_refs = {}
+
+    def add_string(name):
+        if name not in string_refs:
+            data = name.encode('utf-8')
+            string_refs[name] = (len(strings), len(data))
+            strings.extend(data)
+        return string_refs[name]
+
+    # Entry rows and the path of each row, in parents/children/grandchildren order
+    rows = []
+    paths = []
+    parent_rows = {}
+    child_rows = {}
+    for p in parents:
+        parent_rows[p['id']] = len(rows)
+        rows.append((p['id'], -1) + add_string(p['name']))
+        paths.append(p['name'])
+    for c in children:
+        child_rows[c['id']] = len(rows)
+        rows.append((c['id'], parent_rows[c['parentId']]) + add_string(c['name']))
+        paths.append(make_path(c['parentName'], c['name']))
+    for g in grandchildren:
+        rows.append((g['id'], child_rows[g['parentId']]) + add_string(g['name']))
+        paths.append(make_path(g['grandparentName'], g['parentName'], g['name']))
+
+    # Keep the hash table at most half full so probe chains stay short
+    slot_count = 1
+    while slot_count < len(rows) * 2:
+        slot_count *= 2
+    slots = [(0, 0)] * slot_count
+    for row_index, row_path in enumerate(paths):
+        h = path_hash(row_path)
+        slot = h & (slot_count - 1)
+        while slots[slot][0]:
+            slot = (slot + 1) & (slot_count - 1)
+        slots[slot] = (h, row_index + 1)
+
+    entries_offset = HEADER_STRUCT.size
+    index_offset = entries_offset + len(rows) * ENTRY_STRUCT.size
+    strings_offset = index_offset + slot_count * SLOT_STRUCT.size
+
+    buffer = bytearray(HEADER_STRUCT.pack(
+        SNAPSHOT_MAGIC, len(parents), len(children), len(grandchildren),
+        slot_count, entries_offset, index_offset, strings_offset))
+    for row in rows:
+        buffer.extend(ENTRY_STRUCT.pack(*row))
+    for slot in slots:
+        buffer.extend(SLOT_STRUCT.pack(*slot))
+    buffer.extend(strings)
+
+    # An identical snapshot is not rewritten, but it is touched: the JSON files may have
+    # changed in fields the snapshot leaves out, and get_category_index() only uses a
+    # snapshot that is at least as new as grandchildren.json
+    if os.path.exists(path) and os.path.getsize(path) == len(buffer):
+        with open(path, 'rb') as f:
+            unchanged = f.read() == buffer
+        if unchanged:
+            os.utime(path)
+            return False
+
+    # Write atomically so readers never map a half-written file
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer)
+    os.replace(tmp_path, path)
+    return True
+
+
+class CategorySnapshot(CategoryLookup):
+    """Memory-mapped category snapshot; entries are decoded on demand"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self.n_parents, self.n_children, self.n_grandchildren, self._slot_count,
+         self._entries_offset, self._index_offset, self._strings_offset) = HEADER_STRUCT.unpack_from(self._map, 0)
+        if magic != SNAPSHOT_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a category snapshot")
+
+    def close(self):
+        """Release the memory map and file handle"""
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.n_grandchildren
+
+    def _entry(self, row_index):
+        """Return (id, parent row, name offset, name length) of a row"""
+        return ENTRY_STRUCT.unpack_from(self._map, self._entries_offset + row_index * ENTRY_STRUCT.size)
+
+    def _name(self, name_offset, name_length):
+        start = self._strings_offset + name_offset
+        return self._map[start:start + name_length].decode('utf-8')
+
+    def _row_names(self, row_index):
+        """Return the names from the root down to the given row"""
+        names = []
+        while row_index >= 0:
+            _, parent_row, name_offset, name_length = self._entry(row_index)
+            names.append(self._name(name_offset, name_length))
+            row_index = parent_row
+        names.reverse()
+        return names
+
+    def _find_row(self, path):
+        h = path_hash(path)
+        mask = self._slot_count - 1
+        slot = h & mask
+        while True:
+            slot_hash, row = SLOT_STRUCT.unpack_from(self._map, self._index_offset + slot * SLOT_STRUCT.size)
+            if not slot_hash:
+                return None
+            # Confirm the match so a hash collision can never return a wrong ID
+            if slot_hash == h and make_path(*self._row_names(row - 1)) == path:
+                return row - 1
+            slot = (slot + 1) & mask
+
+    def lookup_id(self, path):
+        """Return the category ID for a 1-3 level path, or None"""
+        row = self._find_row(path)
+        if row is None:
+            return None
+        return self._entry(row)[0]
+
+    def iter_paths(self):
+        """Yield (parent, child, grandchild) names for every leaf category"""
+        first = self.n_parents + self.n_children
+        for row in range(first, first + self.n_grandchildren):
+            yield tuple(self._row_names(row))
+
+
+_indexes = {}
+
+
+def get_category_index(directory=CATEGORIES_DIR):
+    """Return the process-wide category lookup of a directory, loading it on first use
+
+    Uses the binary snapshot when it is at least as new as the JSON files and
+    falls back to parsing the JSON otherwise.
+    """
+    key = os.path.abspath(directory)
+    if key not in _indexes:
+        snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        json_path = os.path.join(directory, 'grandchildren.json')
+        if os.path.exists(snapshot_path) and (
+                not os.path.exists(json_path)
+                or os.path.getmtime(snapshot_path) >= os.path.getmtime(json_path)):
+            _indexes[key] = CategorySnapshot(snapshot_path)
+        else:
+            _indexes[key] = CategoryIndex.load(directory)
+    return _indexes[key]
+
+
+def main():
+    """Build the binary snapshot from the scraped JSON files"""
+    index = CategoryIndex.load()
+    snapshot_path = os.path.join(CATEGORIES_DIR, SNAPSHOT_FILE)
+    write_snapshot(index.parents, index.children, index.grandchildren, snapshot_path)
+    print(f"+ Saved {len(index)} categories to {snapshot_path} ({os.path.getsize(snapshot_path)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,41 @@ CHROME_USER_DATA_DIR = r'C:\git\marktplaats\chrome-profile'
 HEADLESS_MODE = False  # Set to True to run without visible browser window
 WINDOW_SIZE = '1920,1080'  # Window size for headless mode
 
+# Wait timeouts in seconds (optional)
+# automation.py continues as soon as the page is ready; these are upper limits per step.
+# Keys: 'default', 'page_load', 'login', 'load_more', 'category', 'photo_upload', 'submit',
+# or any individual step name shown in the wait report at the end of a run
+WAIT_TIMEOUTS = {}  # Example: {'photo_upload': 60, 'default': 20}
+
+# Parallel posting (optional)
+# Each extra browser worker gets its own copy of CHROME_USER_DATA_DIR (<dir>-worker1, ...)
+# and its own DevTools port (9223, ...), and logs in once
+BROWSER_WORKERS = 1  # Number of Chrome instances posting ads at the same time
+MAX_POSTS_PER_ACCOUNT = 2  # Upper limit of ads being posted at once for the account
+
+# Online ads are cached in state/inventory.json; normally only the newest page of
+# "Mijn advertenties" is read. All pages are loaded again after this many hours
+# (keep it under 24 when the script runs once a day)
+INVENTORY_FULL_SWEEP_HOURS = 20
+
+# Reposting budget: expired ads are posted at most this many per hour, longest
+# offline first; the rest waits for the next run. None = post everything at once
+POSTS_PER_HOUR = None
+POSTING_HOURS = None  # (start, end) in local hours, e.g. (9, 21); None = any hour
+
+# Posting order: the highest score goes first. Score = price weight x price in euros
+# + category weight x CATEGORY_PRIORITY bonus + offline weight x days offline (max 30)
+# - failures weight x failed attempts since the ad was last posted
+PRIORITY_WEIGHTS = {'price': 1.0, 'category': 1.0, 'offline': 2.0, 'failures': 25.0}
+CATEGORY_PRIORITY = {}  # Bonus per parent, child or grandchild category name, e.g. {'Computers en Software': 100}
+
+# Photos are rotated, resized and converted to JPEG in background processes before upload
+PHOTO_WORKERS = None  # Number of processes (None = one per CPU core)
+PHOTO_MAX_SIZE = 1600  # Longest side in pixels
+PHOTO_QUALITY = 85  # JPEG quality (1-95)
+PHOTO_CACHE_MB = 500  # Prepared photos are kept in state/photo-cache up to this size
+PHOTO_UPLOAD_ATTEMPTS = 2  # Photos that failed to upload are sent again until this many attempts
+
 # Browser cookies for API authentication (optional)
 # Used by scrape_categories.py to access Marktplaats API
 # To obtain: Open Chrome > F12 > Application tab > Cookies > marktplaats.nl
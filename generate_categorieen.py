@@ -1,16 +1,15 @@
 """
 Generate categorieen.txt with all category paths in parent--child--grandchild-- format
 """
-import json
+from category_index import get_category_index
 
-# Read grandchildren data
-with open('categories/grandchildren.json', encoding='utf-8') as f:
-    data = json.load(f)
+# Read category data (binary snapshot when available, JSON otherwise)
+index = get_category_index()
 
 # Generate category paths
 lines = []
-for item in data:
-    line = f"{item['grandparentName']}--{item['parentName']}--{item['name']}--"
+for parent_name, child_name, grandchild_name in index.iter_paths():
+    line = f"{parent_name}--{child_name}--{grandchild_name}--"
     lines.append(line)
 
 # Sort alphabetically
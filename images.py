@@ -0,0 +1,373 @@
+"""
+Photo Preprocessing
+Prepares the photos of upcoming ads in a process pool while the browser is
+busy: EXIF rotation, resizing to the largest size Marktplaats shows, and
+re-encoding as JPEG. The browser only has to upload the prepared files.
+
+Prepared files live in a content-addressed cache keyed by the hash of the
+original plus the transform settings, so reposting an ad reuses them and the
+originals are never modified.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from PIL import Image, ImageOps
+
+CACHE_DIR = os.path.join('state', 'photo-cache')
+CACHE_MAX_BYTES = 500 * 1024 * 1024
+SOURCES_FILE = 'sources.json'
+MAX_SIZE = 1600  # Longest side in pixels; Marktplaats does not show photos any larger
+JPEG_QUALITY = 85
+TRANSFORM_VERSION = 1  # Bump when prepare_photo() output changes, so old cache entries are not reused
+PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif', '.tif', '.tiff')
+
+ORIENTATION_TAG = 0x0112
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# JPEG start-of-frame markers, which hold the image size (C4, C8 and CC are not frames)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def list_photos(photos_folder):
+    """Photo file names in a folder, in upload order"""
+    return sorted(name for name in os.listdir(photos_folder)
+                  if name.lower().endswith(PHOTO_EXTENSIONS) and os.path.isfile(os.path.join(photos_folder, name)))
+
+
+def file_digest(path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _exif_orientation(exif):
+    """Orientation tag from the TIFF structure of an APP1 Exif payload, or 1"""
+    byte_order = {b'II': '<', b'MM': '>'}.get(exif[:2])
+    if byte_order is None or len(exif) < 8:
+        return 1
+    ifd_offset = struct.unpack_from(f'{byte_order}I', exif, 4)[0]
+    if ifd_offset + 2 > len(exif):
+        return 1
+    entry_count = struct.unpack_from(f'{byte_order}H', exif, ifd_offset)[0]
+    for index in range(entry_count):
+        entry = ifd_offset + 2 + index * 12
+        if entry + 12 > len(exif):
+            break
+        tag, field_type = struct.unpack_from(f'{byte_order}HH', exif, entry)
+        if tag == ORIENTATION_TAG and field_type == 3:
+            value = struct.unpack_from(f'{byte_order}H', exif, entry + 8)[0]
+            return value if 1 <= value <= 8 else 1
+    return 1
+
+
+def _probe_jpeg(f):
+    """Walk the JPEG segments up to the first frame header; returns (orientation, width, height)"""
+    orientation = 1
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            byte = f.read(1)
+        if not byte:
+            raise ValueError("no frame header found")
+        marker = byte[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            continue
+        if marker in (0xD9, 0xDA):
+            raise ValueError("no frame header found")
+
+        length = struct.unpack('>H', f.read(2))[0]
+        if marker in SOF_MARKERS:
+            height, width = struct.unpack('>xHH', f.read(5))
+            return orientation, width, height
+        if marker == 0xE1 and orientation == 1:
+            payload = f.read(length - 2)
+            if payload.startswith(b'Exif\x00\x00'):
+                orientation = _exif_orientation(payload[6:])
+        else:
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def probe_photo(path):
+    """Read orientation, stored size and file size of a photo without decoding pixels
+
+    JPEG and PNG headers are parsed directly; other formats fall back to
+    Pillow, which only reads the header on open. Returns a dict with path,
+    format, orientation (EXIF 1-8), width, height and size, or with an
+    error message when the file cannot be read.
+    """
+    info = {'path': path, 'format': None, 'orientation': 1, 'width': None, 'height': None, 'size': None}
+    try:
+        info['size'] = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            head = f.read(24)
+            if head[:2] == b'\xff\xd8':
+                f.seek(2)
+                info['format'] = 'JPEG'
+                info['orientation'], info['width'], info['height'] = _probe_jpeg(f)
+            elif head[:8] == PNG_SIGNATURE and head[12:16] == b'IHDR':
+                info['format'] = 'PNG'
+                info['width'], info['height'] = struct.unpack('>II', head[16:24])
+            else:
+                f.seek(0)
+                with Image.open(f) as image:
+                    info['format'] = image.format
+                    info['width'], info['height'] = image.size
+                    info['orientation'] = image.getexif().get(ORIENTATION_TAG, 1)
+    except (OSError, ValueError, struct.error) as e:
+        info['error'] = str(e) or type(e).__name__
+    return info
+
+
+def probe_photos(paths, workers=8):
+    """Probe a batch of photos in parallel; returns the results in input order"""
+    with ThreadPoolExecutor(workers) as executor:
+        return list(executor.map(probe_photo, paths))
+
+
+def prepare_photo(source, target, max_size=MAX_SIZE, quality=JPEG_QUALITY):
+    """Write an upright, resized JPEG version of source to target; returns target"""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # JPEG has no transparency; put transparent parts on white
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f'{target}.tmp'
+        image.save(tmp_path, 'JPEG', quality=quality, optimize=True, progressive=True)
+    os.replace(tmp_path, target)
+    return target
+
+
+class PhotoCache:
+    """Content-addressed store of prepared photos with least-recently-used eviction
+
+    Entries are named after the SHA-256 of the original plus the transform
+    settings. Using an entry updates its mtime, and evict() removes the
+    entries with the oldest mtime once the cache is larger than max_bytes.
+    The remembered source hashes may be used from several threads.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.sources_path = os.path.join(directory, SOURCES_FILE)
+        # Remembered source hashes, so unchanged originals are not read again
+        self.sources = {}
+        self._sources_changed = False
+        self._lock = threading.Lock()
+        if os.path.exists(self.sources_path):
+            with open(self.sources_path, encoding='utf-8') as f:
+                self.sources = json.load(f)
+
+    def source_digest(self, source):
+        """Content hash of an original, reusing the stored one while size and mtime match"""
+        stat = os.stat(source)
+        with self._lock:
+            known = self.sources.get(source)
+        if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime_ns:
+            return known['sha256']
+        digest = file_digest(source)
+        with self._lock:
+            self.sources[source] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'sha256': digest}
+            self._sources_changed = True
+        return digest
+
+    def remember(self, source, size, mtime, digest):
+        """Store a source hash computed elsewhere (e.g. by the ad manifest scan)"""
+        with self._lock:
+            if self.sources.get(source, {}).get('sha256') != digest:
+                self.sources[source] = {'size': size, 'mtime': mtime, 'sha256': digest}
+                self._sources_changed = True
+
+    def path_for(self, source, max_size, quality):
+        """Cache path of the prepared version of source with these settings"""
+        params = f'{self.source_digest(source)}:{max_size}:{quality}:{TRANSFORM_VERSION}'
+        key = hashlib.sha256(params.encode('ascii')).hexdigest()
+        return os.path.join(self.directory, key[:2], f'{key}.jpg')
+
+    def lookup(self, path):
+        """True if path is cached; marks it as recently used"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def save(self):
+        """Store the remembered source hashes, dropping originals that no longer exist"""
+        with self._lock:
+            if not self._sources_changed:
+                return
+            self.sources = {source: info for source, info in self.sources.items() if os.path.exists(source)}
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f'{self.sources_path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.sources, f)
+            os.replace(tmp_path, self.sources_path)
+            self._sources_changed = False
+
+    def evict(self, keep=()):
+        """Remove least recently used entries until the cache fits in max_bytes
+
+        Paths in keep (e.g. photos of ads still being posted) are never removed.
+        Returns the number of bytes freed.
+        """
+        entries = []
+        total = 0
+        if not os.path.isdir(self.directory):
+            return 0
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                stat = entry.stat()
+                total += stat.st_size
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        keep = {os.path.abspath(path) for path in keep}
+        freed = 0
+        for _, size, path in sorted(entries):
+            if total - freed <= self.max_bytes:
+                break
+            if os.path.abspath(path) in keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            freed += size
+        return freed
+
+
+class PhotoPreparer:
+    """Prepares the photos of submitted ads in a process pool
+
+    submit() queues the photos of an ad; photos() waits for them and returns
+    the paths to upload. Photos already in the cache are not processed again.
+    A photo that cannot be prepared is uploaded as is. Posting workers call
+    photos() from their own threads, so the bookkeeping is done under a lock.
+    """
+
+    def __init__(self, ads_dir='ads', cache=None, workers=None,
+                 max_size=MAX_SIZE, quality=JPEG_QUALITY):
+        self.ads_dir = ads_dir
+        self.cache = cache or PhotoCache()
+        self.workers = workers
+        self.max_size = max_size
+        self.quality = quality
+        self.pending = {}
+        self.in_use = set()
+        self.hits = 0
+        self.misses = 0
+        self.originals = 0
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def submit(self, ad_name):
+        """Start preparing the photos of an ad in the background"""
+        with self._lock:
+            if ad_name not in self.pending:
+                self.pending[ad_name] = self._submit_jobs(ad_name)
+
+    def _submit_jobs(self, ad_name):
+        """Queue the photos of an ad; returns [(source, path or future)]"""
+        photos_folder = os.path.join(self.ads_dir, ad_name, 'photos')
+        jobs = []
+        sources = [os.path.abspath(os.path.join(photos_folder, photo)) for photo in list_photos(photos_folder)]
+        for info in probe_photos(sources):
+            source = info['path']
+            # Upright JPEGs that are small enough already are uploaded as they are
+            if info['format'] == 'JPEG' and info['orientation'] == 1 and 'error' not in info \
+                    and max(info['width'], info['height']) <= self.max_size:
+                self.originals += 1
+                jobs.append((source, source))
+                continue
+            target = os.path.abspath(self.cache.path_for(source, self.max_size, self.quality))
+            self.in_use.add(target)
+            if self.cache.lookup(target):
+                self.hits += 1
+                jobs.append((source, target))
+                continue
+            self.misses += 1
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            jobs.append((source, self._pool.submit(prepare_photo, source, target, self.max_size, self.quality)))
+        return jobs
+
+    def submit_all(self, ad_names):
+        for ad_name in ad_names:
+            self.submit(ad_name)
+
+    def photos(self, ad_name):
+        """Wait for the photos of an ad and return their absolute paths"""
+        self.submit(ad_name)
+        with self._lock:
+            jobs = self.pending.pop(ad_name)
+        paths = []
+        for source, job in jobs:
+            if isinstance(job, str):
+                paths.append(job)
+                continue
+            try:
+                paths.append(job.result())
+            except Exception as e:
+                print(f"Warning: Could not prepare {os.path.basename(source)}, uploading original: {e}")
+                paths.append(source)
+        return paths
+
+    def close(self):
+        """Stop the worker processes"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+            self.pending = {}
+
+    def finish_batch(self):
+        """Save the source hashes and trim the cache after a batch was posted"""
+        self.cache.save()
+        with self._lock:
+            freed = self.cache.evict(keep=self.in_use)
+            print(f"Photos: {self.hits} from cache, {self.misses} prepared, {self.originals} uploaded as is"
+                  + (f", {freed / 1024 / 1024:.1f} MB evicted" if freed else ""))
+            self.in_use = set()
+            self.hits = self.misses = self.originals = 0
+
+
+def main():
+    """Probe every photo in the ads folder and print a summary"""
+    paths = [os.path.join('ads', ad_name, 'photos', photo)
+             for ad_name in sorted(os.listdir('ads')) if os.path.isdir(os.path.join('ads', ad_name, 'photos'))
+             for photo in list_photos(os.path.join('ads', ad_name, 'photos'))]
+    start = time.perf_counter()
+    results = probe_photos(paths)
+    elapsed = time.perf_counter() - start
+
+    rotated = [info for info in results if info['orientation'] != 1]
+    errors = [info for info in results if 'error' in info]
+    for info in errors:
+        print(f"X {info['path']}: {info['error']}")
+    print(f"Probed {len(results)} photos in {elapsed:.2f}s ({len(results) / elapsed if elapsed else 0:.0f}/s): "
+          f"{len(rotated)} need rotation, {len(errors)} unreadable, "
+          f"{sum(info['size'] or 0 for info in results) / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Online Ad Inventory
+Local cache of the ads shown on "Mijn advertenties" (title, ad id, expiry
+date, last seen), so a run does not have to click "load more" through every
+page to find out which ads are online.
+"""
+
+import json
+import os
+import re
+from datetime import date, datetime, timedelta
+
+STATE_DIR = 'state'
+INVENTORY_FILE = os.path.join(STATE_DIR, 'inventory.json')
+# Under a day, so a daily run never just misses the sweep because it started a little earlier
+FULL_SWEEP_INTERVAL = timedelta(hours=20)
+
+DUTCH_MONTHS = {
+    'jan': 1, 'feb': 2, 'mrt': 3, 'maa': 3, 'apr': 4, 'mei': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'okt': 10, 'nov': 11, 'dec': 12,
+}
+
+AD_ID_PATTERN = re.compile(r'\b([ma]\d{9,10})\b')
+NUMERIC_DATE_PATTERN = re.compile(r'\b(\d{1,2})[-/.](\d{1,2})[-/.](\d{2,4})\b')
+TEXT_DATE_PATTERN = re.compile(r'\b(\d{1,2})\s+([a-z]{3})[a-z]*\.?\s+(\d{4})\b')
+DAYS_LEFT_PATTERN = re.compile(r'\bnog\s+(\d+)\s+dag', re.IGNORECASE)
+# Rows also show other dates (e.g. when the ad was placed); only a date after this label is the expiry
+EXPIRY_LABEL_PATTERN = re.compile(r'\bverl(?:oopt|open)\b')
+
+
+def extract_ad_id(*texts):
+    """Find a Marktplaats ad id (e.g. m2012345678) in URLs or attribute values"""
+    for text in texts:
+        if text:
+            match = AD_ID_PATTERN.search(text)
+            if match:
+                return match.group(1)
+    return None
+
+
+def parse_expiry(text, today=None):
+    """Parse an expiry date from listing text; returns an ISO date string or None
+
+    Understands 'nog 23 dagen' anywhere, and '12-03-2026', '12-03-26' or
+    '12 mrt 2026' after 'verloopt' (or 'verlopen').
+    """
+    if not text:
+        return None
+    today = today or date.today()
+    text = text.lower()
+
+    match = DAYS_LEFT_PATTERN.search(text)
+    if match:
+        return (today + timedelta(days=int(match.group(1)))).isoformat()
+
+    label = EXPIRY_LABEL_PATTERN.search(text)
+    if not label:
+        return None
+    text = text[label.end():]
+
+    match = NUMERIC_DATE_PATTERN.search(text)
+    if match:
+        day, month, year = (int(part) for part in match.groups())
+        if year < 100:
+            year += 2000
+        try:
+            return date(year, month, day).isoformat()
+        except ValueError:
+            return None
+
+    match = TEXT_DATE_PATTERN.search(text)
+    if match and match.group(2) in DUTCH_MONTHS:
+        try:
+            return date(int(match.group(3)), DUTCH_MONTHS[match.group(2)], int(match.group(1))).isoformat()
+        except ValueError:
+            return None
+    return None
+
+
+class AdInventory:
+    """Cached online ads keyed by title, refreshed by full sweeps or deltas"""
+
+    def __init__(self, path=INVENTORY_FILE):
+        self.path = path
+        self.ads = {}
+        self.last_full_sweep = None
+
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.ads = data.get('ads', {})
+            if data.get('lastFullSweep'):
+                self.last_full_sweep = datetime.fromisoformat(data['lastFullSweep'])
+
+    def save(self):
+        """Write the inventory atomically"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        data = {
+            'lastFullSweep': self.last_full_sweep.isoformat(timespec='seconds') if self.last_full_sweep else None,
+            'ads': self.ads
+        }
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def expired(self, today=None):
+        """Titles of cached ads whose expiry date has passed"""
+        today = (today or date.today()).isoformat()
+        return [title for title, ad in self.ads.items() if ad.get('expires') and ad['expires'] < today]
+
+    def needs_full_sweep(self, now=None, interval=FULL_SWEEP_INTERVAL):
+        """A full sweep is due without a previous one, on schedule, or once a cached ad has expired"""
+        now = now or datetime.now()
+        if self.last_full_sweep is None or now - self.last_full_sweep >= interval:
+            return True
+        # Expired ads may have been renewed or taken offline; only a full sweep can tell
+        return bool(self.expired(now.date()))
+
+    def update(self, listings, full, now=None):
+        """Merge listings ({'title', 'adId', 'expires'}) seen on "Mijn advertenties"
+
+        After a full sweep, cached ads that were not seen are gone and are
+        dropped. A delta (newest page only) just adds and refreshes entries.
+        """
+        now = (now or datetime.now()).isoformat(timespec='seconds')
+        seen = {}
+        for listing in listings:
+            previous = self.ads.get(listing['title'], {})
+            seen[listing['title']] = {
+                'adId': listing.get('adId') or previous.get('adId'),
+                'expires': listing.get('expires') or previous.get('expires'),
+                'firstSeen': previous.get('firstSeen', now),
+                'lastSeen': now
+            }
+        if full:
+            self.ads = seen
+            self.last_full_sweep = datetime.fromisoformat(now)
+        else:
+            self.ads.update(seen)
+
+    def record_posted(self, title, ad_id=None, now=None):
+        """Add an ad that was just posted, until a sweep fills in its expiry (and id if unknown)"""
+        now = (now or datetime.now()).isoformat(timespec='seconds')
+        ad = self.ads.setdefault(title, {'adId': None, 'expires': None, 'firstSeen': now})
+        ad['lastSeen'] = now
+        if ad_id:
+            ad['adId'] = ad_id
@@ -0,0 +1,99 @@
+"""
+Posting Journal
+Append-only JSONL log of every posting run and the state transitions of each
+ad in it, so a run that died half-way can be resumed without posting the
+ads it already submitted a second time.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+STATE_DIR = 'state'
+JOURNAL_FILE = os.path.join(STATE_DIR, 'journal.jsonl')
+
+# States of an ad within a run, in order
+STATES = ['started', 'category_set', 'photos_uploaded', 'submitted', 'confirmed']
+FAILED = 'failed'
+# From here on the ad may be online, so it must not be posted again
+POSTED_STATES = {'submitted', 'confirmed'}
+
+
+class PostingJournal:
+    """Writes run and ad events to the journal and reads back interrupted runs"""
+
+    def __init__(self, path=JOURNAL_FILE):
+        self.path = path
+        self.run_id = None
+        self._lock = threading.Lock()
+        self._tail_checked = False
+
+    def _append(self, event):
+        event = {'ts': datetime.now().isoformat(timespec='seconds'), **event}
+        line = json.dumps(event, ensure_ascii=False) + '\n'
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            if not self._tail_checked:
+                # Start on a new line if a crash left the last line unfinished
+                self._tail_checked = True
+                if os.path.exists(self.path) and os.path.getsize(self.path):
+                    with open(self.path, 'rb') as f:
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b'\n':
+                            line = '\n' + line
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                # The journal is only useful if it survives the crash it is meant for
+                os.fsync(f.fileno())
+
+    def start_run(self, ad_names):
+        """Record the start of a run that will post ad_names"""
+        self.run_id = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        self._append({'run': self.run_id, 'event': 'run_started', 'ads': list(ad_names)})
+        return self.run_id
+
+    def record(self, ad_name, state, **details):
+        """Record that an ad of the current run reached a state (one of STATES or FAILED)"""
+        if state not in STATES and state != FAILED:
+            raise ValueError(f"unknown journal state '{state}'")
+        self._append({'run': self.run_id, 'ad': ad_name, 'state': state, **details})
+
+    def finish_run(self, run_id=None, **details):
+        """Record the end of a run (the current one by default)"""
+        self._append({'run': run_id or self.run_id, 'event': 'run_finished', **details})
+
+    def events(self):
+        """All journal events; a line cut off by a crash is skipped"""
+        if not os.path.exists(self.path):
+            return []
+        events = []
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+        return events
+
+    def interrupted_run(self):
+        """The last run that never finished, or None
+
+        Returns a dict with run, ads (in posting order), states ({ad: last
+        state}) and adIds ({ad: listing id} for confirmed ads).
+        """
+        runs = {}
+        last_run = None
+        for event in self.events():
+            run_id = event.get('run')
+            if event.get('event') == 'run_started':
+                runs[run_id] = {'run': run_id, 'ads': event['ads'], 'states': {}, 'adIds': {}}
+                last_run = run_id
+            elif event.get('event') == 'run_finished':
+                runs.pop(run_id, None)
+            elif run_id in runs and 'state' in event:
+                runs[run_id]['states'][event['ad']] = event['state']
+                if event.get('adId'):
+                    runs[run_id]['adIds'][event['ad']] = event['adId']
+        return runs.get(last_run)
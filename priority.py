@@ -0,0 +1,156 @@
+"""
+Posting Priority
+Scores ads so the valuable ones go online first: the price from index.txt,
+a bonus per category, the days an ad has been offline and a penalty for
+every failed attempt. The PostingQueue hands out the highest score first,
+also for ads that are added while a run is already going.
+"""
+
+import heapq
+import itertools
+import re
+import threading
+from datetime import date
+from queue import Empty
+
+from ad_manifest import AdManifest
+from journal import FAILED, POSTED_STATES, PostingJournal
+from reconcile import reconcile
+from scheduler import PostingScheduler
+
+try:
+    from config import PRIORITY_WEIGHTS
+except ImportError:
+    PRIORITY_WEIGHTS = {}
+
+try:
+    from config import CATEGORY_PRIORITY
+except ImportError:
+    CATEGORY_PRIORITY = {}
+
+# Points per euro of the price, per point of category bonus, per day offline and per failed attempt
+DEFAULT_WEIGHTS = {'price': 1.0, 'category': 1.0, 'offline': 2.0, 'failures': 25.0}
+MAX_OFFLINE_DAYS = 30  # Days offline stop adding points after this
+PRICE_PATTERN = re.compile(r'^\s*(\d+)(?:[.,](\d{1,2}))?')
+
+
+def parse_price(text):
+    """Price in euros of a price field like '400,00' or '12.5', 0.0 when there is none"""
+    match = PRICE_PATTERN.match(text or '')
+    if not match:
+        return 0.0
+    cents = (match.group(2) or '0').ljust(2, '0')
+    return int(match.group(1)) + int(cents) / 100
+
+
+def failure_counts(events):
+    """Failed attempts per ad since it was last posted, from journal events"""
+    counts = {}
+    for event in events:
+        ad_name = event.get('ad')
+        if event.get('state') == FAILED:
+            counts[ad_name] = counts.get(ad_name, 0) + 1
+        elif event.get('state') in POSTED_STATES:
+            counts.pop(ad_name, None)
+    return counts
+
+
+def expiries_by_ad(ad_names, expiries):
+    """Expiry date per ad folder, from the expiry dates per online title
+
+    Titles are matched to folders like reconcile() does, so ads whose title
+    Marktplaats truncated or re-cased still get their days offline.
+    """
+    matched = reconcile({name: {} for name in ad_names}, {title: {} for title in expiries}).matched
+    return {name: expiries[title] for name, title in matched.items()}
+
+
+class PriorityScorer:
+    """Scores manifest entries; a higher score is posted earlier
+
+    expiries maps ad folder names to expiry dates (see expiries_by_ad()).
+    """
+
+    def __init__(self, weights=None, category_priority=None, expiries=None, failures=None, today=None):
+        self.weights = {**DEFAULT_WEIGHTS, **PRIORITY_WEIGHTS, **(weights or {})}
+        self.category_priority = CATEGORY_PRIORITY if category_priority is None else category_priority
+        self.expiries = expiries or {}
+        self.failures = failures or {}
+        self.today = today or date.today()
+
+    def category_bonus(self, attributes):
+        """Bonus of the most specific category level that has one"""
+        for level in ('grandchild', 'child', 'parent'):
+            if attributes.get(level) in self.category_priority:
+                return self.category_priority[attributes[level]]
+        return 0
+
+    def offline_days(self, ad_name):
+        """Days since the ad expired, 0 for ads that never were online"""
+        expires = self.expiries.get(ad_name)
+        if not expires:
+            return 0
+        days = (self.today - date.fromisoformat(expires)).days
+        return max(0, min(days, MAX_OFFLINE_DAYS))
+
+    def score(self, ad_name, ad):
+        attributes = ad['attributes'] if ad else {}
+        weights = self.weights
+        return (weights['price'] * parse_price(attributes.get('price'))
+                + weights['category'] * self.category_bonus(attributes)
+                + weights['offline'] * self.offline_days(ad_name)
+                - weights['failures'] * self.failures.get(ad_name, 0))
+
+
+class PostingQueue:
+    """Thread-safe queue of ad names that hands out the highest score first
+
+    With a limit, the queue hands out at most that many ads in total. Ads
+    already handed out count against it, so putting an ad into a full queue
+    drops the lowest-scoring ad still waiting, or the new ad itself when it
+    scores lowest or nothing is waiting.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.handed_out = 0
+        self._heap = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def put(self, ad_name, score=0.0):
+        """Queue an ad; returns the ad that was dropped to make room, or None"""
+        with self._lock:
+            heapq.heappush(self._heap, (-score, next(self._order), ad_name))
+            if self.limit is None or self.handed_out + len(self._heap) <= self.limit:
+                return None
+            lowest = max(self._heap)
+            self._heap.remove(lowest)
+            heapq.heapify(self._heap)
+            return lowest[2]
+
+    def get_nowait(self):
+        with self._lock:
+            if not self._heap:
+                raise Empty
+            self.handed_out += 1
+            return heapq.heappop(self._heap)[2]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap)
+
+
+def main():
+    """Print the posting order of all ad folders from the cached manifest, schedule and journal"""
+    manifest = AdManifest()
+    scorer = PriorityScorer(expiries=expiries_by_ad(manifest.ads, PostingScheduler().expiries),
+                            failures=failure_counts(PostingJournal().events()))
+    ranked = sorted(((scorer.score(name, ad), name) for name, ad in manifest.ads.items()), reverse=True)
+    print(f"{'Score':>9}  Ad")
+    for score, name in ranked:
+        print(f"{score:>9.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
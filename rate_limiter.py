@@ -0,0 +1,135 @@
+"""
+Rate Limiter
+Thread-safe adaptive token bucket, jittered exponential backoff and request
+metrics shared by every HTTP call of the category scraper.
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from stats import percentile
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    """Full-jitter exponential backoff delay in seconds for a 0-based attempt"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (seconds or HTTP date) to seconds, or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    """Token bucket whose refill rate adapts to how the server responds
+
+    The rate grows by a fixed step after every successful request and is halved when
+    the server throttles (AIMD), so it settles just below the highest rate the
+    server tolerates. A Retry-After pause blocks every caller until it ends.
+    """
+
+    def __init__(self, rate=10.0, min_rate=1.0, max_rate=50.0, burst=None, increase=0.1):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.capacity = burst or max(1.0, rate)
+        self.increase = increase
+        self.tokens = self.capacity
+        self.paused_until = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        """Raise the rate a little after a request that was not throttled"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, retry_after=None):
+        """Halve the rate and optionally pause everyone for retry_after seconds"""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+
+class RequestMetrics:
+    """Counters and latency samples for all requests of a run"""
+
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures = 0
+        self.status_counts = {}
+        self.latencies = []
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, latency, status):
+        """Record one completed request (status None for connection errors)"""
+        with self._lock:
+            self.requests += 1
+            self.latencies.append(latency)
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def record_retry(self, throttled=False):
+        with self._lock:
+            self.retries += 1
+            if throttled:
+                self.throttled += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def percentile(self, pct):
+        """Latency percentile in seconds (nearest rank), or 0 without samples"""
+        with self._lock:
+            samples = list(self.latencies)
+        return percentile(samples, pct)
+
+    def requests_per_second(self):
+        elapsed = time.monotonic() - self.started
+        return self.requests / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        """One-line summary for the end of a run"""
+        return (f"{self.requests} requests ({self.requests_per_second():.1f}/s), "
+                f"{self.retries} retries ({self.throttled} throttled), {self.failures} failed, "
+                f"latency p50 {self.percentile(50) * 1000:.0f} ms / "
+                f"p95 {self.percentile(95) * 1000:.0f} ms / "
+                f"p99 {self.percentile(99) * 1000:.0f} ms")
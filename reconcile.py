@@ -0,0 +1,139 @@
+"""
+Ad Reconciliation
+Compares the local ad folders with the online inventory in one linear pass,
+matching on ad ids where known and on normalized title keys otherwise, so
+titles that Marktplaats truncated or re-cased are not posted twice.
+"""
+
+import re
+import unicodedata
+from datetime import date, datetime, timedelta
+
+TITLE_MAX_LENGTH = 60  # Marktplaats cuts titles off at this length
+RENEW_WITHIN_DAYS = 3
+
+ELLIPSIS_PATTERN = re.compile(r'\s*(\.\.\.|…)$')
+SEPARATOR_PATTERN = re.compile(r'[\s\-_/|,.:;]+')
+
+
+def title_key(title):
+    """Normalized key of an ad title: case, accents, punctuation and spacing ignored"""
+    title = unicodedata.normalize('NFKD', title)
+    title = ''.join(ch for ch in title if not unicodedata.combining(ch))
+    title = SEPARATOR_PATTERN.sub(' ', title.casefold()).strip()
+    return title[:TITLE_MAX_LENGTH].rstrip()
+
+
+def truncated_prefix(title):
+    """Key prefix of a title shown with a trailing ellipsis, or None if it is complete"""
+    if not ELLIPSIS_PATTERN.search(title):
+        return None
+    return title_key(ELLIPSIS_PATTERN.sub('', title))
+
+
+class Reconciliation:
+    """Result of comparing local ads with online ads
+
+    to_post      local ads that are not online
+    to_renew     local ads whose online ad expires within the renewal window
+    orphaned     online ad titles without a local folder
+    changed      local ads modified after their online ad was first seen
+    matched      {local ad: online title}
+    ambiguous    {local ad: online titles} of ads in to_post whose only online
+                 match would fit other local folders just as well
+    """
+
+    def __init__(self):
+        self.to_post = []
+        self.to_renew = []
+        self.orphaned = []
+        self.changed = []
+        self.matched = {}
+        self.ambiguous = {}
+
+    def summary(self):
+        """One-line summary of the diff"""
+        return (f"{len(self.matched)} online, {len(self.to_post)} to post, {len(self.to_renew)} to renew, "
+                f"{len(self.changed)} changed locally, {len(self.orphaned)} orphaned online, "
+                f"{len(self.ambiguous)} ambiguous")
+
+
+def reconcile(local_ads, online_ads, renew_within_days=RENEW_WITHIN_DAYS, today=None):
+    """Diff local ads against online ads in linear time
+
+    local_ads maps ad folder names to a dict with optional 'modified' (epoch
+    seconds) and 'adId'. online_ads maps online titles to inventory entries
+    ({'adId', 'expires', 'firstSeen', ...}), as in AdInventory.ads.
+
+    Each online ad belongs to at most one local folder: the one with its ad
+    id, else the one with its full title key, else the one its truncated
+    title is a whole-word prefix of. When several folders match equally well
+    none of them gets it, and they are posted and reported as ambiguous.
+    """
+    today = today or date.today()
+    renew_before = (today + timedelta(days=renew_within_days)).isoformat()
+    result = Reconciliation()
+
+    by_id = {}
+    by_key = {}
+    by_prefix = {}
+    for title, ad in online_ads.items():
+        if ad.get('adId'):
+            by_id[ad['adId']] = title
+        prefix = truncated_prefix(title)
+        if prefix is not None:
+            by_prefix.setdefault(prefix, []).append(title)
+        else:
+            by_key.setdefault(title_key(title), []).append(title)
+    # Ellipsis-truncated titles are matched on every distinct prefix length; there are only a few
+    prefix_lengths = sorted({len(prefix) for prefix in by_prefix}, reverse=True)
+
+    # Local folders that could be each online ad, with the rank of the match (lower is better):
+    # 0 same ad id, 1 same title key, 2 truncated title equal to the key, 3 truncated title a prefix of it
+    claims = {}
+    for name, local in local_ads.items():
+        local = local or {}
+        key = title_key(name)
+        if local.get('adId') in by_id:
+            claims.setdefault(by_id[local['adId']], {}).setdefault(name, 0)
+        for title in by_key.get(key, []):
+            claims.setdefault(title, {}).setdefault(name, 1)
+        for length in prefix_lengths:
+            # Only cut at a word boundary, so 'boek over' does not match 'boek overzicht'
+            if length == len(key) or key[length:length + 1] == ' ':
+                for title in by_prefix.get(key[:length], []):
+                    claims.setdefault(title, {}).setdefault(name, 2 if length == len(key) else 3)
+
+    # One ad can have several online entries (e.g. the placeholder added right after
+    # posting and the truncated title read later); all of them belong to its folder
+    titles_by_ad = {}
+    ambiguous = {}
+    for title, candidates in claims.items():
+        best = min(candidates.values())
+        names = [name for name, rank in candidates.items() if rank == best]
+        if len(names) == 1:
+            titles_by_ad.setdefault(names[0], []).append((best, title))
+        else:
+            for name in names:
+                ambiguous.setdefault(name, []).append(title)
+
+    for name, local in local_ads.items():
+        local = local or {}
+        matches = titles_by_ad.get(name)
+        if not matches:
+            result.to_post.append(name)
+            if name in ambiguous:
+                result.ambiguous[name] = ambiguous[name]
+            continue
+
+        title = min(matches, key=lambda match: match[0])[1]
+        result.matched[name] = title
+        ad = online_ads[title]
+        if ad.get('expires') and ad['expires'] <= renew_before:
+            result.to_renew.append(name)
+        if local.get('modified') and ad.get('firstSeen') and \
+                datetime.fromtimestamp(local['modified']) > datetime.fromisoformat(ad['firstSeen']):
+            result.changed.append(name)
+
+    result.orphaned = [title for title in online_ads if title not in claims]
+    return result
@@ -0,0 +1,162 @@
+"""
+Posting Scheduler
+Spreads reposting over the day within a budget of posts per hour, so a batch
+of ads that expired together goes back online in a steady stream instead of
+one long burst. Because a reposted ad gets a fresh expiry date, the next
+round of expiries is spread out the same way.
+
+Usage: python scheduler.py    (forecast of expiries and posting slots)
+"""
+
+import json
+import os
+from datetime import date, datetime, timedelta
+
+from inventory import AdInventory
+
+try:
+    from config import POSTS_PER_HOUR
+except ImportError:
+    POSTS_PER_HOUR = None
+
+try:
+    from config import POSTING_HOURS
+except ImportError:
+    POSTING_HOURS = None
+
+STATE_DIR = 'state'
+SCHEDULE_FILE = os.path.join(STATE_DIR, 'schedule.json')
+HISTORY_DAYS = 60  # Expiry dates of ads that went offline are kept this long
+SLOT_SEARCH_DAYS = 30  # next_slots() looks this far ahead
+
+
+class PostingScheduler:
+    """Decides which ads may be posted now, given the hourly budget and expiry dates
+
+    posts_per_hour None means no limit. posting_hours (start, end) limits
+    posting to local hours start <= hour < end, or any hour when None.
+    """
+
+    def __init__(self, posts_per_hour=None, posting_hours=None, path=SCHEDULE_FILE):
+        self.posts_per_hour = posts_per_hour
+        self.posting_hours = posting_hours
+        self.path = path
+        self.posted = []
+        self.expiries = {}
+
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.posted = [datetime.fromisoformat(ts) for ts in data.get('posted', [])]
+            self.expiries = data.get('expiries', {})
+
+    def save(self, now=None):
+        """Write the schedule state, dropping history that is no longer needed"""
+        now = now or datetime.now()
+        self.posted = [ts for ts in self.posted if now - ts < timedelta(hours=1)]
+        oldest = (now.date() - timedelta(days=HISTORY_DAYS)).isoformat()
+        self.expiries = {title: expires for title, expires in self.expiries.items() if expires >= oldest}
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        data = {'posted': [ts.isoformat(timespec='seconds') for ts in self.posted], 'expiries': self.expiries}
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def observe(self, inventory):
+        """Remember the expiry date of every ad in the inventory, also after it goes offline"""
+        for title, ad in inventory.ads.items():
+            if ad.get('expires'):
+                self.expiries[title] = ad['expires']
+
+    def in_posting_hours(self, moment):
+        if self.posting_hours is None:
+            return True
+        start, end = self.posting_hours
+        return start <= moment.hour < end
+
+    def remaining_budget(self, now=None):
+        """Number of ads that may still be posted in the current hour, or None without a limit"""
+        now = now or datetime.now()
+        if not self.in_posting_hours(now):
+            return 0
+        if self.posts_per_hour is None:
+            return None
+        recent = sum(1 for ts in self.posted if now - ts < timedelta(hours=1))
+        return max(0, self.posts_per_hour - recent)
+
+    def order(self, ad_names, key=None):
+        """Sort ads by key, or by expiry date without one
+
+        By expiry date, ads that lapsed first come first and ads without a
+        known expiry date (new ones) after them.
+        """
+        if key is None:
+            today = date.today().isoformat()
+            key = lambda name: self.expiries.get(name, today)
+        return sorted(ad_names, key=key)
+
+    def select(self, ad_names, now=None, key=None):
+        """Split ads into (post now, deferred) within the budget of the current hour, in order()"""
+        ordered = self.order(ad_names, key)
+        budget = self.remaining_budget(now)
+        if budget is None:
+            return ordered, []
+        return ordered[:budget], ordered[budget:]
+
+    def record(self, count, now=None):
+        """Count ads that were just posted against the hourly budget"""
+        now = now or datetime.now()
+        self.posted.extend([now] * count)
+
+    def next_slots(self, count, now=None, limit_days=SLOT_SEARCH_DAYS):
+        """Hours at which count ads would be posted from now on, one entry per ad
+
+        Returns fewer entries when the budget runs out within limit_days.
+        """
+        now = now or datetime.now()
+        slots = []
+        hour = now.replace(minute=0, second=0, microsecond=0)
+        budget = self.remaining_budget(now)
+        if budget is None:
+            return [now] * count
+        while len(slots) < count and hour < now + timedelta(days=limit_days):
+            if hour > now:
+                budget = self.posts_per_hour if self.in_posting_hours(hour) else 0
+            take = min(budget, count - len(slots))
+            slots.extend([max(hour, now)] * take)
+            hour += timedelta(hours=1)
+        return slots
+
+    def forecast(self, inventory, days=14, today=None):
+        """Number of online ads expiring per day for the coming days: [(date, count)]"""
+        today = today or date.today()
+        counts = {}
+        for ad in inventory.ads.values():
+            if ad.get('expires'):
+                counts[ad['expires']] = counts.get(ad['expires'], 0) + 1
+        return [((today + timedelta(days=offset)).isoformat(), counts.get((today + timedelta(days=offset)).isoformat(), 0))
+                for offset in range(days)]
+
+
+def main():
+    """Print the expiry forecast of the cached inventory and the posting capacity per day"""
+    scheduler = PostingScheduler(POSTS_PER_HOUR, POSTING_HOURS)
+    inventory = AdInventory()
+    daily_capacity = None
+    if POSTS_PER_HOUR is None:
+        capacity = "no limit"
+    else:
+        start, end = POSTING_HOURS or (0, 24)
+        daily_capacity = POSTS_PER_HOUR * (end - start)
+        capacity = f"{daily_capacity} posts/day ({POSTS_PER_HOUR}/hour, {start}:00-{end}:00)"
+    print(f"{len(inventory.ads)} ads online, budget {capacity}\n")
+    print(f"{'Date':<12}{'Expiring':>10}")
+    for day, count in scheduler.forecast(inventory):
+        over = daily_capacity is not None and count > daily_capacity
+        print(f"{day:<12}{count:>10}{'  more than one day of posting' if over else ''}")
+
+
+if __name__ == "__main__":
+    main()
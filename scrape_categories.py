@@ -3,12 +3,18 @@ Marktplaats Category Scraper
 Fetches category data from the Marktplaats API using multi-level endpoints.
 """
 
+import argparse
+import hashlib
 import requests
 import json
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from config import BROWSER_COOKIES
+from category_index import SNAPSHOT_FILE, write_snapshot
+from rate_limiter import RequestMetrics, TokenBucket, backoff_delay, parse_retry_after
 
 
 def get_headers():
@@ -32,25 +38,171 @@ def get_headers():
     return headers
 
 
+API_BASE = "https://www.marktplaats.nl/plaats/api/v1/category-aggregate"
+MANIFEST_FILE = 'categories/scrape_manifest.json'
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_RATE = 10.0  # Starting requests per second, adapted while running
+MAX_RETRIES = 5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+_manifest = None
+
+# Shared by every request of the run
+rate_limiter = TokenBucket(rate=DEFAULT_RATE)
+metrics = RequestMetrics()
+
+
+class ResponseManifest:
+    """Validators, content hashes and payloads of earlier API responses
+    
+    Used by incremental runs to send conditional requests and to tell which
+    responses changed since the previous scrape.
+    """
+    
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self.entries = {}
+        self.changed = {}
+        self.not_modified = 0
+        self.from_cache = 0
+        self._lock = threading.Lock()
+        
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f).get('responses', {})
+    
+    def conditional_headers(self, url):
+        """Get If-None-Match/If-Modified-Since headers for a cached URL"""
+        entry = self.entries.get(url)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('lastModified'):
+                headers['If-Modified-Since'] = entry['lastModified']
+        return headers
+    
+    def record(self, url, response):
+        """Store a 200 response and return its JSON payload"""
+        data = response.json()
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        with self._lock:
+            previous = self.entries.get(url)
+            self.changed[url] = previous is None or previous.get('sha256') != content_hash
+            self.entries[url] = {
+                'etag': response.headers.get('ETag'),
+                'lastModified': response.headers.get('Last-Modified'),
+                'sha256': content_hash,
+                'data': data
+            }
+        return data
+    
+    def replay(self, url):
+        """Return the cached payload for a 304 Not Modified response"""
+        with self._lock:
+            self.changed[url] = False
+            self.not_modified += 1
+        return self.entries[url]['data']
+    
+    def reuse(self, url):
+        """Return the cached payload without a request, or None if not cached"""
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+        with self._lock:
+            self.changed[url] = False
+            self.from_cache += 1
+        return entry['data']
+    
+    def is_unchanged(self, url):
+        """Check whether a URL fetched this run returned the same content as before"""
+        return self.changed.get(url) is False
+    
+    def save(self):
+        """Write entries for the URLs seen this run, dropping stale ones"""
+        responses = {url: self.entries[url] for url in self.changed}
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'responses': responses}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def set_manifest(manifest):
+    """Enable (or disable with None) conditional requests for fetch_json"""
+    global _manifest
+    _manifest = manifest
+
+
+def get_session(max_workers=DEFAULT_MAX_WORKERS):
+    """Get the shared keep-alive HTTP session used for all API requests"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(get_headers())
+            # One pooled connection per worker so requests never wait for a socket
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+            _session.mount('https://', adapter)
+        return _session
+
+
 def fetch_json(url, description="data"):
-    """Fetch JSON data from URL with error handling"""
-    try:
-        response = requests.get(url, headers=get_headers(), timeout=10)
+    """Fetch JSON data from URL with rate limiting, retries and error handling
+    
+    Throttled (429) and server error responses are retried with jittered
+    exponential backoff, honoring Retry-After when the server sends it.
+    """
+    headers = _manifest.conditional_headers(url) if _manifest else None
+    
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limiter.acquire()
+        start = time.monotonic()
+        try:
+            response = get_session().get(url, headers=headers, timeout=10)
+        except requests.exceptions.RequestException as e:
+            metrics.record(time.monotonic() - start, None)
+            if attempt < MAX_RETRIES:
+                metrics.record_retry()
+                time.sleep(backoff_delay(attempt))
+                continue
+            print(f"  X Error fetching {description}: {e}")
+            metrics.record_failure()
+            return None
+        metrics.record(time.monotonic() - start, response.status_code)
         
-        if response.status_code == 200:
-            return response.json()
+        if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+            throttled = response.status_code == 429
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if throttled or retry_after is not None:
+                rate_limiter.on_throttle(retry_after)
+            metrics.record_retry(throttled)
+            time.sleep(retry_after if retry_after is not None else backoff_delay(attempt))
+            continue
+        
+        if response.status_code == 304 and _manifest:
+            rate_limiter.on_success()
+            return _manifest.replay(url)
+        elif response.status_code == 200:
+            # A login or consent page, or a body cut off mid-transfer, is not JSON
+            try:
+                data = _manifest.record(url, response) if _manifest else response.json()
+            except (ValueError, requests.exceptions.RequestException) as e:
+                print(f"  X Invalid response for {description}: {e}")
+                metrics.record_failure()
+                return None
+            rate_limiter.on_success()
+            return data
         else:
             print(f"  X Failed to fetch {description}: Status {response.status_code}")
+            metrics.record_failure()
             return None
-            
-    except requests.exceptions.RequestException as e:
-        print(f"  X Error fetching {description}: {e}")
-        return None
 
 
 def fetch_parent_categories():
     """Fetch parent categories from category-aggregate endpoint"""
-    url = "https://www.marktplaats.nl/plaats/api/v1/category-aggregate"
+    url = API_BASE
     print(f"Fetching parent categories from {url}")
     
     data = fetch_json(url, "parent categories")
@@ -73,7 +225,7 @@ def fetch_parent_categories():
 
 def fetch_child_categories(parent_id, parent_name, current=None, total=None):
     """Fetch child categories (buckets) for a parent category"""
-    url = f"https://www.marktplaats.nl/plaats/api/v1/category-aggregate/{parent_id}/buckets"
+    url = f"{API_BASE}/{parent_id}/buckets"
     counter = f"[{current:03d}/{total:03d}] " if current and total else ""
     print(f"  {counter}Fetching children for {parent_name} (ID: {parent_id})...") 
     
@@ -115,11 +267,17 @@ def fetch_child_categories(parent_id, parent_name, current=None, total=None):
     return children
 
 
-def fetch_grandchild_categories(parent_id, parent_name, child_id, child_name):
-    """Fetch grandchild categories for a child category"""
-    url = f"https://www.marktplaats.nl/plaats/api/v1/category-aggregate/{parent_id}/buckets/{child_id}/categories"
+def fetch_grandchild_categories(parent_id, parent_name, child_id, child_name, use_cache=False):
+    """Fetch grandchild categories for a child category
     
-    data = fetch_json(url, f"grandchildren of {child_name}")
+    With use_cache, the response cached in the manifest is reused without a
+    request; the API is only hit when nothing is cached for this URL.
+    """
+    url = f"{API_BASE}/{parent_id}/buckets/{child_id}/categories"
+    
+    data = _manifest.reuse(url) if use_cache and _manifest else None
+    if data is None:
+        data = fetch_json(url, f"grandchildren of {child_name}")
     
     # Categories endpoint returns a list of objects
     if not data or not isinstance(data, list):
@@ -142,13 +300,30 @@ def fetch_grandchild_categories(parent_id, parent_name, child_id, child_name):
     return grandchildren
 
 
-def fetch_all_categories():
-    """Fetch all categories using multi-level API endpoints"""
+def fetch_grandchildren_for(parent, child):
+    """Fetch grandchildren of one child category
+    
+    In incremental mode the subtree is taken from the manifest when the
+    parent's bucket list did not change since the previous run.
+    """
+    use_cache = _manifest is not None and _manifest.is_unchanged(f"{API_BASE}/{parent['id']}/buckets")
+    return fetch_grandchild_categories(parent['id'], parent['name'], child['id'], child['name'], use_cache)
+
+
+def fetch_all_categories(max_workers=DEFAULT_MAX_WORKERS):
+    """Fetch all categories using multi-level API endpoints
+    
+    Requests run on a thread pool with at most max_workers in flight over one
+    shared session. Results are collected in request order, so the output is
+    identical to a sequential run (max_workers=1).
+    """
     print("=" * 60)
     print("Fetching categories from Marktplaats API")
     print("=" * 60)
     print()
     
+    get_session(max_workers)
+    
     # Fetch parent categories
     parents = fetch_parent_categories()
     if not parents:
@@ -156,36 +331,44 @@ def fetch_all_categories():
     
     print()
     
+    total_parents = len(parents)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Fetch children (buckets) for each parent
+        children_per_parent = list(executor.map(
+            lambda item: fetch_child_categories(item[1]['id'], item[1]['name'], item[0], total_parents),
+            enumerate(parents, 1)))
+        
+        # Fetch grandchildren for each child
+        pairs = [(parent, child) for parent, children in zip(parents, children_per_parent) for child in children]
+        print()
+        print(f"Fetching grandchildren for {len(pairs)} child categories ({max_workers} in flight)...")
+        grandchildren_per_child = list(executor.map(lambda pair: fetch_grandchildren_for(*pair), pairs))
+    
+    print()
+    return build_category_tree(parents, children_per_parent, grandchildren_per_child)
+
+
+def build_category_tree(parents, children_per_parent, grandchildren_per_child):
+    """Assemble flat and nested category lists from per-parent/per-child results"""
     all_children = []
     all_grandchildren = []
     nested_structure = []
     
-    total_parents = len(parents)
+    grandchildren_iter = iter(grandchildren_per_child)
     
-    # Fetch children and grandchildren for each parent
-    for idx, parent in enumerate(parents, 1):
-        parent_id = parent['id']
-        parent_name = parent['name']
-        
-        # Fetch children (buckets)
-        children = fetch_child_categories(parent_id, parent_name, idx, total_parents)
-        
+    for parent, children in zip(parents, children_per_parent):
         parent_nested = {
-            'id': parent_id,
-            'name': parent_name,
+            'id': parent['id'],
+            'name': parent['name'],
             'shortName': parent.get('shortName'),
             'children': []
         }
         
-        # Fetch grandchildren for each child
         for child in children:
-            child_id = child['id']
-            child_name = child['name']
-            
             all_children.append(child)
             
-            # Fetch grandchildren
-            grandchildren = fetch_grandchild_categories(parent_id, parent_name, child_id, child_name)
+            grandchildren = next(grandchildren_iter)
             all_grandchildren.extend(grandchildren)
             
             # For nested structure, only keep essential fields (no redundant parent references)
@@ -198,20 +381,16 @@ def fetch_all_categories():
                 })
             
             child_nested = {
-                'id': child_id,
-                'name': child_name,
-                'parentId': parent_id,
+                'id': child['id'],
+                'name': child['name'],
+                'parentId': parent['id'],
                 'parentShortName': parent.get('shortName'),
                 'children': grandchildren_nested
             }
             
             parent_nested['children'].append(child_nested)
-            
-            # Small delay to avoid overwhelming the API
-            time.sleep(0.1)
         
         nested_structure.append(parent_nested)
-        print()
     
     return {
         'parents': parents,
@@ -221,39 +400,82 @@ def fetch_all_categories():
     }
 
 
-def save_files(parsed_data):
-    """Save parsed data to various file formats"""
+def write_if_changed(path, content):
+    """Write text to path unless the file already has exactly this content"""
+    if os.path.exists(path):
+        with open(path, encoding='utf-8', newline='') as f:
+            if f.read() == content:
+                return False
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+    return True
+
+
+def report_write(written, message, path):
+    """Print the result of a write_if_changed call"""
+    if written:
+        print(f"+ Saved {message} to {path}")
+    else:
+        print(f"= Unchanged {path}")
+
+
+def previous_timestamp(master_path, master_data):
+    """Return generated_at of the existing master file if its categories are identical"""
+    if not os.path.exists(master_path):
+        return None
+    try:
+        with open(master_path, encoding='utf-8') as f:
+            previous = json.load(f)
+    except ValueError:
+        return None
+    previous_timestamp = previous.pop('generated_at', None)
+    return previous_timestamp if previous == master_data else None
+
+
+def save_files(parsed_data, keep_timestamp=False):
+    """Save parsed data to various file formats
+    
+    Files whose content did not change are left untouched. With
+    keep_timestamp, an unchanged category tree also keeps the previous
+    generated_at timestamp, so an incremental run with no changes rewrites nothing.
+    """
     output_dir = 'categories'
     os.makedirs(output_dir, exist_ok=True)
     
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
     # Save parent categories
-    with open(f'{output_dir}/parents.json', 'w', encoding='utf-8') as f:
-        json.dump(parsed_data['parents'], f, indent=2, ensure_ascii=False)
-    print(f"+ Saved {len(parsed_data['parents'])} parent categories to {output_dir}/parents.json")
+    path = f'{output_dir}/parents.json'
+    written = write_if_changed(path, json.dumps(parsed_data['parents'], indent=2, ensure_ascii=False))
+    report_write(written, f"{len(parsed_data['parents'])} parent categories", path)
     
     # Save child categories
-    with open(f'{output_dir}/children.json', 'w', encoding='utf-8') as f:
-        json.dump(parsed_data['children'], f, indent=2, ensure_ascii=False)
-    print(f"+ Saved {len(parsed_data['children'])} child categories to {output_dir}/children.json")
+    path = f'{output_dir}/children.json'
+    written = write_if_changed(path, json.dumps(parsed_data['children'], indent=2, ensure_ascii=False))
+    report_write(written, f"{len(parsed_data['children'])} child categories", path)
     
     # Save grandchild categories
-    with open(f'{output_dir}/grandchildren.json', 'w', encoding='utf-8') as f:
-        json.dump(parsed_data['grandchildren'], f, indent=2, ensure_ascii=False)
-    print(f"+ Saved {len(parsed_data['grandchildren'])} grandchild categories to {output_dir}/grandchildren.json")
+    path = f'{output_dir}/grandchildren.json'
+    written = write_if_changed(path, json.dumps(parsed_data['grandchildren'], indent=2, ensure_ascii=False))
+    report_write(written, f"{len(parsed_data['grandchildren'])} grandchild categories", path)
     
     # Save consolidated nested master file
     master_data = {
-        'generated_at': timestamp,
         'total_parents': len(parsed_data['parents']),
         'total_children': len(parsed_data['children']),
         'total_grandchildren': len(parsed_data['grandchildren']),
         'categories': parsed_data['nested']
     }
-    with open(f'{output_dir}/categories_master.json', 'w', encoding='utf-8') as f:
-        json.dump(master_data, f, indent=2, ensure_ascii=False)
-    print(f"+ Saved consolidated master file to {output_dir}/categories_master.json")
+    path = f'{output_dir}/categories_master.json'
+    timestamp = previous_timestamp(path, master_data) if keep_timestamp else None
+    if timestamp is None:
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    master_data = {'generated_at': timestamp, **master_data}
+    written = write_if_changed(path, json.dumps(master_data, indent=2, ensure_ascii=False))
+    report_write(written, "consolidated master file", path)
+    
+    # Save compact binary snapshot for fast lookups
+    path = f'{output_dir}/{SNAPSHOT_FILE}'
+    written = write_snapshot(parsed_data['parents'], parsed_data['children'], parsed_data['grandchildren'], path)
+    report_write(written, "binary snapshot", path)
     
     # Generate markdown file
     generate_markdown(parsed_data, timestamp, output_dir)
@@ -310,13 +532,22 @@ def generate_markdown(parsed_data, timestamp, output_dir):
         md_content += f"- {grandchild['name']} -> {grandchild['parentName']} -> {grandchild['grandparentName']} (ID: {grandchild['id']})\n"
     
     # Save markdown file
-    with open(f'{output_dir}/categories.md', 'w', encoding='utf-8') as f:
-        f.write(md_content)
-    print(f"+ Saved readable markdown to {output_dir}/categories.md")
+    path = f'{output_dir}/categories.md'
+    report_write(write_if_changed(path, md_content), "readable markdown", path)
 
 
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description="Scrape the Marktplaats category tree")
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"maximum concurrent API requests (default {DEFAULT_MAX_WORKERS}, 1 = sequential)")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help=f"starting requests per second; adapts to throttling (default {DEFAULT_RATE:g})")
+    parser.add_argument('--incremental', action='store_true',
+                        help=f"send conditional requests and only re-fetch subtrees whose bucket list "
+                             f"changed, using {MANIFEST_FILE}")
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("Marktplaats Category Scraper")
     print("=" * 60)
@@ -329,8 +560,18 @@ def main():
         print("  Add BROWSER_COOKIES to config.py if you get 401 errors")
     print()
     
+    rate_limiter.rate = max(rate_limiter.min_rate, args.rate)
+    rate_limiter.max_rate = max(rate_limiter.max_rate, args.rate)
+    
+    if args.incremental:
+        manifest = ResponseManifest()
+        set_manifest(manifest)
+        print(f"- Incremental mode ({len(manifest.entries)} cached responses in {MANIFEST_FILE})")
+        print()
+    
     # Fetch all categories using multi-level API
-    data = fetch_all_categories()
+    start_time = time.time()
+    data = fetch_all_categories(max(1, args.workers))
     if not data:
         print("\nX Failed to fetch category data. Exiting.")
         return
@@ -339,13 +580,22 @@ def main():
     print("=" * 60)
     print(f"+ Fetched {len(data['parents'])} parents, "
           f"{len(data['children'])} children, "
-          f"{len(data['grandchildren'])} grandchildren")
+          f"{len(data['grandchildren'])} grandchildren "
+          f"in {time.time() - start_time:.1f}s")
+    print(f"+ {metrics.summary()}, final rate {rate_limiter.rate:.1f}/s")
+    if _manifest:
+        changed = sum(1 for is_changed in _manifest.changed.values() if is_changed)
+        print(f"+ {changed} responses changed, {_manifest.not_modified} not modified, "
+              f"{_manifest.from_cache} reused from cache")
     print("=" * 60)
     print()
     
     # Save to files
     print("Saving files...")
-    save_files(data)
+    save_files(data, keep_timestamp=args.incremental)
+    if _manifest:
+        _manifest.save()
+        print(f"+ Saved response manifest to {MANIFEST_FILE}")
     
     print()
     print("=" * 60)
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Shipping benchmark and consistency check
+Checks that the compiled tariff table picks the same PostNL and DHL service
+as a slow reference implementation for random packages in NL and BE (single
+quotes and the batch path, with and without NumPy), then times single-quote
+latency, batch throughput and cold start.
+
+Usage: python benchmark_shipping.py [--packages N] [--rows N] [--seed N] [--check-only]
+Exits with status 1 when any package gets a different service.
+"""
+
+import argparse
+import io
+import itertools
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import yaml
+
+import calculate_shipping
+from decimal import Decimal
+
+from tariff_table import CARRIERS, SUM_TOLERANCE, TARIFFS_FILE, TariffTable, country_key, load_numpy
+
+COUNTRIES = ['NL', 'BE']
+# Left-hand sides of 'X = max. N cm' limits, without spaces, in the reference's own words
+REFERENCE_BOUNDS = {
+    'l+b+h': 'sum', 'lengte+breedte+hoogte': 'sum',
+    'langstezijde': 'longest', 'lengte': 'longest',
+    'l+2b+2h': 'girth', 'l+2x(b+h)': 'girth', 'lengte+omtrek': 'girth',
+}
+
+
+def reference_grams(text):
+    """Grams of a weight like '2 kg', '500 g' or '500'"""
+    number, unit = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*(kg|g)?\s*', text.lower()).groups()
+    return float(number) * (1000 if unit == 'kg' else 1)
+
+
+def reference_cents(text):
+    """Cents of a price like '€4.40' or '€ 4,40'"""
+    return int(Decimal(text.replace('€', '').strip().replace(',', '.')) * 100)
+
+
+def reference_preference(name):
+    """Rank of a service among those that fit: mailbox parcels first, envelopes last"""
+    words = name.lower()
+    if 'brievenbuspak' in words:
+        return 0
+    if 'envelop' in words:
+        return 2
+    return 1
+
+
+def reference_limits(text):
+    """Limits of a 'max. dimensions' value: {'box': [sides], 'sum' / 'longest' / 'girth': cm}"""
+    limits = {}
+    for clause in text.lower().split(','):
+        if '=' in clause:
+            name, value = clause.split('=')
+            name = name.replace(' ', '')
+            if name not in REFERENCE_BOUNDS:
+                raise ValueError(f"unknown limit '{clause.strip()}'")
+            limits[REFERENCE_BOUNDS[name]] = float(re.search(r'\d+(?:\.\d+)?', value).group())
+        else:
+            limits['box'] = [float(number) for number in re.findall(r'\d+(?:\.\d+)?', clause)]
+            if len(limits['box']) not in (2, 3):
+                raise ValueError(f"unknown limit '{clause.strip()}'")
+    return limits
+
+
+def fits_box(dims, box, larger):
+    """Whether some orientation of the package fits inside (larger False) or covers (larger True) box
+
+    A 2-value box is a footprint: it applies to the two longest sides only.
+    """
+    sides = dims if len(box) == 3 else sorted(dims)[1:]
+    return any(all((side >= limit) if larger else (side <= limit) for side, limit in zip(orientation, box))
+               for orientation in itertools.permutations(sides))
+
+
+class ReferenceQuoter:
+    """Straightforward quote from the raw YAML data, for comparison only
+
+    Limit, weight and price strings are parsed on every call by the
+    reference_* functions above, which share no code with tariff_table, and
+    boxes are checked by trying every orientation of the package instead of
+    comparing sorted sides.
+    """
+
+    def __init__(self, tariffs_file=TARIFFS_FILE):
+        with open(tariffs_file, 'r', encoding='utf-8') as f:
+            self.tariffs = yaml.safe_load(f)
+
+    def fits(self, data, dims, weight):
+        if 'max. weight' in data and weight > reference_grams(data['max. weight']):
+            return False
+        if 'min. weight' in data and weight < reference_grams(data['min. weight']):
+            return False
+        length, width, height = sorted(dims, reverse=True)
+        limits = reference_limits(data['max. dimensions']) if 'max. dimensions' in data else {}
+        if 'box' in limits and not fits_box(dims, limits['box'], larger=False):
+            return False
+        if 'min. dimensions' in data and not fits_box(dims, reference_limits(data['min. dimensions'])['box'],
+                                                       larger=True):
+            return False
+        if 'sum' in limits and length + width + height > limits['sum'] + SUM_TOLERANCE:
+            return False
+        if 'longest' in limits and length > limits['longest']:
+            return False
+        if 'girth' in limits and length + 2 * (width + height) > limits['girth'] + SUM_TOLERANCE:
+            return False
+        return True
+
+    def cheapest(self, carrier, dims, weight, country):
+        """Name of the preferred fitting service, or None"""
+        best = None
+        for name, data in (self.tariffs.get(carrier, {}).get(country_key(country)) or {}).items():
+            if not isinstance(data, dict) or name == 'Extra opties' or 'price' not in data:
+                continue
+            if not self.fits(data, dims, weight):
+                continue
+            key = (reference_preference(name), reference_cents(data['price']))
+            if best is None or key < best[0]:
+                best = (key, name)
+        return best[1] if best else None
+
+
+def random_packages(count, table, seed):
+    """Random packages, a third of them with sides and weights exactly at a service limit"""
+    rng = random.Random(seed)
+    edges = sorted({value for service in table.services
+                    for value in (service.max_dims or ()) + (service.min_dims or ())
+                    + (service.max_longest,) if value is not None and value != float('inf')})
+    sums = sorted({service.max_sum for service in table.services if service.max_sum is not None})
+    weights = sorted({value for service in table.services
+                      for value in (service.min_grams, service.max_grams) if value is not None})
+
+    packages = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 1 / 3:
+            dims = [rng.choice(edges) for _ in range(3)]
+            weight = rng.choice(weights)
+        elif kind < 1 / 2 and sums:
+            # Split a sum-of-sides limit over the three sides, then nudge around it
+            total = rng.choice(sums) + rng.choice([-0.1, 0, 0.1])
+            a, b = sorted(rng.uniform(0, total) for _ in range(2))
+            dims = [round(a, 1), round(b - a, 1), round(total - b, 1)]
+            weight = rng.uniform(1, 1000)
+        else:
+            dims = [round(rng.uniform(0.1, 120), 1) for _ in range(3)]
+            weight = round(rng.uniform(1, 30000))
+        packages.append(([max(0.1, side) for side in dims], weight, rng.choice(COUNTRIES)))
+    return packages
+
+
+def check(table, packages):
+    """Compare every engine path with the reference; returns the mismatches as text"""
+    reference = ReferenceQuoter()
+    expected = {carrier: [reference.cheapest(carrier, *package) for package in packages] for carrier in CARRIERS}
+
+    paths = {'single': {carrier: [table.cheapest(carrier, *package) for package in packages]
+                        for carrier in CARRIERS}}
+    dims, weights, countries = zip(*packages)
+    if load_numpy():
+        paths['batch numpy'] = table.quote_batch(dims, weights, countries)
+    paths['batch python'] = table.quote_batch(dims, weights, countries, vectorized=False)
+
+    mismatches = []
+    for path, quotes in paths.items():
+        for carrier in CARRIERS:
+            for package, want, got in zip(packages, expected[carrier], quotes[carrier]):
+                got = got.name if got else None
+                if got != want:
+                    mismatches.append(f"{path} {carrier} {package}: expected {want}, got {got}")
+    return mismatches, list(paths)
+
+
+def time_per_call(function, repeat=5, number=2000):
+    """Best time of one call in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def cold_start(args, repeat=5):
+    """Median wall time of running calculate_shipping.py as a new process"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calculate_shipping.py')
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, script] + args, check=True, stdout=subprocess.DEVNULL)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def benchmark(table, rows, seed):
+    rng = random.Random(seed)
+    single = time_per_call(lambda: calculate_shipping.find_cheapest_options(19.6, 13, 1.3, 170))
+    single_be = time_per_call(lambda: calculate_shipping.find_cheapest_options(30, 20, 10, 400, 'BE'))
+    print(f"\nSingle quote: {single * 1e6:.1f} us (NL brievenbus), {single_be * 1e6:.1f} us (BE sum of sides)")
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        TariffTable.load(cache_file=os.path.join(directory, 'tariffs.cache.json'))
+        compiled = time.perf_counter() - start
+        start = time.perf_counter()
+        TariffTable.load(cache_file=os.path.join(directory, 'tariffs.cache.json'))
+        cached = time.perf_counter() - start
+    print(f"Table load: {compiled * 1000:.1f} ms compiling tariffs.yaml, {cached * 1000:.2f} ms from the cache")
+
+    lines = ['length,width,height,weight,country']
+    for _ in range(rows):
+        lines.append(f"{round(rng.uniform(0.5, 120), 1)},{round(rng.uniform(0.5, 80), 1)},"
+                     f"{round(rng.uniform(0.1, 60), 1)},{rng.randint(1, 30000)},{rng.choice(COUNTRIES)}")
+    data = '\n'.join(lines) + '\n'
+    dims = [[float(v) for v in line.split(',')[:3]] for line in lines[1:]]
+    weights = [float(line.split(',')[3]) for line in lines[1:]]
+    countries = [line.split(',')[4] for line in lines[1:]]
+
+    engine = 'NumPy' if load_numpy() else 'pure Python'
+    start = time.perf_counter()
+    table.quote_batch(dims, weights, countries)
+    elapsed = time.perf_counter() - start
+    print(f"quote_batch ({engine}): {rows} rows in {elapsed:.3f} s ({rows / elapsed:,.0f} rows/s)")
+    start = time.perf_counter()
+    calculate_shipping.quote_stream(io.StringIO(data), io.StringIO())
+    elapsed = time.perf_counter() - start
+    print(f"--batch CSV ({engine}): {rows} rows in {elapsed:.3f} s ({rows / elapsed:,.0f} rows/s)")
+
+    print(f"Cold start, single quote: {cold_start(['19.6', '13', '1.3', '170']) * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark the shipping calculator")
+    parser.add_argument('--packages', type=int, default=20000, help="random packages to check (default 20000)")
+    parser.add_argument('--rows', type=int, default=100000, help="rows for the batch benchmark (default 100000)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--check-only', action='store_true', help="skip the benchmarks")
+    args = parser.parse_args()
+
+    table = TariffTable.load()
+    packages = random_packages(args.packages, table, args.seed)
+    mismatches, paths = check(table, packages)
+    for mismatch in mismatches[:20]:
+        print(f"X {mismatch}")
+    if mismatches:
+        print(f"\n{len(mismatches)} mismatches against the reference (seed {args.seed})")
+        sys.exit(1)
+    print(f"+ {len(packages)} packages: {', '.join(paths)} agree with the reference")
+
+    if not args.check_only:
+        benchmark(table, args.rows, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Bundle optimizer
+Cheapest way to ship several items to one buyer: splits the items over one
+or more parcels, stacks the items of each parcel and picks the cheapest
+PostNL or DHL service for it. A depth-first search over the splits, with
+memoized parcel costs and a lower bound on the cost of the items still to
+place, keeps bundles of 20 items interactive.
+
+Usage: python bundle.py [--country BE] <LxBxH:grams[*count]> ...
+Example: python bundle.py 19.6x13x1.3:170*4 24x17x3:450
+Example: python bundle.py --file items.csv   (columns length,width,height,weight[,name])
+"""
+
+import argparse
+import json
+import sys
+from collections import namedtuple
+
+from calculate_shipping import read_batch
+from tariff_table import CARRIERS, TariffTable, country_key, fits, get_tariff_table
+
+MAX_NODES = 20000  # Search steps before settling for the best bundle found so far
+
+# Ways to lay every item of a stack, as (height side, footprint sides) indexes into its
+# sides sorted ascending: flat, on its long edge, on end
+STACKINGS = [(0, (2, 1)), (1, (2, 0)), (2, (1, 0))]
+
+
+def parse_item(text):
+    """Items of an argument like '19.6x13x1.3:170' or '19.6x13x1.3:170*3': [(sides, grams)]"""
+    spec, _, count = text.partition('*')
+    dims, _, weight = spec.partition(':')
+    try:
+        sides = tuple(sorted(float(side) for side in dims.lower().split('x')))
+        if len(sides) != 3 or not weight:
+            raise ValueError
+        return [(sides, float(weight))] * int(count or 1)
+    except ValueError:
+        raise ValueError(f"expected LxBxH:grams[*count], got '{text}'") from None
+
+
+def read_items(path):
+    """Items and their names from a CSV or JSONL file like the --batch input of calculate_shipping.py"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        file_format, header, rows = read_batch(f)
+        items, names = [], []
+        for row in rows:
+            record = dict(zip(header, row)) if file_format == 'csv' else json.loads(row)
+            sides = tuple(sorted(float(record[side]) for side in ('length', 'width', 'height')))
+            items.append((sides, float(record['weight'])))
+            names.append(str(record.get('name') or f"item {len(items)}"))
+    return items, names
+
+
+def add_to_stacks(stacks, sides):
+    """Stack sizes after adding an item: per stacking (long footprint, short footprint, height)"""
+    return tuple((max(long, sides[footprint[0]]), max(short, sides[footprint[1]]), height + sides[up])
+                 for (long, short, height), (up, footprint) in zip(stacks, STACKINGS))
+
+
+EMPTY_STACKS = tuple((0.0, 0.0, 0.0) for _ in STACKINGS)
+
+# A set of items in one box: price in cents and service of the cheapest stacking (None while
+# it only fails a minimum), its dims, the least price it can still reach by adding items,
+# the stacks of every stacking, total grams and item_usage() summed
+Parcel = namedtuple('Parcel', ['cost', 'service', 'dims', 'floor', 'stacks', 'weight', 'usage'])
+
+
+def service_capacity(service):
+    """Most a parcel of a service can hold: (grams, cm3, cm of stacked thickness), inf without a limit
+
+    Thickness is bounded by the longest side, since any side of an item can
+    end up as the height of its stack.
+    """
+    inf = float('inf')
+    volume = longest = inf
+    if service.max_dims is not None:
+        volume = service.max_dims[0] * service.max_dims[1] * service.max_dims[2]
+        longest = service.max_dims[2]
+    if service.max_sum is not None:
+        volume = min(volume, (service.max_sum / 3) ** 3)
+        longest = min(longest, service.max_sum)
+    if service.max_longest is not None:
+        longest = min(longest, service.max_longest)
+    if service.max_girth is not None:
+        # Largest box with longest + 2 x (other two) = girth is girth/3 x girth/6 x girth/6
+        volume = min(volume, service.max_girth ** 3 / 108)
+        longest = min(longest, service.max_girth)
+    grams = inf if service.max_grams is None else service.max_grams
+    return grams, volume, longest
+
+
+def item_usage(sides, weight):
+    """What an item takes of a parcel's capacity: (grams, cm3, cm of thickness at least)"""
+    return weight, sides[0] * sides[1] * sides[2], sides[0]
+
+
+def price_estimate(parcel):
+    """Price of a parcel, or its floor while it is under a service's minimum"""
+    return parcel.floor if parcel.cost is None else parcel.cost
+
+
+class BundleOptimizer:
+    """Finds the cheapest split of items over parcels for one destination country"""
+
+    def __init__(self, items, country='NL', table=None, max_nodes=MAX_NODES):
+        self.items = items
+        self.country = country
+        self.table = table or get_tariff_table()
+        self.max_nodes = max_nodes
+        self._parcels = {0: Parcel(0, None, (0.0,) * 3, 0, EMPTY_STACKS, 0.0, (0.0, 0.0, 0.0))}
+        self.rates = self.cheapest_rates()
+        # A parcel under a service's minimum weight or size can still grow into it, so the
+        # prices it can reach come from the services without their minimums
+        self._with_minimums = {s._replace(min_grams=None, min_dims=None): s for s in self.table.services
+                               if s.min_grams is not None or s.min_dims is not None}
+        self.reachable = TariffTable([s._replace(min_grams=None, min_dims=None) for s in self.table.services])
+
+    def cheapest_service(self, dims, weight):
+        """(cheapest service of any carrier for a parcel or None, least price it can reach by growing or None)"""
+        best = floor = None
+        for carrier in CARRIERS:
+            for service in self.reachable.options(carrier, dims, weight, self.country):
+                if floor is None or service.price_cents < floor:
+                    floor = service.price_cents
+                if service in self._with_minimums:
+                    service = self._with_minimums[service]
+                    if not fits(service, sorted(dims), weight):
+                        continue
+                if best is None or (service.price_cents, service.priority) < (best.price_cents, best.priority):
+                    best = service
+        return best, floor
+
+    def cheapest_rates(self):
+        """Lowest price in cents per gram, per cm3 and per cm of thickness of any service
+
+        A parcel never costs less than its contents times these rates, which
+        gives the lower bound for the search.
+        """
+        rates = [float('inf')] * 3
+        for carrier in CARRIERS:
+            for service in self.table.by_route.get((carrier, country_key(self.country)), ()):
+                for r, capacity in enumerate(service_capacity(service)):
+                    rates[r] = min(rates[r], service.price_cents / capacity)
+        return rates
+
+    def add_item(self, mask, item):
+        """Parcel with the items in mask plus item, or None when it can never fit a service
+
+        Parcels only depend on their set of items, so they are memoized by
+        mask. Adding an item can make a parcel cheaper when it reaches a
+        service's minimum weight, but never cheaper than its floor, which is
+        what the search bounds with.
+        """
+        new_mask = mask | 1 << item
+        if new_mask not in self._parcels:
+            base = self._parcels[mask]
+            sides, item_weight = self.items[item]
+            stacks = add_to_stacks(base.stacks, sides)
+            weight = base.weight + item_weight
+            usage = tuple(a + b for a, b in zip(base.usage, item_usage(sides, item_weight)))
+            cost, best_service, best_dims, floor = None, None, None, None
+            for dims in stacks:
+                service, reachable = self.cheapest_service(dims, weight)
+                if service and (cost is None or service.price_cents < cost):
+                    cost, best_service, best_dims = service.price_cents, service, dims
+                if reachable is not None and (floor is None or reachable < floor):
+                    floor = reachable
+            parcel = None
+            if floor is not None:
+                parcel = Parcel(cost, best_service, best_dims, floor, stacks, weight, usage)
+            self._parcels[new_mask] = parcel
+        return self._parcels[new_mask]
+
+    def lower_bound(self, total, parcels, remaining):
+        """Least total of any bundle that completes the partial one, from the floors of its parcels
+
+        Open parcels can take more items for their floor price only while
+        that price covers their contents at the cheapest rate; the rest of
+        the remaining usage costs at least that rate.
+        """
+        bound = total
+        for r, (rate, need) in enumerate(zip(self.rates, remaining)):
+            if rate:
+                room = 0.0
+                for mask in parcels:
+                    parcel = self._parcels[mask]
+                    room += max(0.0, parcel.floor - rate * parcel.usage[r])
+                bound = max(bound, total + rate * need - room)
+        return bound
+
+    def solve(self):
+        """Cheapest bundle: {'parcels': [{items, dims, weight, service}], 'total_cents', 'optimal', 'nodes'}
+
+        Raises ValueError when the items fit no service, or when no bundle
+        was found within max_nodes steps.
+        """
+        n = len(self.items)
+        # Big and heavy items first, so impossible parcels show up near the root
+        order = sorted(range(n), key=lambda i: (-self.items[i][0][0] * self.items[i][0][1] * self.items[i][0][2],
+                                                -self.items[i][1]))
+        for i in order:
+            if self.add_item(0, i) is None:  # Too big or heavy for any service
+                sides, weight = self.items[i]
+                raise ValueError(f"item {i + 1} ({' x '.join(f'{side:g}' for side in sides)} cm, "
+                                 f"{weight:g} g) fits no service")
+        # An item equal to the one before it never goes into an earlier parcel (same splits, other order)
+        same_as_previous = [k > 0 and self.items[order[k]] == self.items[order[k - 1]] for k in range(n)]
+        # Usage of the items from order[k] on
+        remaining = [(0.0, 0.0, 0.0)] * (n + 1)
+        for k in range(n - 1, -1, -1):
+            usage = item_usage(*self.items[order[k]])
+            remaining[k] = tuple(a + b for a, b in zip(usage, remaining[k + 1]))
+
+        parcels = []  # Masks of the open parcels
+        placed_in = [0] * n
+        best = {'total': float('inf'), 'parcels': None}
+        nodes = 0
+
+        def search(k, floor):
+            """Place order[k:] given the open parcels, whose floors add up to floor"""
+            nonlocal nodes
+            nodes += 1
+            if nodes > self.max_nodes:
+                return
+            if k == n:
+                costs = [self._parcels[mask].cost for mask in parcels]
+                if None not in costs and sum(costs) < best['total']:
+                    best['total'] = sum(costs)
+                    best['parcels'] = list(parcels)
+                return
+            if self.lower_bound(floor, parcels, remaining[k]) >= best['total']:
+                return
+            item = order[k]
+            first = placed_in[k - 1] if same_as_previous[k] else 0
+
+            # Every open parcel that can take the item, and a new parcel, cheapest outcome first
+            moves = []
+            for p in range(first, len(parcels)):
+                old, new = self._parcels[parcels[p]], self.add_item(parcels[p], item)
+                if new is not None:
+                    moves.append((price_estimate(new) - price_estimate(old), floor - old.floor + new.floor, p))
+            new = self._parcels[1 << item]
+            moves.append((price_estimate(new), floor + new.floor, len(parcels)))
+            moves.sort(key=lambda move: move[0])
+
+            for _, new_floor, p in moves:
+                if new_floor >= best['total']:
+                    continue
+                placed_in[k] = p
+                if p == len(parcels):
+                    parcels.append(1 << item)
+                    search(k + 1, new_floor)
+                    parcels.pop()
+                else:
+                    parcels[p] |= 1 << item
+                    search(k + 1, new_floor)
+                    parcels[p] &= ~(1 << item)
+
+        search(0, 0)
+        if best['parcels'] is None:
+            reason = "no split of the items fits" if nodes <= self.max_nodes else f"no bundle found in {nodes} steps"
+            raise ValueError(reason)
+        result = []
+        for mask in best['parcels']:
+            parcel = self._parcels[mask]
+            result.append({'items': [i for i in range(n) if mask >> i & 1], 'dims': parcel.dims,
+                           'weight': parcel.weight, 'service': parcel.service})
+        return {'parcels': result, 'total_cents': best['total'], 'optimal': nodes <= self.max_nodes, 'nodes': nodes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cheapest way to ship several items together")
+    parser.add_argument('items', nargs='*', help="items as LxBxH:grams, optionally *count (cm and grams)")
+    parser.add_argument('--file', help="CSV or JSONL with length, width, height, weight and an optional name")
+    parser.add_argument('--country', default='NL', help="destination, NL or BE (default NL)")
+    args = parser.parse_args()
+
+    try:
+        items, names = read_items(args.file) if args.file else ([], [])
+        for text in args.items:
+            items.extend(parse_item(text))
+        names += [f"item {i + 1}" for i in range(len(names), len(items))]
+        if not items:
+            parser.error("no items given")
+        result = BundleOptimizer(items, args.country).solve()
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    for number, parcel in enumerate(result['parcels'], 1):
+        service = parcel['service']
+        dims = ' x '.join(f"{side:.1f}" for side in sorted(parcel['dims'], reverse=True))
+        print(f"Parcel {number}: {service.carrier} {service.name} {service.price_str} - "
+              f"{len(parcel['items'])} items, {dims} cm, {parcel['weight']:g} g")
+        print(f"  {', '.join(names[i] for i in parcel['items'])}")
+    note = "" if result['optimal'] else f" (best found in {result['nodes']} steps, not proven cheapest)"
+    print(f"Total €{result['total_cents'] / 100:.2f} for {len(result['parcels'])} parcel(s){note}")
+
+
+if __name__ == '__main__':
+    main()
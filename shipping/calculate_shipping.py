@@ -4,150 +4,213 @@ Shipping cost calculator for PostNL and DHL
 Usage: python calculate_shipping.py <length> <width> <height> <weight> [country]
 Example: python calculate_shipping.py 19.6 13 1.3 170
 Example: python calculate_shipping.py 19.6 13 1.3 170 BE
+
+Batch: python calculate_shipping.py --batch [file.csv|file.jsonl|-]
+Reads rows of length, width, height, weight[, country] as CSV (with or
+without a header) or JSONL from a file or stdin, and writes them back in
+the same format with the cheapest PostNL and DHL option added.
 """
 
+import csv
+import itertools
+import json
+import math
+import operator
 import sys
-import yaml
-from pathlib import Path
+
+from tariff_table import CARRIERS, get_tariff_table
+
+BATCH_FIELDS = ['length', 'width', 'height', 'weight', 'country']
+RESULT_FIELDS = ['postnl', 'postnl_price', 'dhl', 'dhl_price']
+CHUNK_SIZE = 10000  # Rows quoted at once; output is written after every chunk
 
 
-def parse_dimensions(dim_str):
-    """Parse dimension string like '38 x 26.5 x 3.2 cm' or '14 x 9 cm' or special formats"""
-    # Handle special format like "L + B + H = max. 90 cm, langste zijde = max. 60 cm"
-    if 'L + B + H' in dim_str:
-        # Skip this complex format for now - we can't easily parse it
+def option_dict(service):
+    """Shipping option in the format returned by find_cheapest_options"""
+    if service is None:
         return None
-    
-    parts = dim_str.replace('cm', '').strip().split('x')
-    return [float(p.strip()) for p in parts]
+    return {
+        'name': service.name,
+        'price': service.price_cents / 100,
+        'price_str': service.price_str
+    }
 
 
-def fits_in_box(pkg_dims, max_dims):
-    """Check if package fits in the shipping box (any orientation)"""
-    # Sort both dimension lists to compare smallest to smallest, etc.
-    pkg_sorted = sorted(pkg_dims)
-    max_sorted = sorted(max_dims)
-    
-    # Check if all package dimensions fit within box dimensions
-    return all(p <= m for p, m in zip(pkg_sorted, max_sorted))
+def find_cheapest_options(length, width, height, weight, country='Nederland'):
+    """Find cheapest PostNL and DHL shipping options (prefer pakket/brievenbuspakket over envelop)"""
+    table = get_tariff_table()
+    pkg_dims = [length, width, height]
+    cheapest_postnl = table.cheapest('PostNL', pkg_dims, weight, country)
+    cheapest_dhl = table.cheapest('DHL', pkg_dims, weight, country)
+    return option_dict(cheapest_postnl), option_dict(cheapest_dhl)
 
 
-def parse_weight_limit(weight_str):
-    """Parse weight string like '2 kg' or '500 g' to grams"""
-    weight_str = weight_str.strip().lower()
-    if 'kg' in weight_str:
-        return float(weight_str.replace('kg', '').strip()) * 1000
-    elif 'g' in weight_str:
-        return float(weight_str.replace('g', '').strip())
-    return float(weight_str)
+def is_number(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
 
 
-def find_cheapest_options(length, width, height, weight, country='Nederland'):
-    """Find cheapest PostNL and DHL shipping options"""
-    # Load tariffs
-    tariffs_file = Path(__file__).parent / 'tariffs.yaml'
-    with open(tariffs_file, 'r', encoding='utf-8') as f:
-        tariffs = yaml.safe_load(f)
-    
-    pkg_dims = [length, width, height]
-    weight_g = weight
-    
-    postnl_options = []
-    dhl_options = []
-    
-    # Get country data
-    country_key = 'België' if country.upper() in ['BE', 'BELGIË', 'BELGIUM'] else 'Nederland'
-    
-    # Check PostNL options
-    if 'PostNL' in tariffs and country_key in tariffs['PostNL']:
-        for service_name, service_data in tariffs['PostNL'][country_key].items():
-            if not isinstance(service_data, dict):
-                continue
-            
-            # Check dimensions
-            if 'max. dimensions' in service_data:
-                max_dims = parse_dimensions(service_data['max. dimensions'])
-                if max_dims is None:
-                    continue
-                if not fits_in_box(pkg_dims, max_dims):
-                    continue
-            
-            # Check weight
-            if 'max. weight' in service_data:
-                max_weight = parse_weight_limit(service_data['max. weight'])
-                if weight_g > max_weight:
-                    continue
-            
-            if 'min. weight' in service_data:
-                min_weight = parse_weight_limit(service_data['min. weight'])
-                if weight_g < min_weight:
-                    continue
-            
-            # Get price
-            if 'price' in service_data:
-                price_str = service_data['price'].replace('€', '').strip()
-                price = float(price_str)
-                postnl_options.append({
-                    'name': service_name,
-                    'price': price,
-                    'price_str': service_data['price']
-                })
-    
-    # Check DHL options
-    if 'DHL' in tariffs and country_key in tariffs['DHL']:
-        for service_name, service_data in tariffs['DHL'][country_key].items():
-            if not isinstance(service_data, dict) or service_name == 'Extra opties':
-                continue
-            
-            # Check dimensions
-            if 'max. dimensions' in service_data:
-                max_dims = parse_dimensions(service_data['max. dimensions'])
-                if max_dims is None:
-                    continue
-                if not fits_in_box(pkg_dims, max_dims):
-                    continue
-            
-            # Check weight
-            if 'max. weight' in service_data:
-                max_weight = parse_weight_limit(service_data['max. weight'])
-                if weight_g > max_weight:
-                    continue
-            
-            if 'min. weight' in service_data:
-                min_weight = parse_weight_limit(service_data['min. weight'])
-                if weight_g < min_weight:
-                    continue
-            
-            # Get price
-            if 'price' in service_data:
-                price_str = service_data['price'].replace('€', '').strip()
-                price = float(price_str)
-                dhl_options.append({
-                    'name': service_name,
-                    'price': price,
-                    'price_str': service_data['price']
-                })
-    
-    # Find cheapest options (prefer pakket/brievenbuspakket over envelop)
-    def service_priority(option):
-        """Lower score = higher priority. Prefer brievenbuspakket over envelop."""
-        name = option['name'].lower()
-        if 'envelop' in name and 'brievenbuspakket' not in name:
-            return (2, option['price'])  # Lowest priority
-        elif 'brievenbuspakket' in name or 'brievenbuspakje' in name:
-            return (0, option['price'])  # Highest priority
+def read_batch(f):
+    """Read a CSV or JSONL stream; returns (format, header, rows)
+
+    CSV rows are lists of strings (header None for JSONL). JSONL rows are
+    the lines themselves, decoded per chunk by decode_lines().
+    """
+    first = next((line for line in f if line.strip()), None)
+    if first is None:
+        return None, None, iter(())
+    lines = itertools.chain([first], f)
+    if first.lstrip().startswith('{'):
+        return 'jsonl', None, (line for line in lines if line.strip())
+
+    # Blank lines come out of the reader as empty rows
+    reader = filter(None, csv.reader(lines))
+    header = next(reader)
+    if is_number(header[0]):
+        # No header row: the columns are in the order of BATCH_FIELDS, country optional per row
+        header, reader = list(BATCH_FIELDS), itertools.chain([header], reader)
+    else:
+        header = [name.strip().lower() for name in header]
+    # Short rows get empty cells, so the result columns always line up with the header
+    width = len(header)
+    return 'csv', header, (row if len(row) >= width else row + [''] * (width - len(row)) for row in reader)
+
+
+def decode_lines(lines):
+    """Decode JSONL lines in one call; None for a line that is not valid JSON"""
+    try:
+        records = json.loads('[' + ','.join(lines) + ']')
+        if len(records) == len(lines):
+            return records
+    except ValueError:
+        pass
+
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            records.append(None)
+    return records
+
+
+def parse_packages(records, get_numbers, get_country):
+    """Columns (dims, weights, countries) of the valid records, and a valid flag per record
+
+    A record is invalid when a number is missing, negative, infinite or NaN.
+    """
+    try:
+        numbers = list(map(float, itertools.chain.from_iterable(map(get_numbers, records))))
+        if not all(0 <= number < math.inf for number in numbers):
+            raise ValueError
+        countries = [get_country(record) or 'NL' for record in records]
+        return list(zip(numbers[0::4], numbers[1::4], numbers[2::4])), numbers[3::4], countries, [True] * len(records)
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        pass  # Find the invalid rows one by one
+
+    dims, weights, countries, valid = [], [], [], []
+    for record in records:
+        try:
+            length, width, height, weight = numbers = [float(number) for number in get_numbers(record)]
+            if not all(0 <= number < math.inf for number in numbers):
+                raise ValueError
+            dims.append((length, width, height))
+            weights.append(weight)
+        except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+            valid.append(False)
+            continue
+        countries.append(get_country(record) or 'NL')
+        valid.append(True)
+    return dims, weights, countries, valid
+
+
+def quote_stream(f, out, chunk_size=CHUNK_SIZE):
+    """Quote every row of f and write it to out with the results added; returns (rows, invalid)"""
+    table = get_tariff_table()
+    file_format, header, rows = read_batch(f)
+    if file_format is None:
+        return 0, 0
+
+    # Result columns of every combination of services, formatted once instead of once per row
+    labels = {None: ['', '']}
+    for service in table.services:
+        labels[service] = [service.name, f"{service.price_cents / 100:.2f}"]
+    carrier_services = [[None] + [service for service in table.services if service.carrier == carrier]
+                        for carrier in CARRIERS]
+    result_columns = {combination: sum((labels[service] for service in combination), []) + ['']
+                      for combination in itertools.product(*carrier_services)}
+    invalid_columns = ['', ''] * len(CARRIERS) + ['invalid dimensions or weight']
+    if file_format == 'jsonl':
+        # The same, as JSON members to append to the original object text
+        keys = RESULT_FIELDS + ['error']
+        result_columns = {combination: json.dumps(dict(zip(keys, columns)), ensure_ascii=False)[1:-1]
+                          for combination, columns in result_columns.items()}
+        invalid_columns = json.dumps(dict(zip(keys, invalid_columns)), ensure_ascii=False)[1:-1]
+
+    if file_format == 'csv':
+        missing = [name for name in BATCH_FIELDS[:4] if name not in header]
+        if missing:
+            raise ValueError(f"missing column(s): {', '.join(missing)}")
+        get_numbers = operator.itemgetter(*[header.index(name) for name in BATCH_FIELDS[:4]])
+        country_column = header.index('country') if 'country' in header else None
+        get_country = (lambda row: None) if country_column is None else (
+            lambda row: row[country_column] if country_column < len(row) else None)
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(header + RESULT_FIELDS + ['error'])
+    else:
+        get_numbers = operator.itemgetter(*BATCH_FIELDS[:4])
+        get_country = lambda record: record.get('country')
+
+    total = invalid = 0
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        records = chunk if file_format == 'csv' else decode_lines(chunk)
+        dims, weights, countries, valid = parse_packages(records, get_numbers, get_country)
+        quotes = table.quote_batch(dims, weights, countries)
+        results = iter(zip(*[quotes[carrier] for carrier in CARRIERS]))
+        columns = [result_columns[next(results)] if ok else invalid_columns for ok in valid]
+        invalid += valid.count(False)
+        total += len(chunk)
+
+        if file_format == 'csv':
+            writer.writerows(row + extra for row, extra in zip(chunk, columns))
         else:
-            return (1, option['price'])  # Medium priority
-    
-    cheapest_postnl = min(postnl_options, key=service_priority) if postnl_options else None
-    cheapest_dhl = min(dhl_options, key=service_priority) if dhl_options else None
-    
-    return cheapest_postnl, cheapest_dhl
+            for line, record, fields in zip(chunk, records, columns):
+                # Append the result members to the original object text; other lines get a new object
+                body = line.rstrip()[:-1].rstrip() if isinstance(record, dict) else '{'
+                out.write(f"{body}{'' if body.endswith('{') else ', '}{fields}}}\n")
+        out.flush()
+    return total, invalid
+
+
+def batch_main(args):
+    """Quote a CSV/JSONL file (or stdin for '-' or no argument) to stdout; the summary goes to stderr"""
+    path = args[0] if args else '-'
+    try:
+        if path == '-':
+            total, invalid = quote_stream(sys.stdin, sys.stdout)
+        else:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                total, invalid = quote_stream(f, sys.stdout)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Quoted {total} packages" + (f", {invalid} invalid" if invalid else ""), file=sys.stderr)
 
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--batch':
+        batch_main(sys.argv[2:])
+        return
+
     if len(sys.argv) < 5:
         print("Usage: python calculate_shipping.py <length> <width> <height> <weight> [country]")
+        print("       python calculate_shipping.py --batch [file.csv|file.jsonl|-]")
         print("Example: python calculate_shipping.py 19.6 13 1.3 170")
         print("Example: python calculate_shipping.py 19.6 13 1.3 170 BE")
         sys.exit(1)
@@ -0,0 +1,335 @@
+"""
+Tariff Table
+tariffs.yaml compiled once into flat service records: dimensions sorted and
+in cm, weights in grams, prices in cents. The compiled table is cached next
+to the YAML file and rebuilt when the YAML changes, so a quote is a filter
+over a few tuples instead of parsing YAML and strings.
+"""
+
+import json
+import math
+import os
+import re
+from collections import namedtuple
+from pathlib import Path
+
+np = None  # NumPy once load_numpy() imported it, False when it is not installed
+
+TARIFFS_FILE = Path(__file__).parent / 'tariffs.yaml'
+CACHE_FILE = Path(__file__).parent / 'tariffs.cache.json'
+CACHE_VERSION = 2
+
+CARRIERS = ['PostNL', 'DHL']
+COUNTRY_ALIASES = {'BE': 'België', 'BELGIË': 'België', 'BELGIUM': 'België'}
+DEFAULT_COUNTRY = 'Nederland'
+
+# Dimension limits, each None when the service has no such limit:
+#   max_dims/min_dims  (shortest, middle, longest) side the package must fit in / cover;
+#                      a 2-value box bounds the two longest sides (padded with inf / 0)
+#   max_sum            length + width + height
+#   max_longest        longest side
+#   max_girth          longest side + 2 x the other two (lengte + omtrek)
+# min_grams/max_grams are None without a limit.
+# priority: 0 brievenbuspakket/-pakje, 1 other parcels, 2 envelopes (lower is preferred)
+Service = namedtuple('Service', ['carrier', 'country', 'name', 'max_dims', 'min_dims', 'max_sum', 'max_longest',
+                                 'max_girth', 'min_grams', 'max_grams', 'price_cents', 'price_str', 'priority'])
+
+# Sums of sides are compared with this much room (cm), so 41.7 + 17.2 + 31.1 fits 90
+# whatever the order of the floating point additions
+SUM_TOLERANCE = 1e-6
+LIMIT_FIELDS = ['max_dims', 'min_dims', 'max_sum', 'max_longest', 'max_girth']
+NUMBER = r'(\d+(?:\.\d+)?)'
+BOX_PATTERN = re.compile(rf'^{NUMBER}\s*x\s*{NUMBER}(?:\s*x\s*{NUMBER})?\s*cm$')
+BOUND_PATTERN = re.compile(rf'^(.+?)\s*=\s*(?:max\.\s*)?{NUMBER}\s*cm$')
+# Left-hand sides of 'X = max. N cm' clauses, after lowercasing and normalizing spaces
+BOUND_NAMES = {
+    'l + b + h': 'max_sum',
+    'lengte + breedte + hoogte': 'max_sum',
+    'langste zijde': 'max_longest',
+    'lengte': 'max_longest',
+    'l + 2b + 2h': 'max_girth',
+    'l + 2 x (b + h)': 'max_girth',
+    'lengte + omtrek': 'max_girth',
+}
+
+
+def parse_dimensions(dim_str):
+    """Parse a box like '38 x 26.5 x 3.2 cm' or '14 x 9 cm' to its sides, sorted ascending, or None"""
+    match = BOX_PATTERN.match(dim_str.strip().lower())
+    if not match:
+        return None
+    return sorted(float(side) for side in match.groups() if side is not None)
+
+
+def parse_dimension_limits(dim_str):
+    """Parse a 'max. dimensions' value into {limit field: value}
+
+    Accepts a box ('38 x 26.5 x 3.2 cm') and comma-separated bounds such as
+    'L + B + H = max. 90 cm, langste zijde = max. 60 cm'. Anything else
+    raises ValueError, so a service is never left out because its limits
+    are written differently.
+    """
+    limits = {}
+    for clause in re.split(r',\s+', dim_str.strip()):
+        box = parse_dimensions(clause)
+        if box is not None:
+            # A 2-value box bounds the two longest sides; the shortest is free
+            limits['max_dims'] = tuple([math.inf] * (3 - len(box)) + box)
+            continue
+        match = BOUND_PATTERN.match(clause.strip().lower())
+        name = re.sub(r'\s+', ' ', re.sub(r'\s*\+\s*', ' + ', match.group(1))).strip() if match else None
+        if name not in BOUND_NAMES:
+            raise ValueError(f"unrecognised dimension limit '{clause}'")
+        limits[BOUND_NAMES[name]] = float(match.group(2))
+    return limits
+
+
+def parse_min_dimensions(dim_str):
+    """Parse a 'min. dimensions' box into a sorted 3-tuple; a 2-value box applies to the two longest sides"""
+    box = parse_dimensions(dim_str)
+    if box is None:
+        raise ValueError(f"unrecognised minimum dimensions '{dim_str}'")
+    return tuple([0.0] * (3 - len(box)) + box)
+
+
+def parse_weight_limit(weight_str):
+    """Parse weight string like '2 kg' or '500 g' to grams"""
+    weight_str = weight_str.strip().lower()
+    if 'kg' in weight_str:
+        return float(weight_str.replace('kg', '').strip()) * 1000
+    elif 'g' in weight_str:
+        return float(weight_str.replace('g', '').strip())
+    return float(weight_str)
+
+
+def parse_price_cents(price_str):
+    """Parse a price like '€4.40' to 440"""
+    return round(float(price_str.replace('€', '').strip()) * 100)
+
+
+def service_priority(name):
+    """Lower score = higher priority. Prefer brievenbuspakket over envelop."""
+    name = name.lower()
+    if 'envelop' in name and 'brievenbuspakket' not in name:
+        return 2
+    elif 'brievenbuspakket' in name or 'brievenbuspakje' in name:
+        return 0
+    return 1
+
+
+def country_key(country):
+    """Country name as used in tariffs.yaml for a code or name like 'BE' or 'NL'"""
+    return COUNTRY_ALIASES.get(country.upper(), DEFAULT_COUNTRY)
+
+
+def compile_services(tariffs):
+    """Service records of every priced service in parsed tariffs.yaml data, in file order"""
+    services = []
+    for carrier in CARRIERS:
+        for country, country_services in (tariffs.get(carrier) or {}).items():
+            for name, data in (country_services or {}).items():
+                if not isinstance(data, dict) or name == 'Extra opties' or 'price' not in data:
+                    continue
+                try:
+                    limits = dict.fromkeys(LIMIT_FIELDS)
+                    if 'max. dimensions' in data:
+                        limits.update(parse_dimension_limits(data['max. dimensions']))
+                    if 'min. dimensions' in data:
+                        limits['min_dims'] = parse_min_dimensions(data['min. dimensions'])
+                except ValueError as e:
+                    raise ValueError(f"{carrier} {country} '{name}': {e}") from None
+                services.append(Service(
+                    carrier=carrier,
+                    country=country,
+                    name=name,
+                    **limits,
+                    min_grams=parse_weight_limit(data['min. weight']) if 'min. weight' in data else None,
+                    max_grams=parse_weight_limit(data['max. weight']) if 'max. weight' in data else None,
+                    price_cents=parse_price_cents(data['price']),
+                    price_str=data['price'],
+                    priority=service_priority(name)
+                ))
+    return services
+
+
+def fits(service, pkg_sorted, weight):
+    """Whether a package (dimensions sorted ascending) and weight in grams fit a service"""
+    if service.max_grams is not None and weight > service.max_grams:
+        return False
+    if service.min_grams is not None and weight < service.min_grams:
+        return False
+    short, middle, longest = pkg_sorted
+    # Boxes compare smallest to smallest, etc. (any orientation)
+    if service.max_dims is not None:
+        max_short, max_middle, max_longest = service.max_dims
+        if short > max_short or middle > max_middle or longest > max_longest:
+            return False
+    if service.min_dims is not None:
+        min_short, min_middle, min_longest = service.min_dims
+        if short < min_short or middle < min_middle or longest < min_longest:
+            return False
+    if service.max_sum is not None and short + middle + longest > service.max_sum + SUM_TOLERANCE:
+        return False
+    if service.max_longest is not None and longest > service.max_longest:
+        return False
+    if service.max_girth is not None and longest + 2 * (short + middle) > service.max_girth + SUM_TOLERANCE:
+        return False
+    return True
+
+
+def load_numpy():
+    """Import NumPy on first use, since single quotes never need it; returns False when it is not installed"""
+    global np
+    if np is None:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = False
+    return np
+
+
+def first_fit(services, pkg_sorted, weight):
+    """First of services (in preference order) that fits, or None"""
+    for service in services:
+        if fits(service, pkg_sorted, weight):
+            return service
+    return None
+
+
+class TariffTable:
+    """Compiled services per (carrier, country), each list sorted by (priority, price)"""
+
+    def __init__(self, services):
+        self.services = list(services)
+        self._limits = {}
+        self.by_route = {}
+        for service in self.services:
+            self.by_route.setdefault((service.carrier, service.country), []).append(service)
+        for route_services in self.by_route.values():
+            # Stable sort: equal services keep their order in tariffs.yaml
+            route_services.sort(key=lambda s: (s.priority, s.price_cents))
+
+    @classmethod
+    def load(cls, tariffs_file=TARIFFS_FILE, cache_file=CACHE_FILE):
+        """Load the compiled table from the cache, compiling tariffs.yaml when it changed"""
+        stat = os.stat(tariffs_file)
+        source = {'version': CACHE_VERSION, 'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+        try:
+            with open(cache_file, encoding='utf-8') as f:
+                data = json.load(f)
+            if data['source'] == source:
+                return cls(Service(*[tuple(v) if isinstance(v, list) else v for v in record])
+                           for record in data['services'])
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        # Only needed when the cache is stale
+        import yaml
+        with open(tariffs_file, 'r', encoding='utf-8') as f:
+            table = cls(compile_services(yaml.safe_load(f)))
+        try:
+            tmp_path = f'{cache_file}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'source': source, 'services': table.services}, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_file)
+        except OSError:
+            pass  # A read-only checkout still works, it only compiles every time
+        return table
+
+    def options(self, carrier, pkg_dims, weight, country='Nederland'):
+        """All services of a carrier that fit, best first"""
+        pkg_sorted = sorted(pkg_dims)
+        return [service for service in self.by_route.get((carrier, country_key(country)), ())
+                if fits(service, pkg_sorted, weight)]
+
+    def cheapest(self, carrier, pkg_dims, weight, country='Nederland'):
+        """Preferred service of a carrier that fits (lowest priority, then price), or None"""
+        return first_fit(self.by_route.get((carrier, country_key(country)), ()), sorted(pkg_dims), weight)
+
+    def limit_arrays(self, carrier, country):
+        """NumPy arrays of the limits of a route's services, a missing limit as inf (or 0 / -inf for minimums)
+
+        Returns (max_dims, min_dims, max_sum, max_longest, max_girth,
+        min_grams, max_grams); the dims arrays have one row of 3 per service.
+        """
+        key = (carrier, country)
+        if key not in self._limits:
+            services = self.by_route.get(key, [])
+
+            def column(field, missing):
+                return np.array([missing if getattr(s, field) is None else getattr(s, field) for s in services],
+                                dtype=float)
+
+            self._limits[key] = (
+                np.array([s.max_dims or (np.inf,) * 3 for s in services], dtype=float).reshape(-1, 3),
+                np.array([s.min_dims or (0.0,) * 3 for s in services], dtype=float).reshape(-1, 3),
+                column('max_sum', np.inf) + SUM_TOLERANCE,
+                column('max_longest', np.inf),
+                column('max_girth', np.inf) + SUM_TOLERANCE,
+                column('min_grams', -np.inf),
+                column('max_grams', np.inf)
+            )
+        return self._limits[key]
+
+    def quote_batch(self, dims, weights, countries, carriers=CARRIERS, vectorized=True):
+        """Preferred service per carrier for many packages: {carrier: [Service or None per package]}
+
+        dims holds (length, width, height) per package, weights (grams) and
+        countries one value per package. With NumPy all packages of a
+        country are compared with all services of a carrier in one array
+        operation; without it (or with vectorized False) each package is
+        quoted separately.
+        """
+        routes = {country: country_key(country) for country in set(countries)}
+        if not (vectorized and load_numpy()):
+            return {carrier: [first_fit(self.by_route.get((carrier, routes[country]), ()), sorted(pkg_dims), weight)
+                              for pkg_dims, weight, country in zip(dims, weights, countries)]
+                    for carrier in carriers}
+
+        dims = np.sort(np.asarray(dims, dtype=float).reshape(-1, 3), axis=1)
+        weights = np.asarray(weights, dtype=float)
+        route_names = sorted(set(routes.values()))
+        code_of = {country: route_names.index(route) for country, route in routes.items()}
+        codes = np.array([code_of[country] for country in countries], dtype=int)
+        rows_by_route = {route: np.flatnonzero(codes == code) for code, route in enumerate(route_names)}
+
+        # Derived sizes for the sum-of-sides, longest side and girth limits, same arithmetic as fits()
+        sums = dims[:, 0] + dims[:, 1] + dims[:, 2]
+        girths = dims[:, 2] + 2 * (dims[:, 0] + dims[:, 1])
+
+        results = {}
+        for carrier in carriers:
+            lookup = []
+            chosen = np.full(len(weights), -1)
+            for route, rows in rows_by_route.items():
+                services = self.by_route.get((carrier, route))
+                if not services or not len(rows):
+                    continue
+                max_dims, min_dims, max_sum, max_longest, max_girth, min_grams, max_grams = \
+                    self.limit_arrays(carrier, route)
+                # (packages x services) fit matrix; services are in preference order, so the first fit wins
+                route_dims = dims[rows][:, None, :]
+                fit = (route_dims <= max_dims[None, :, :]).all(axis=2)
+                fit &= (route_dims >= min_dims[None, :, :]).all(axis=2)
+                fit &= sums[rows][:, None] <= max_sum
+                fit &= dims[rows, 2][:, None] <= max_longest
+                fit &= girths[rows][:, None] <= max_girth
+                route_weights = weights[rows][:, None]
+                fit &= (route_weights >= min_grams) & (route_weights <= max_grams)
+                chosen[rows] = np.where(fit.any(axis=1), fit.argmax(axis=1) + len(lookup), -1)
+                lookup.extend(services)
+            lookup.append(None)  # chosen == -1
+            results[carrier] = [lookup[index] for index in chosen.tolist()]
+        return results
+
+
+_table = None
+
+
+def get_tariff_table():
+    """Return the process-wide tariff table, loading it on first use"""
+    global _table
+    if _table is None:
+        _table = TariffTable.load()
+    return _table
@@ -0,0 +1,15 @@
+"""
+Statistics
+Small helpers for the timing summaries printed at the end of a run.
+"""
+
+import math
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers, or 0 without samples"""
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    rank = max(0, min(len(samples) - 1, math.ceil(pct / 100 * len(samples)) - 1))
+    return samples[rank]
@@ -0,0 +1,6 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The shipping scripts import each other as top-level modules, like when run from shipping/
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'shipping')]
@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+from bundle import EMPTY_STACKS, BundleOptimizer, add_to_stacks, parse_item
+from tariff_table import CARRIERS
+
+
+def partitions(indexes):
+    """Every split of indexes into groups"""
+    if not indexes:
+        yield []
+        return
+    first, rest = indexes[0], indexes[1:]
+    for split in partitions(rest):
+        for i in range(len(split)):
+            yield split[:i] + [[first] + split[i]] + split[i + 1:]
+        yield [[first]] + split
+
+
+def exhaustive_total(optimizer, items):
+    """Cheapest total over all splits, pricing each group of items from scratch"""
+    def group_cost(group):
+        stacks = EMPTY_STACKS
+        for sides, _ in group:
+            stacks = add_to_stacks(stacks, sides)
+        weight = sum(grams for _, grams in group)
+        prices = [service.price_cents for dims in stacks for carrier in CARRIERS
+                  for service in optimizer.table.options(carrier, dims, weight, optimizer.country)]
+        return min(prices) if prices else None
+
+    best = None
+    for split in partitions(list(range(len(items)))):
+        costs = [group_cost([items[i] for i in group]) for group in split]
+        if None not in costs and (best is None or sum(costs) < best):
+            best = sum(costs)
+    return best
+
+
+def test_parcel_reaches_minimum_weight():
+    # Two light items together reach the 50 g of DHL Envelop, cheaper than Brievenbuspakket
+    items = [item for text in ('21x15x1.5:30', '17.9x14.5x1.4:20', '24.7x18.4x1.5:15') for item in parse_item(text)]
+    result = BundleOptimizer(items).solve()
+    assert result['total_cents'] == 510
+    assert result['optimal']
+    assert sorted(parcel['items'] for parcel in result['parcels']) == [[0, 1], [2]]
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_matches_exhaustive_search(seed):
+    rng = random.Random(seed)
+    for _ in range(50):
+        if rng.random() < 0.5:
+            # Letters and thin packages around the weight limits of the cheapest services
+            items = [(tuple(sorted([round(rng.uniform(0.5, 2), 1), round(rng.uniform(10, 20), 1),
+                                    round(rng.uniform(15, 26), 1)])), rng.randint(5, 50))
+                     for _ in range(rng.randint(1, 6))]
+        else:
+            kinds = [(tuple(sorted(round(rng.uniform(0.5, 45), 1) for _ in range(3))), rng.randint(10, 6000))
+                     for _ in range(3)]
+            items = [rng.choice(kinds) for _ in range(rng.randint(1, 6))]
+        optimizer = BundleOptimizer(items, rng.choice(['NL', 'BE']))
+        expected = exhaustive_total(optimizer, items)
+        if expected is None:
+            with pytest.raises(ValueError):
+                optimizer.solve()
+            continue
+        result = optimizer.solve()
+        assert result['optimal']
+        assert result['total_cents'] == expected, items
+        assert sorted(i for parcel in result['parcels'] for i in parcel['items']) == list(range(len(items)))
+
+
+def test_item_too_big():
+    with pytest.raises(ValueError, match='fits no service'):
+        BundleOptimizer(parse_item('200x10x10:100')).solve()
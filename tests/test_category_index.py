@@ -0,0 +1,58 @@
+import json
+import os
+
+from category_index import SNAPSHOT_FILE, CategoryIndex, CategorySnapshot, get_category_index, write_snapshot
+
+
+def write_categories(directory, parent_name):
+    """Scraped category files with one parent, child and grandchild"""
+    directory.mkdir()
+    files = {
+        'parents.json': [{'id': 1, 'name': parent_name}],
+        'children.json': [{'id': 2, 'name': 'Kind', 'parentId': 1, 'parentName': parent_name}],
+        'grandchildren.json': [{'id': 3, 'name': 'Kleinkind', 'parentId': 2, 'parentName': 'Kind',
+                                'grandparentName': parent_name}],
+    }
+    for name, data in files.items():
+        (directory / name).write_text(json.dumps(data), encoding='utf-8')
+    return str(directory)
+
+
+def test_index_is_cached_per_directory(tmp_path):
+    first = write_categories(tmp_path / 'first', 'Boeken')
+    second = write_categories(tmp_path / 'second', 'Muziek')
+
+    assert get_category_index(first).resolve('Boeken', 'Kind', 'Kleinkind') == (1, 2, 3)
+    assert get_category_index(second).resolve('Muziek', 'Kind', 'Kleinkind') == (1, 2, 3)
+    assert get_category_index(first) is get_category_index(first)
+    assert get_category_index(first) is not get_category_index(second)
+
+
+def test_lookups_by_name_key_and_path(tmp_path):
+    index = CategoryIndex.load(write_categories(tmp_path / 'categories', 'Boeken'))
+    assert index.parents_by_name['Boeken']['id'] == 1
+    assert index.children_by_key[(1, 'Kind')]['id'] == 2
+    assert index.grandchildren_by_key[(2, 'Kleinkind')]['id'] == 3
+    assert index.paths_for_name('Kleinkind') == ['Boeken--Kind--Kleinkind']
+    assert index.paths_for_name('Onbekend') == []
+    assert index.lookup_id('Boeken--Kind--Kleinkind') == 3
+
+
+def test_unchanged_snapshot_stays_newer_than_the_json(tmp_path):
+    directory = write_categories(tmp_path / 'categories', 'Boeken')
+    index = CategoryIndex.load(directory)
+    snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+    json_path = os.path.join(directory, 'grandchildren.json')
+    assert write_snapshot(index.parents, index.children, index.grandchildren, snapshot_path)
+
+    # A field the snapshot leaves out changes: the JSON is rewritten, the snapshot content is not
+    os.utime(snapshot_path, (0, 0))
+    index.grandchildren[0]['shortName'] = 'kk'
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(index.grandchildren, f)
+    assert not write_snapshot(index.parents, index.children, index.grandchildren, snapshot_path)
+
+    lookup = get_category_index(directory)
+    assert isinstance(lookup, CategorySnapshot)
+    assert lookup.resolve('Boeken', 'Kind', 'Kleinkind') == (1, 2, 3)
+    lookup.close()
@@ -0,0 +1,19 @@
+import pytest
+
+from journal import FAILED, STATES, PostingJournal
+
+
+def test_record_accepts_known_states(tmp_path):
+    journal = PostingJournal(path=str(tmp_path / 'journal.jsonl'))
+    journal.start_run(['Fiets'])
+    for state in STATES + [FAILED]:
+        journal.record('Fiets', state)
+    assert [event['state'] for event in journal.events() if 'state' in event] == STATES + [FAILED]
+
+
+def test_record_rejects_unknown_states(tmp_path):
+    journal = PostingJournal(path=str(tmp_path / 'journal.jsonl'))
+    journal.start_run(['Fiets'])
+    with pytest.raises(ValueError):
+        journal.record('Fiets', 'photo_uploaded')
+    assert [event for event in journal.events() if 'state' in event] == []
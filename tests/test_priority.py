@@ -0,0 +1,14 @@
+from datetime import date
+
+from priority import PriorityScorer, expiries_by_ad
+
+
+def test_offline_days_follow_truncated_and_recased_titles():
+    ad_names = ['Boek over de zee', 'Eiken tafel', 'Nieuwe lamp']
+    expiries = {'Boek over de...': '2026-01-01', 'EIKEN TAFEL': '2026-01-08', 'Verkocht': '2026-01-02'}
+    by_ad = expiries_by_ad(ad_names, expiries)
+    assert by_ad == {'Boek over de zee': '2026-01-01', 'Eiken tafel': '2026-01-08'}
+
+    scorer = PriorityScorer(weights={'price': 0, 'category': 0, 'offline': 1, 'failures': 0},
+                            expiries=by_ad, today=date(2026, 1, 10))
+    assert [scorer.score(name, None) for name in ad_names] == [9, 2, 0]
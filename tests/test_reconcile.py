@@ -0,0 +1,71 @@
+from datetime import date
+
+from reconcile import TITLE_MAX_LENGTH, reconcile, title_key
+
+TODAY = date(2026, 1, 10)
+
+
+def online(*titles, **entries):
+    """Inventory entries for the given titles"""
+    return {title: dict(entries) for title in titles}
+
+
+def test_case_accents_and_punctuation_are_ignored():
+    diff = reconcile({'Café tafel - eiken': {}}, online('CAFE TAFEL eiken'), today=TODAY)
+    assert diff.matched == {'Café tafel - eiken': 'CAFE TAFEL eiken'}
+    assert diff.to_post == [] and diff.orphaned == []
+    assert title_key('Ça  va / goed') == 'ca va goed'
+
+
+def test_title_cut_at_the_maximum_length():
+    name = 'Lange titel ' + 'x' * TITLE_MAX_LENGTH
+    diff = reconcile({name: {}}, online(name[:TITLE_MAX_LENGTH]), today=TODAY)
+    assert diff.matched == {name: name[:TITLE_MAX_LENGTH]}
+
+
+def test_ellipsis_title_matches_on_a_word_boundary():
+    diff = reconcile({'Boek over de zee': {}}, online('Boek over de...'), today=TODAY)
+    assert diff.matched == {'Boek over de zee': 'Boek over de...'}
+
+    diff = reconcile({'Boek overzicht fietsen': {}}, online('Boek over …'), today=TODAY)
+    assert diff.to_post == ['Boek overzicht fietsen']
+    assert diff.orphaned == ['Boek over …']
+
+
+def test_ellipsis_title_shared_by_several_folders_is_ambiguous():
+    local = {'Boek over de zee': {}, 'Boek over de bergen': {}, 'Boek overzicht fietsen': {}}
+    diff = reconcile(local, online('Boek over ...'), today=TODAY)
+    assert diff.matched == {}
+    assert diff.to_post == list(local)
+    assert diff.ambiguous == {'Boek over de zee': ['Boek over ...'], 'Boek over de bergen': ['Boek over ...']}
+    assert diff.orphaned == []
+
+
+def test_exact_key_wins_over_a_prefix():
+    local = {'Harry Potter deel 1': {}, 'Harry Potter deel 1 en 2': {}}
+    diff = reconcile(local, online('Harry Potter deel 1...'), today=TODAY)
+    assert diff.matched == {'Harry Potter deel 1': 'Harry Potter deel 1...'}
+    assert diff.to_post == ['Harry Potter deel 1 en 2']
+    assert diff.ambiguous == {}
+
+
+def test_one_online_title_claims_one_folder():
+    diff = reconcile({'Lamp': {}, 'lamp.': {}}, online('LAMP'), today=TODAY)
+    assert diff.matched == {}
+    assert diff.ambiguous == {'Lamp': ['LAMP'], 'lamp.': ['LAMP']}
+
+
+def test_ad_id_wins_over_the_title():
+    local = {'Stoel rood': {'adId': 'm1'}, 'Stoel': {}}
+    diff = reconcile(local, {'Stoel': {'adId': 'm1'}}, today=TODAY)
+    assert diff.matched == {'Stoel rood': 'Stoel'}
+    assert diff.to_post == ['Stoel']
+
+
+def test_renew_and_changed():
+    local = {'Fiets': {'modified': 1767999600}, 'Bank': {}}
+    entries = {'Fiets': {'expires': '2026-01-12', 'firstSeen': '2025-12-01T10:00:00'},
+               'Bank': {'expires': '2026-02-01'}}
+    diff = reconcile(local, entries, today=TODAY)
+    assert diff.to_renew == ['Fiets']
+    assert diff.changed == ['Fiets']
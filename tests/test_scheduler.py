@@ -0,0 +1,20 @@
+from datetime import datetime
+
+import pytest
+
+from scheduler import SLOT_SEARCH_DAYS, PostingScheduler
+
+NOW = datetime(2026, 1, 5, 10, 30)
+
+
+@pytest.mark.parametrize('posts_per_hour, posting_hours', [(0, None), (5, (9, 9))])
+def test_no_slots_without_budget(tmp_path, posts_per_hour, posting_hours):
+    scheduler = PostingScheduler(posts_per_hour, posting_hours, path=str(tmp_path / 'schedule.json'))
+    assert scheduler.next_slots(3, now=NOW) == []
+
+
+def test_slots_stop_at_the_search_window(tmp_path):
+    scheduler = PostingScheduler(1, (9, 10), path=str(tmp_path / 'schedule.json'))
+    slots = scheduler.next_slots(SLOT_SEARCH_DAYS + 10, now=NOW)
+    assert len(slots) == SLOT_SEARCH_DAYS
+    assert slots[0] == datetime(2026, 1, 6, 9)
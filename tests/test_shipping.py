@@ -0,0 +1,70 @@
+import csv
+import io
+import math
+
+import pytest
+import yaml
+
+import calculate_shipping
+from benchmark_shipping import check, random_packages, reference_cents, reference_grams, reference_limits
+from tariff_table import TARIFFS_FILE, get_tariff_table
+
+
+@pytest.fixture(scope='module')
+def table():
+    return get_tariff_table()
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_engine_matches_reference(table, seed):
+    # Single quotes and both batch paths pick the same service as the reference
+    mismatches, _ = check(table, random_packages(4000, table, seed))
+    assert not mismatches, '\n'.join(mismatches[:10])
+
+
+def test_compiled_services_match_yaml(table):
+    with open(TARIFFS_FILE, 'r', encoding='utf-8') as f:
+        tariffs = yaml.safe_load(f)
+    for service in table.services:
+        data = tariffs[service.carrier][service.country][service.name]
+        assert service.price_cents == reference_cents(data['price']), service.name
+        assert service.max_grams == (reference_grams(data['max. weight']) if 'max. weight' in data else None)
+        assert service.min_grams == (reference_grams(data['min. weight']) if 'min. weight' in data else None)
+
+        limits = reference_limits(data['max. dimensions']) if 'max. dimensions' in data else {}
+        max_box = [side for side in service.max_dims or () if side != math.inf]
+        assert max_box == sorted(limits.get('box', [])), service.name
+        assert (service.max_sum, service.max_longest, service.max_girth) == \
+            (limits.get('sum'), limits.get('longest'), limits.get('girth')), service.name
+        if 'min. dimensions' in data:
+            min_box = [side for side in service.min_dims if side]
+            assert min_box == sorted(reference_limits(data['min. dimensions'])['box']), service.name
+        else:
+            assert service.min_dims is None
+
+
+def test_sum_of_sides_tolerance(table):
+    # 41.7 + 17.2 + 31.1 adds up to a little over 90 in floating point
+    service = table.cheapest('PostNL', [41.7, 17.2, 31.1], 400, 'BE')
+    assert service is not None and service.max_sum == 90
+
+
+@pytest.mark.parametrize('text, grams', [('2 kg', 2000), ('500 g', 500), ('20 g', 20), ('23 kg', 23000)])
+def test_reference_grams(text, grams):
+    assert reference_grams(text) == grams
+
+
+def test_headerless_batch_country_per_row():
+    out = io.StringIO()
+    calculate_shipping.quote_stream(io.StringIO('19.6,13,1.3,170\n30,20,10,400,BE\n'), out)
+    header, nl, be = csv.reader(io.StringIO(out.getvalue()))
+    assert header[:5] == calculate_shipping.BATCH_FIELDS
+    assert len(nl) == len(be) == len(header)
+    assert be[5].startswith('Klein pakket') and be[6] == '8.50'
+
+
+@pytest.mark.parametrize('value', ['nan', '-5', 'inf'])
+def test_batch_rejects_invalid_numbers(value):
+    out = io.StringIO()
+    rows, invalid = calculate_shipping.quote_stream(io.StringIO(f'{value},13,1.3,170\n19.6,{value},1.3,170\n'), out)
+    assert (rows, invalid) == (2, 2)
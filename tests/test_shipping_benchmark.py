@@ -0,0 +1,52 @@
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+import calculate_shipping
+from benchmark_shipping import COUNTRIES
+from tariff_table import CACHE_FILE, TariffTable, get_tariff_table
+
+
+def test_single_quote(benchmark):
+    postnl, dhl = benchmark(calculate_shipping.find_cheapest_options, 19.6, 13, 1.3, 170)
+    assert postnl and dhl
+
+
+def test_table_load_from_cache(benchmark, tmp_path):
+    cache_file = tmp_path / 'tariffs.cache.json'
+    TariffTable.load(cache_file=cache_file)
+    table = benchmark(TariffTable.load, cache_file=cache_file)
+    assert table.services
+
+
+def test_quote_batch(benchmark):
+    rng = random.Random(1)
+    rows = 10000
+    dims = [[round(rng.uniform(0.5, 120), 1), round(rng.uniform(0.5, 80), 1), round(rng.uniform(0.1, 60), 1)]
+            for _ in range(rows)]
+    weights = [rng.randint(1, 30000) for _ in range(rows)]
+    countries = [rng.choice(COUNTRIES) for _ in range(rows)]
+    quotes = benchmark(get_tariff_table().quote_batch, dims, weights, countries)
+    assert all(len(column) == rows for column in quotes.values())
+
+
+def test_cold_start_without_cache(benchmark):
+    """A new process quoting one package, compiling tariffs.yaml because there is no cache yet"""
+    script = os.path.join(os.path.dirname(calculate_shipping.__file__), 'calculate_shipping.py')
+
+    def clear_cache():
+        if CACHE_FILE.exists():
+            CACHE_FILE.unlink()
+
+    def run():
+        return subprocess.run([sys.executable, script, '19.6', '13', '1.3', '170'],
+                              check=True, capture_output=True, text=True).stdout
+
+    output = benchmark.pedantic(run, setup=clear_cache, rounds=5, iterations=1)
+    assert output.startswith('PostNL')
+    assert CACHE_FILE.exists()
@@ -0,0 +1,42 @@
+import math
+
+import pytest
+
+pytest.importorskip('hypothesis')
+
+from hypothesis import given, settings, strategies as st
+
+from benchmark_shipping import COUNTRIES, ReferenceQuoter
+from tariff_table import CARRIERS, get_tariff_table, load_numpy
+
+TABLE = get_tariff_table()
+REFERENCE = ReferenceQuoter()
+
+# Sides and weights exactly at a service limit, where off-by-one mistakes show up
+EDGES = sorted({value for service in TABLE.services
+                for value in (service.max_dims or ()) + (service.min_dims or ()) + (service.max_longest,)
+                if value is not None and value != math.inf})
+WEIGHT_LIMITS = sorted({value for service in TABLE.services
+                        for value in (service.min_grams, service.max_grams) if value is not None})
+
+sides = st.one_of(st.sampled_from(EDGES), st.floats(min_value=0.1, max_value=200).map(lambda side: round(side, 1)))
+weights = st.one_of(st.sampled_from(WEIGHT_LIMITS), st.floats(min_value=1, max_value=40000))
+packages = st.tuples(st.lists(sides, min_size=3, max_size=3), weights, st.sampled_from(COUNTRIES))
+
+
+@settings(max_examples=1000, deadline=None)
+@given(packages)
+def test_cheapest_matches_reference(package):
+    for carrier in CARRIERS:
+        service = TABLE.cheapest(carrier, *package)
+        assert (service.name if service else None) == REFERENCE.cheapest(carrier, *package)
+
+
+@settings(max_examples=200, deadline=None)
+@given(st.lists(packages, min_size=1, max_size=50))
+def test_batch_matches_single(package_list):
+    dims, package_weights, countries = zip(*package_list)
+    single = {carrier: [TABLE.cheapest(carrier, *package) for package in package_list] for carrier in CARRIERS}
+    assert TABLE.quote_batch(dims, package_weights, countries, vectorized=False) == single
+    if load_numpy():
+        assert TABLE.quote_batch(dims, package_weights, countries) == single
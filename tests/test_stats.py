@@ -0,0 +1,16 @@
+import pytest
+
+from stats import percentile
+
+
+@pytest.mark.parametrize('samples, pct, expected', [
+    ([1, 2, 3, 4, 5], 50, 3),
+    ([4, 1, 3, 2], 50, 2),
+    (list(range(1, 31)), 95, 29),
+    (list(range(1, 101)), 99, 99),
+    ([7], 0, 7),
+    ([3, 1, 2], 100, 3),
+    ([], 50, 0.0),
+])
+def test_nearest_rank(samples, pct, expected):
+    assert percentile(samples, pct) == expected
@@ -0,0 +1,94 @@
+"""
+Step Tracing
+Timing spans for every step of the posting flow, appended to a JSONL trace
+file and summarized (p50/p95 per step, slowest ads) at the end of a run.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from stats import percentile
+
+STATE_DIR = 'state'
+TRACE_FILE = os.path.join(STATE_DIR, 'trace.jsonl')
+
+
+class StepTimer:
+    """Times consecutive steps of one ad: each mark() closes the step since the previous mark"""
+
+    def __init__(self, tracer, ad_name):
+        self.tracer = tracer
+        self.ad_name = ad_name
+        self.started = self.last = time.monotonic()
+
+    def mark(self, step, **details):
+        now = time.monotonic()
+        self.tracer.record(step, now - self.last, self.ad_name, **details)
+        self.last = now
+
+    def finish(self, ok):
+        """Record the total time spent on the ad"""
+        self.tracer.record('total', time.monotonic() - self.started, self.ad_name, ok=ok)
+
+
+class Tracer:
+    """Collects timing spans of a run and appends them to the trace file"""
+
+    def __init__(self, path=TRACE_FILE):
+        self.path = path
+        self.run_id = datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def record(self, step, duration, ad_name=None, **details):
+        """Record one span; ad_name is None for run-level steps"""
+        span = {'ts': datetime.now().isoformat(timespec='seconds'), 'run': self.run_id,
+                'ad': ad_name, 'step': step, 'duration': round(duration, 3), **details}
+        line = json.dumps(span, ensure_ascii=False) + '\n'
+        with self._lock:
+            self.spans.append(span)
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def timer(self, ad_name):
+        return StepTimer(self, ad_name)
+
+    @contextmanager
+    def span(self, step, ad_name=None, **details):
+        """Time a block as one span"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(step, time.monotonic() - start, ad_name, **details)
+
+    def summary(self, slowest=5):
+        """Print p50/p95/total per step and the slowest ads of this run"""
+        with self._lock:
+            spans = list(self.spans)
+        if not spans:
+            return
+
+        by_step = {}
+        for span in spans:
+            if span['step'] != 'total':
+                by_step.setdefault(span['step'], []).append(span['duration'])
+
+        print(f"\n{'Step':<24}{'Count':>7}{'p50':>9}{'p95':>9}{'Total':>10}")
+        for step, durations in sorted(by_step.items(), key=lambda item: sum(item[1]), reverse=True):
+            print(f"{step:<24}{len(durations):>7}{percentile(durations, 50):>8.1f}s"
+                  f"{percentile(durations, 95):>8.1f}s{sum(durations):>9.1f}s")
+
+        totals = sorted((span for span in spans if span['step'] == 'total'), key=lambda span: span['duration'],
+                        reverse=True)
+        if totals:
+            durations = [span['duration'] for span in totals]
+            print(f"\n{len(totals)} ads, p50 {percentile(durations, 50):.1f}s, p95 {percentile(durations, 95):.1f}s. "
+                  f"Slowest:")
+            for span in totals[:slowest]:
+                print(f"  {span['duration']:>7.1f}s  {span['ad']}{'' if span.get('ok') else ' (failed)'}")
@@ -0,0 +1,169 @@
+"""
+Ad Validation and Posting Plan
+Checks every ad folder offline, without a browser: category path, price,
+package size against the ad form, and photos. The
+plan command also lists what the next run would post and how long it takes.
+
+Usage: python validate_ads.py [validate|plan] [--workers N]
+"""
+
+import argparse
+import os
+import re
+
+from ad_manifest import AdManifest, PACKAGE_SIZE_IDS
+from images import probe_photos
+from inventory import AdInventory
+from reconcile import TITLE_MAX_LENGTH, reconcile
+
+try:
+    from config import BROWSER_WORKERS
+except ImportError:
+    BROWSER_WORKERS = 1
+
+try:
+    from config import MAX_POSTS_PER_ACCOUNT
+except ImportError:
+    MAX_POSTS_PER_ACCOUNT = 2
+
+PRICE_TYPES = {'Bieden', 'Vraagprijs', 'Gratis'}
+PRICE_PATTERN = re.compile(r'^\d+([.,]\d{1,2})?$')
+YEAR_PATTERN = re.compile(r'^\d{4}$')
+
+# Rough browser time per ad, used for the duration estimate of the plan
+SECONDS_PER_AD = 40
+SECONDS_PER_PHOTO = 2
+
+
+def validate_ad(name, ad, photo_infos):
+    """Check one manifest entry; returns (errors, warnings)
+
+    Errors make posting fail or post a broken ad; warnings are worth a look.
+    """
+    errors = list(ad['errors'])
+    warnings = []
+    fields = ad['fields']
+    attributes = ad['attributes']
+
+    if len(fields) < 3:
+        if fields:
+            errors.append("category line has fewer than 3 levels")
+    else:
+        levels = ('parent', 'child', 'grandchild')
+        for level, category_id in zip(levels, ad['categoryIds']):
+            if category_id is None:
+                errors.append(f"unknown {level} category '{attributes[level]}'")
+                break
+
+    price_type = attributes.get('priceType', '')
+    price = attributes.get('price', '')
+    if fields and not price_type:
+        warnings.append("no price type")
+    elif price_type and price_type not in PRICE_TYPES:
+        warnings.append(f"unusual price type '{price_type}'")
+    # The posting flow does not fill in the price, so price problems do not stop an ad from posting
+    if price and not PRICE_PATTERN.match(price):
+        warnings.append(f"price '{price}' is not a number like 400,00")
+    if price_type == 'Vraagprijs' and not price:
+        warnings.append("Vraagprijs without a price")
+
+    year = attributes.get('year', '')
+    if year and not YEAR_PATTERN.match(year):
+        warnings.append(f"year '{year}' is not a 4-digit year")
+
+    package_size = attributes.get('packageSize', '')
+    if package_size:
+        if package_size not in PACKAGE_SIZE_IDS:
+            errors.append(f"unknown package size '{package_size}' (use {', '.join(PACKAGE_SIZE_IDS)})")
+    elif fields:
+        warnings.append("no package size, the ad can only be picked up")
+
+    if not photo_infos:
+        warnings.append("no photos")
+    for info in photo_infos:
+        if 'error' in info:
+            warnings.append(f"photo {os.path.basename(info['path'])} is unreadable: {info['error']}")
+
+    if len(name) > TITLE_MAX_LENGTH:
+        warnings.append(f"title is longer than {TITLE_MAX_LENGTH} characters and will be cut off")
+    if fields and not ad['description']:
+        warnings.append("empty description")
+
+    return errors, warnings
+
+
+def validate_all(manifest, names=None, workers=8):
+    """Validate the ads of a scanned manifest (all, or only names); returns {name: (errors, warnings)}"""
+    ads = {name: manifest[name] for name in (manifest.ads if names is None else names)}
+
+    # Probe all photos in one parallel batch; this is the only part that touches the disk
+    paths = {name: [os.path.join(manifest.ads_dir, name, 'photos', photo['name']) for photo in ad['photos']]
+             for name, ad in ads.items()}
+    infos = iter(probe_photos([path for ad_paths in paths.values() for path in ad_paths], workers))
+    photo_infos = {name: [next(infos) for _ in ad_paths] for name, ad_paths in paths.items()}
+
+    return {name: validate_ad(name, ad, photo_infos[name]) for name, ad in ads.items()}
+
+
+def estimate_seconds(ad):
+    """Estimated browser time to post one ad"""
+    return SECONDS_PER_AD + SECONDS_PER_PHOTO * len(ad['photos'])
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m {seconds:02d}s"
+
+
+def print_problems(results):
+    """Print errors and warnings per ad; returns the number of ads with errors"""
+    failing = 0
+    for name, (errors, warnings) in sorted(results.items()):
+        for error in errors:
+            print(f"X {name}: {error}")
+        for warning in warnings:
+            print(f"= {name}: {warning}")
+        failing += bool(errors)
+    return failing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check ad folders and plan the next posting run without a browser")
+    parser.add_argument('command', nargs='?', choices=['validate', 'plan'], default='validate')
+    parser.add_argument('--workers', type=int, default=8, help="threads for scanning and probing photos (default 8)")
+    args = parser.parse_args()
+
+    manifest = AdManifest()
+    manifest.scan(args.workers)
+    manifest.save()
+    results = validate_all(manifest, workers=args.workers)
+    failing = print_problems(results)
+    print(f"\n{len(results) - failing} of {len(results)} ads are ready to post")
+
+    if args.command == 'plan':
+        inventory = AdInventory()
+        local_ads = {name: {'modified': ad['modified']} for name, ad in manifest.ads.items()}
+        diff = reconcile(local_ads, inventory.ads)
+        to_post = [name for name in diff.to_post if not results[name][0]]
+        blocked = [name for name in diff.to_post if results[name][0]]
+
+        parallel = max(1, min(BROWSER_WORKERS, MAX_POSTS_PER_ACCOUNT))
+        total = sum(estimate_seconds(manifest[name]) for name in to_post)
+        print(f"\nPlan (from the cached online inventory, {len(inventory.ads)} ads online):")
+        for name in to_post:
+            ad = manifest[name]
+            print(f"+ {name} ({len(ad['photos'])} photos, ~{estimate_seconds(ad)}s)")
+        for name in blocked:
+            print(f"X {name} (skipped: {results[name][0][0]})")
+        for name, titles in diff.ambiguous.items():
+            print(f"= {name} (online match {', '.join(titles)} also fits other folders)")
+        print(f"\n{len(to_post)} ads to post, {len(blocked)} skipped, {len(diff.to_renew)} expiring soon; "
+              f"estimated {format_duration(total / parallel)} with {parallel} parallel")
+
+    if failing:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Condition-driven waits for the Selenium automation
+Replaces fixed time.sleep() calls with WebDriverWait conditions and a
+network-idle check, and keeps track of how much time each step saved
+compared to the sleeps it replaced.
+"""
+
+import time
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+# Per-step timeouts in seconds; override any of them with WAIT_TIMEOUTS in config.py
+DEFAULT_TIMEOUTS = {
+    'default': 10,
+    'page_load': 15,
+    'login': 15,
+    'load_more': 15,
+    'category': 10,
+    'photo_upload': 30,
+    'photo_each': 15,  # Per photo of a bulk upload
+    'submit': 20,
+}
+
+POLL_INTERVAL = 0.1
+NETWORK_QUIET_PERIOD = 0.5  # No new network requests for this long counts as idle
+
+
+def network_idle(quiet_period=NETWORK_QUIET_PERIOD):
+    """Condition: document is complete and no new resources loaded for quiet_period"""
+    state = {'count': -1, 'since': 0.0}
+
+    def condition(driver):
+        ready_state, resource_count = driver.execute_script(
+            "return [document.readyState, performance.getEntriesByType('resource').length];")
+        now = time.monotonic()
+        if ready_state != 'complete' or resource_count != state['count']:
+            state['count'] = resource_count
+            state['since'] = now
+            return False
+        return now - state['since'] >= quiet_period
+
+    return condition
+
+
+def element_count_above(locator, count):
+    """Condition: more than count elements match locator"""
+    def condition(driver):
+        return len(driver.find_elements(*locator)) > count
+    return condition
+
+
+def uploads_complete(done_locator, busy_locator, count):
+    """Condition: at least count elements match done_locator and none match busy_locator"""
+    def condition(driver):
+        done = len(driver.find_elements(*done_locator))
+        return done if done >= count and not driver.find_elements(*busy_locator) else False
+    return condition
+
+
+class Waiter:
+    """Runs named wait steps against a driver and records their timing"""
+
+    def __init__(self, driver, timeouts=None):
+        self.driver = driver
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        self.timeouts.update(timeouts or {})
+        self.stats = {}
+
+    def timeout_for(self, step, group=None):
+        """Timeout for a step: its own setting, then its group's, then the default"""
+        if step in self.timeouts:
+            return self.timeouts[step]
+        if group in self.timeouts:
+            return self.timeouts[group]
+        return self.timeouts['default']
+
+    def until(self, step, condition, legacy=0, group=None, required=False, timeout=None):
+        """Wait for condition, recording the time against step
+
+        legacy is the fixed sleep (seconds) this wait replaces. A timeout
+        raises when required, otherwise it is recorded and None is returned,
+        which matches the old behaviour of sleeping and carrying on.
+        timeout overrides the configured timeout of the step.
+        """
+        start = time.monotonic()
+        timed_out = False
+        try:
+            return WebDriverWait(self.driver, timeout or self.timeout_for(step, group), POLL_INTERVAL).until(condition)
+        except TimeoutException:
+            timed_out = True
+            if required:
+                raise
+            return None
+        finally:
+            self._record(step, time.monotonic() - start, legacy, timed_out)
+
+    def settle(self, step, legacy=0, group='page_load'):
+        """Wait until the page has finished loading and the network is idle"""
+        return self.until(step, network_idle(), legacy, group)
+
+    def _record(self, step, elapsed, legacy, timed_out):
+        stats = self.stats.setdefault(step, {'count': 0, 'waited': 0.0, 'legacy': 0.0, 'timeouts': 0})
+        stats['count'] += 1
+        stats['waited'] += elapsed
+        stats['legacy'] += legacy
+        stats['timeouts'] += int(timed_out)
+
+    def merge(self, other):
+        """Add the statistics of another Waiter (e.g. another browser worker) to this one"""
+        for step, stats in other.stats.items():
+            mine = self.stats.setdefault(step, {'count': 0, 'waited': 0.0, 'legacy': 0.0, 'timeouts': 0})
+            for key, value in stats.items():
+                mine[key] += value
+
+    def report(self):
+        """Print time waited per step compared to the fixed sleeps it replaced"""
+        if not self.stats:
+            return
+        print(f"\n{'Step':<24}{'Count':>7}{'Waited':>10}{'Sleeps':>10}{'Saved':>10}{'Timeouts':>10}")
+        total_waited = total_legacy = 0.0
+        for step, stats in sorted(self.stats.items(), key=lambda item: item[1]['legacy'] - item[1]['waited'],
+                                  reverse=True):
+            saved = stats['legacy'] - stats['waited']
+            total_waited += stats['waited']
+            total_legacy += stats['legacy']
+            print(f"{step:<24}{stats['count']:>7}{stats['waited']:>9.1f}s{stats['legacy']:>9.1f}s"
+                  f"{saved:>9.1f}s{stats['timeouts']:>10}")
+        print(f"{'Total':<24}{'':>7}{total_waited:>9.1f}s{total_legacy:>9.1f}s{total_legacy - total_waited:>9.1f}s")